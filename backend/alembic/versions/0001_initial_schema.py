@@ -0,0 +1,136 @@
+"""Initial schema
+
+Tables as they were created by Base.metadata.create_all() before migrations
+were introduced. Databases created that way should be stamped at this
+revision (`alembic stamp 0001_initial_schema`) and then upgraded.
+
+Revision ID: 0001_initial_schema
+Revises: 
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001_initial_schema'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'tenants',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('subdomain', sa.String(length=100), nullable=False),
+        sa.Column('name', sa.String(length=200), nullable=False),
+        sa.Column('email', sa.String(length=200), nullable=False),
+        sa.Column('b2_key_id', sa.String(length=200), nullable=True),
+        sa.Column('b2_key', sa.Text(), nullable=True),
+        sa.Column('b2_bucket', sa.String(length=200), nullable=True),
+        sa.Column('storage_limit_mb', sa.Integer(), nullable=True),
+        sa.Column('storage_used_bytes', sa.BigInteger(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_tenants_id'), 'tenants', ['id'], unique=False)
+    op.create_index(op.f('ix_tenants_subdomain'), 'tenants', ['subdomain'], unique=True)
+
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tenant_id', sa.Integer(), nullable=True),
+        sa.Column('email', sa.String(length=200), nullable=False),
+        sa.Column('hashed_password', sa.String(length=255), nullable=False),
+        sa.Column('is_admin', sa.Boolean(), nullable=True),
+        sa.Column('is_tenant_admin', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
+    op.create_index(op.f('ix_users_id'), 'users', ['id'], unique=False)
+
+    op.create_table(
+        'photos',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tenant_id', sa.Integer(), nullable=False),
+        sa.Column('filename', sa.String(length=500), nullable=False),
+        sa.Column('original_filename', sa.String(length=500), nullable=False),
+        sa.Column('b2_key', sa.String(length=1000), nullable=False),
+        sa.Column('file_size_bytes', sa.BigInteger(), nullable=False),
+        sa.Column('content_type', sa.String(length=100), nullable=True),
+        sa.Column('uploaded_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_photos_id'), 'photos', ['id'], unique=False)
+    op.create_index(op.f('ix_photos_tenant_id'), 'photos', ['tenant_id'], unique=False)
+
+    op.create_table(
+        'usage_logs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tenant_id', sa.Integer(), nullable=False),
+        sa.Column('log_type', sa.String(length=50), nullable=True),
+        sa.Column('bytes_transferred', sa.BigInteger(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_usage_logs_id'), 'usage_logs', ['id'], unique=False)
+    op.create_index(op.f('ix_usage_logs_tenant_id'), 'usage_logs', ['tenant_id'], unique=False)
+
+    op.create_table(
+        'b2_credentials',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tenant_id', sa.Integer(), nullable=True),
+        sa.Column('key_id', sa.String(length=200), nullable=False),
+        sa.Column('key', sa.Text(), nullable=False),
+        sa.Column('bucket_name', sa.String(length=200), nullable=True),
+        sa.Column('endpoint', sa.String(length=500), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_b2_credentials_id'), 'b2_credentials', ['id'], unique=False)
+
+    op.create_table(
+        'api_logs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('method', sa.String(length=10), nullable=False),
+        sa.Column('path', sa.String(length=500), nullable=False),
+        sa.Column('status_code', sa.Integer(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('tenant_id', sa.Integer(), nullable=True),
+        sa.Column('ip_address', sa.String(length=45), nullable=True),
+        sa.Column('user_agent', sa.Text(), nullable=True),
+        sa.Column('request_body', sa.Text(), nullable=True),
+        sa.Column('response_body', sa.Text(), nullable=True),
+        sa.Column('error_message', sa.Text(), nullable=True),
+        sa.Column('duration_ms', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_api_logs_created_at'), 'api_logs', ['created_at'], unique=False)
+    op.create_index(op.f('ix_api_logs_id'), 'api_logs', ['id'], unique=False)
+    op.create_index(op.f('ix_api_logs_method'), 'api_logs', ['method'], unique=False)
+    op.create_index(op.f('ix_api_logs_path'), 'api_logs', ['path'], unique=False)
+    op.create_index(op.f('ix_api_logs_status_code'), 'api_logs', ['status_code'], unique=False)
+    op.create_index(op.f('ix_api_logs_tenant_id'), 'api_logs', ['tenant_id'], unique=False)
+    op.create_index(op.f('ix_api_logs_user_id'), 'api_logs', ['user_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_table('api_logs')
+    op.drop_table('b2_credentials')
+    op.drop_table('usage_logs')
+    op.drop_table('photos')
+    op.drop_table('users')
+    op.drop_table('tenants')
@@ -0,0 +1,61 @@
+"""Multipart upload tracking and api_logs.sample_weight
+
+Revision ID: 0002_multipart_and_sampling
+Revises: 0001_initial_schema
+Create Date: 2026-10-17 09:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002_multipart_and_sampling'
+down_revision = '0001_initial_schema'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'multipart_uploads',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('tenant_id', sa.Integer(), nullable=False),
+        sa.Column('photo_id', sa.Integer(), nullable=False),
+        sa.Column('b2_key', sa.String(length=1000), nullable=False),
+        sa.Column('b2_upload_id', sa.String(length=500), nullable=False),
+        sa.Column('part_size_bytes', sa.BigInteger(), nullable=False),
+        sa.Column('total_parts', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['photo_id'], ['photos.id']),
+        sa.ForeignKeyConstraint(['tenant_id'], ['tenants.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('photo_id')
+    )
+    op.create_index(op.f('ix_multipart_uploads_id'), 'multipart_uploads', ['id'], unique=False)
+    op.create_index(op.f('ix_multipart_uploads_tenant_id'), 'multipart_uploads', ['tenant_id'], unique=False)
+
+    op.create_table(
+        'multipart_upload_parts',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('multipart_upload_id', sa.Integer(), nullable=False),
+        sa.Column('part_number', sa.Integer(), nullable=False),
+        sa.Column('etag', sa.String(length=200), nullable=False),
+        sa.Column('size_bytes', sa.BigInteger(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['multipart_upload_id'], ['multipart_uploads.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('multipart_upload_id', 'part_number', name='uq_multipart_upload_part')
+    )
+    op.create_index(op.f('ix_multipart_upload_parts_id'), 'multipart_upload_parts', ['id'], unique=False)
+    op.create_index(op.f('ix_multipart_upload_parts_multipart_upload_id'), 'multipart_upload_parts', ['multipart_upload_id'], unique=False)
+
+    op.add_column('api_logs', sa.Column('sample_weight', sa.Float(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('api_logs', 'sample_weight')
+    op.drop_table('multipart_upload_parts')
+    op.drop_table('multipart_uploads')
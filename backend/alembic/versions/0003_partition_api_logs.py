@@ -0,0 +1,75 @@
+"""Range-partition api_logs by created_at
+
+Partitioned MySQL tables cannot have foreign keys and every unique key must
+contain the partitioning column, so the user/tenant foreign keys are dropped
+and the primary key becomes (id, created_at). The redundant index on id
+(it is the leading column of the primary key) is dropped as well.
+
+Existing rows go into one initial partition ending at the migration date and
+everything newer into `pmax`; the partition maintenance task in
+app/services/log_partition_service.py then splits daily/monthly partitions
+out of pmax ahead of time and drops expired ones. Other dialects are left
+unpartitioned.
+
+Revision ID: 0003_partition_api_logs
+Revises: 0002_multipart_and_sampling
+Create Date: 2026-10-17 09:20:00.000000
+
+"""
+from datetime import datetime, timezone
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003_partition_api_logs'
+down_revision = '0002_multipart_and_sampling'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'mysql':
+        return
+
+    if context.is_offline_mode():
+        # MySQL's generated names for the two foreign keys created without a name
+        fk_names = ['api_logs_ibfk_1', 'api_logs_ibfk_2']
+    else:
+        fk_names = [fk['name'] for fk in sa.inspect(bind).get_foreign_keys('api_logs')]
+    for fk_name in fk_names:
+        op.drop_constraint(fk_name, 'api_logs', type_='foreignkey')
+
+    op.execute("UPDATE api_logs SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+    op.execute(
+        "ALTER TABLE api_logs "
+        "MODIFY created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP, "
+        "DROP PRIMARY KEY, "
+        "ADD PRIMARY KEY (id, created_at)"
+    )
+    op.drop_index('ix_api_logs_id', table_name='api_logs')
+
+    today = datetime.now(timezone.utc).date().isoformat()
+    op.execute(
+        "ALTER TABLE api_logs PARTITION BY RANGE (TO_DAYS(created_at)) ("
+        f"PARTITION p_initial VALUES LESS THAN (TO_DAYS('{today}')), "
+        "PARTITION pmax VALUES LESS THAN MAXVALUE)"
+    )
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'mysql':
+        return
+
+    op.execute("ALTER TABLE api_logs REMOVE PARTITIONING")
+    op.create_index('ix_api_logs_id', 'api_logs', ['id'], unique=False)
+    op.execute(
+        "ALTER TABLE api_logs "
+        "DROP PRIMARY KEY, "
+        "ADD PRIMARY KEY (id), "
+        "MODIFY created_at DATETIME NULL DEFAULT CURRENT_TIMESTAMP"
+    )
+    op.create_foreign_key(None, 'api_logs', 'users', ['user_id'], ['id'])
+    op.create_foreign_key(None, 'api_logs', 'tenants', ['tenant_id'], ['id'])
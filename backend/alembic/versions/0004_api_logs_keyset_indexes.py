@@ -0,0 +1,34 @@
+"""Composite (filter, created_at, id) indexes on api_logs for keyset pagination
+
+The single-column filter indexes cannot return rows in (created_at, id)
+order, so every filtered page had to sort the whole match set. Each filter
+column now leads a composite index ending in the page order.
+
+Revision ID: 0004_api_logs_keyset_indexes
+Revises: 0003_partition_api_logs
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004_api_logs_keyset_indexes'
+down_revision = '0003_partition_api_logs'
+branch_labels = None
+depends_on = None
+
+FILTER_COLUMNS = ['method', 'status_code', 'user_id', 'tenant_id']
+
+
+def upgrade() -> None:
+    for column in FILTER_COLUMNS:
+        op.create_index(f'ix_api_logs_{column}_created_at', 'api_logs', [column, 'created_at', 'id'], unique=False)
+        op.drop_index(f'ix_api_logs_{column}', table_name='api_logs')
+
+
+def downgrade() -> None:
+    for column in FILTER_COLUMNS:
+        op.create_index(f'ix_api_logs_{column}', 'api_logs', [column], unique=False)
+        op.drop_index(f'ix_api_logs_{column}_created_at', table_name='api_logs')
@@ -0,0 +1,40 @@
+"""Per-minute API request rollups
+
+Revision ID: 0005_api_log_rollups
+Revises: 0004_api_logs_keyset_indexes
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005_api_log_rollups'
+down_revision = '0004_api_logs_keyset_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'api_log_rollups',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('bucket_start', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('method', sa.String(length=10), nullable=False),
+        sa.Column('route', sa.String(length=500), nullable=False),
+        sa.Column('status_class', sa.Integer(), nullable=False),
+        sa.Column('tenant_id', sa.Integer(), nullable=False),
+        sa.Column('request_count', sa.Integer(), nullable=False),
+        sa.Column('error_count', sa.Integer(), nullable=False),
+        sa.Column('duration_sum_ms', sa.BigInteger(), nullable=False),
+        sa.Column('duration_max_ms', sa.Integer(), nullable=False),
+        sa.Column('sketch', sa.Text(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_api_log_rollups_bucket_route', 'api_log_rollups', ['bucket_start', 'route'], unique=False)
+    op.create_index('ix_api_log_rollups_tenant_bucket', 'api_log_rollups', ['tenant_id', 'bucket_start'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_table('api_log_rollups')
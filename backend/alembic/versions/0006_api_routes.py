@@ -0,0 +1,45 @@
+"""Interned route templates for api_logs
+
+api_logs.route_id references the matched route template in api_routes and
+replaces the index on the raw path, which is now only stored for errors,
+slow and unmatched requests. Rows logged before this migration keep their
+path and have no route_id.
+
+Revision ID: 0006_api_routes
+Revises: 0005_api_log_rollups
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006_api_routes'
+down_revision = '0005_api_log_rollups'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'api_routes',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('template', sa.String(length=500), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('template')
+    )
+    op.add_column('api_logs', sa.Column('route_id', sa.Integer(), nullable=True))
+    op.alter_column('api_logs', 'path', existing_type=sa.String(length=500), nullable=True)
+    op.create_index('ix_api_logs_route_id_created_at', 'api_logs', ['route_id', 'created_at', 'id'], unique=False)
+    op.drop_index('ix_api_logs_path', table_name='api_logs')
+
+
+def downgrade() -> None:
+    op.create_index('ix_api_logs_path', 'api_logs', ['path'], unique=False)
+    op.drop_index('ix_api_logs_route_id_created_at', table_name='api_logs')
+    op.execute("UPDATE api_logs SET path = '' WHERE path IS NULL")
+    op.alter_column('api_logs', 'path', existing_type=sa.String(length=500), nullable=False)
+    op.drop_column('api_logs', 'route_id')
+    op.drop_table('api_routes')
@@ -0,0 +1,48 @@
+"""B2 bucket size snapshots
+
+One row per background listing of a B2 bucket with its totals and per-prefix
+(per-tenant) breakdown. /api/admin/stats serves the newest completed row
+instead of listing the bucket on every call.
+
+Revision ID: 0007_bucket_storage_snapshots
+Revises: 0006_api_routes
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007_bucket_storage_snapshots'
+down_revision = '0006_api_routes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'bucket_storage_snapshots',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('job_id', sa.String(length=36), nullable=False),
+        sa.Column('bucket_name', sa.String(length=200), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('total_bytes', sa.BigInteger(), nullable=False),
+        sa.Column('total_objects', sa.BigInteger(), nullable=False),
+        sa.Column('prefixes', sa.Text(), nullable=True),
+        sa.Column('list_calls', sa.Integer(), nullable=False),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('job_id')
+    )
+    op.create_index(
+        'ix_bucket_storage_snapshots_bucket_status', 'bucket_storage_snapshots',
+        ['bucket_name', 'status', 'started_at'], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_bucket_storage_snapshots_bucket_status', table_name='bucket_storage_snapshots')
+    op.drop_table('bucket_storage_snapshots')
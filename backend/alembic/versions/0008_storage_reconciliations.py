@@ -0,0 +1,46 @@
+"""Storage reconciliation runs
+
+One row per reconciliation of a tenant's photos table against its B2
+objects, holding the JSON report (counts, bytes and sample findings).
+
+Revision ID: 0008_storage_reconciliations
+Revises: 0007_bucket_storage_snapshots
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008_storage_reconciliations'
+down_revision = '0007_bucket_storage_snapshots'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'storage_reconciliations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('job_id', sa.String(length=36), nullable=False),
+        sa.Column('tenant_id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('apply', sa.Boolean(), nullable=False),
+        sa.Column('grace_seconds', sa.Integer(), nullable=False),
+        sa.Column('report', sa.Text(length=16777215), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('job_id')
+    )
+    op.create_index(
+        'ix_storage_reconciliations_tenant_started', 'storage_reconciliations',
+        ['tenant_id', 'started_at'], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_storage_reconciliations_tenant_started', table_name='storage_reconciliations')
+    op.drop_table('storage_reconciliations')
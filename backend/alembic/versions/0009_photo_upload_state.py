@@ -0,0 +1,33 @@
+"""Photo upload state
+
+photos.state is pending (upload URL issued, size reserved until
+expires_at), confirmed or expired. Existing rows are confirmed. The
+(state, expires_at) index lets the expiry sweeper range-scan only the
+pending rows that are due.
+
+Revision ID: 0009_photo_upload_state
+Revises: 0008_storage_reconciliations
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009_photo_upload_state'
+down_revision = '0008_storage_reconciliations'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('photos', sa.Column('state', sa.String(length=20), server_default='confirmed', nullable=False))
+    op.add_column('photos', sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index('ix_photos_state_expires_at', 'photos', ['state', 'expires_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_photos_state_expires_at', table_name='photos')
+    op.drop_column('photos', 'expires_at')
+    op.drop_column('photos', 'state')
@@ -1,13 +1,27 @@
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from app.config import settings
+from app.services.metrics import db_pool_wait_seconds, register_pool_gauges
+import time
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+    
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            db_pool_wait_seconds.observe(time.perf_counter() - start)
 
 engine = create_engine(
     settings.DATABASE_URL,
+    poolclass=TimedQueuePool,
     pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
     pool_recycle=3600,  # Recycle connections after 1 hour (MySQL default wait_timeout)
     connect_args={
         "charset": "utf8mb4",
@@ -15,6 +29,8 @@ engine = create_engine(
     } if "mysql" in settings.DATABASE_URL.lower() else {}
 )
 
+register_pool_gauges(engine)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -4,9 +4,13 @@ Focus: Get login working first, then add features
 """
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.config import settings
 from app.database import engine, Base
 from app.routers import auth, admin, tenant
+from app.middleware.tenant_middleware import TenantMiddleware
+from app.middleware.api_logging_middleware import ApiLoggingMiddleware
+from app.middleware.metrics_middleware import MetricsMiddleware
 import logging
 import time
 from sqlalchemy.exc import OperationalError
@@ -72,6 +76,24 @@ app = FastAPI(
     version="2.0.0"
 )
 
+# Resolve tenant subdomains (cached, so no DB round trip per request).
+# Added before CORS so CORS stays the outermost middleware.
+app.add_middleware(TenantMiddleware)
+
+# Log every request (outside TenantMiddleware so tenant 404/403 responses are logged too);
+# rows are written in batches by a background thread
+app.add_middleware(ApiLoggingMiddleware)
+
+# SQL statement counts per request (Server-Timing + N+1 warnings); not even installed when disabled
+if settings.SQL_QUERY_TRACKING:
+    from app.middleware.query_tracking_middleware import QueryTrackingMiddleware
+    from app.services import query_tracker
+    query_tracker.install(engine)
+    app.add_middleware(QueryTrackingMiddleware)
+
+# Request latency histograms and in-flight gauge for /metrics (outside logging so its cost is included)
+app.add_middleware(MetricsMiddleware)
+
 # CORS Configuration - SIMPLE and PERMISSIVE for development
 app.add_middleware(
     CORSMiddleware,
@@ -104,7 +126,7 @@ async def get_version():
 
 # Health check
 @app.get("/health")
-async def health():
+def health():
     """Health check endpoint - also checks database connection"""
     try:
         # Test database connection
@@ -116,11 +138,27 @@ async def health():
         logger.error(f"Health check failed: {e}")
         return {"status": "unhealthy", "database": "disconnected", "error": str(e)}
 
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+def metrics(request: Request):
+    """Metrics in Prometheus text format; requires METRICS_TOKEN as a bearer token when it is set"""
+    from app.config import settings
+    from app.services.metrics import metrics_registry
+    if settings.METRICS_TOKEN and request.headers.get("authorization") != f"Bearer {settings.METRICS_TOKEN}":
+        return JSONResponse(status_code=401, content={"detail": "Not authenticated"})
+    return PlainTextResponse(metrics_registry.expose(), media_type="text/plain; version=0.0.4")
+
 # Startup event - initialize database
 @app.on_event("startup")
 async def startup_event():
     """Initialize database on startup with retry logic"""
     logger.info("Starting application...")
+    
+    # Route handlers are sync and run on AnyIO's worker threads; size that pool explicitly
+    from anyio import to_thread
+    from app.config import settings
+    to_thread.current_default_thread_limiter().total_tokens = settings.THREADPOOL_SIZE
+    
     try:
         init_database()
         # Initialize demo data if tables are empty
@@ -133,6 +171,55 @@ async def startup_event():
         logger.error(f"Failed to initialize database on startup: {e}")
         # Don't crash the app, let it continue and retry on first request
         pass
+    
+    # Background writer for API request logs (after the tables exist)
+    from app.services.api_log_writer import api_log_writer
+    api_log_writer.start()
+    
+    # Create upcoming api_logs partitions and drop expired ones, now and periodically
+    import asyncio
+    from app.services.log_partition_service import api_log_partitions
+    app.state.partition_maintenance = asyncio.create_task(
+        api_log_partitions.run_forever(settings.API_LOG_PARTITION_MAINTENANCE_SECONDS)
+    )
+    
+    # Keep the B2 bucket size snapshot fresh (the listing runs on its own thread)
+    from app.services.bucket_storage_service import bucket_storage_snapshots
+    app.state.bucket_snapshots = asyncio.create_task(bucket_storage_snapshots.run_forever())
+    
+    # Expire unconfirmed uploads and release their reserved storage
+    from app.services.upload_reservation_service import upload_reservations
+    app.state.upload_sweeper = asyncio.create_task(
+        upload_reservations.run_forever(settings.UPLOAD_SWEEP_INTERVAL_SECONDS)
+    )
+    
+    # Measure event loop lag and capture the stack of anything blocking the loop
+    if settings.LOOP_MONITOR_ENABLED:
+        from app.services.loop_monitor import loop_lag_monitor
+        loop_lag_monitor.start()
+
+# Shutdown event - write queued API logs and stop background tasks
+@app.on_event("shutdown")
+def shutdown_event():
+    """Flush the API log queue before the process exits"""
+    # First: the shutdown steps below block the loop on purpose
+    from app.services.loop_monitor import loop_lag_monitor
+    loop_lag_monitor.stop()
+    
+    from app.services.api_log_writer import api_log_writer
+    api_log_writer.stop()
+    
+    partition_maintenance = getattr(app.state, "partition_maintenance", None)
+    if partition_maintenance is not None:
+        partition_maintenance.cancel()
+    
+    bucket_snapshots = getattr(app.state, "bucket_snapshots", None)
+    if bucket_snapshots is not None:
+        bucket_snapshots.cancel()
+    
+    upload_sweeper = getattr(app.state, "upload_sweeper", None)
+    if upload_sweeper is not None:
+        upload_sweeper.cancel()
 
 # Global exception handler
 @app.exception_handler(Exception)
@@ -1,95 +1,73 @@
 import logging
 import time
 import json
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
-from sqlalchemy.orm import Session
-from app.database import SessionLocal
-from app.models import ApiLog
-from datetime import datetime
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from datetime import datetime, timezone
+from typing import Optional
+from urllib.parse import parse_qsl
+from app.config import settings
+from app.services.api_log_rollup import api_log_rollups, method_label
+from app.services.api_log_writer import api_log_writer
+from app.services.log_sampling import log_sampling_policy
 
 logger = logging.getLogger(__name__)
 
-class ApiLoggingMiddleware(BaseHTTPMiddleware):
-    """Middleware to log all API requests to database"""
+# Only these bodies are worth logging; uploads and other binary payloads are never buffered
+LOGGED_BODY_CONTENT_TYPES = ("application/json", "application/x-www-form-urlencoded", "text/")
+
+class ApiLoggingMiddleware:
+    """Pure ASGI middleware to log all API requests to database.
     
-    async def dispatch(self, request: Request, call_next):
-        start_time = time.time()
-        db: Session = SessionLocal()
-        
-        # Extract request info
-        method = request.method
-        path = str(request.url.path)
-        ip_address = request.client.host if request.client else None
-        user_agent = request.headers.get("user-agent", "")
-        
-        # Get user and tenant from request state (set by auth middleware)
-        user_id = None
-        tenant_id = None
+    The request body is never read on the app's behalf: receive() is wrapped
+    so the chunks the endpoint consumes anyway are copied (up to
+    API_LOG_MAX_BODY_BYTES) as they pass through, and send() is wrapped to
+    pick up the status code. Every request is folded into api_log_rollups;
+    log_sampling_policy decides which requests are also kept as rows, and
+    rows are written by api_log_writer in batches.
+    """
+    
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
         
-        # Try to get user_id from JWT token in Authorization header
-        auth_header = request.headers.get("authorization", "")
-        if auth_header.startswith("Bearer "):
-            try:
-                from jose import jwt
-                from app.config import settings
-                token = auth_header.split(" ")[1]
-                if token:  # Only try to decode if token exists
-                    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-                    user_id_str = payload.get("sub")
-                    if user_id_str:
-                        try:
-                            user_id = int(user_id_str)
-                            tenant_id = payload.get("tenant_id")
-                        except (ValueError, TypeError):
-                            pass  # Invalid user_id format
-            except Exception as e:
-                # JWT decode failed (expired, invalid, etc.) - ignore silently
-                # This is expected for unauthenticated requests
-                pass
+        start_time = time.time()
+        headers = Headers(scope=scope)
+        method = scope["method"]
         
-        # Get tenant from request state (set by tenant middleware)
-        if hasattr(request.state, 'tenant_id'):
-            tenant_id = request.state.tenant_id
-        elif hasattr(request.state, 'tenant') and request.state.tenant:
-            tenant_id = request.state.tenant.id
+        # Peek at the request body (for POST/PUT/PATCH) without consuming it
+        body_chunks = []
+        body_state = {"size": 0, "truncated": False}
+        capture_body = method in ["POST", "PUT", "PATCH"] and self._should_capture_body(headers)
         
-        # Read request body (for POST/PUT/PATCH)
-        request_body = None
-        if method in ["POST", "PUT", "PATCH"]:
-            try:
-                body_bytes = await request.body()
-                if body_bytes:
-                    # Try to parse as JSON
-                    try:
-                        body_json = json.loads(body_bytes.decode('utf-8'))
-                        # Sanitize sensitive fields
-                        sanitized_body = self._sanitize_request_body(body_json)
-                        request_body = json.dumps(sanitized_body)
-                    except (json.JSONDecodeError, UnicodeDecodeError):
-                        # Not JSON or binary, store as text (truncated)
-                        body_str = body_bytes.decode('utf-8', errors='ignore')[:1000]
-                        request_body = body_str if body_str else None
-            except Exception as e:
-                logger.warning(f"Error reading request body: {e}")
+        async def receive_wrapper() -> Message:
+            message = await receive()
+            if capture_body and message["type"] == "http.request" and not body_state["truncated"]:
+                chunk = message.get("body", b"")
+                if body_state["size"] + len(chunk) > settings.API_LOG_MAX_BODY_BYTES:
+                    body_state["truncated"] = True
+                    body_chunks.clear()
+                elif chunk:
+                    body_chunks.append(chunk)
+                    body_state["size"] += len(chunk)
+            return message
         
         # Execute request
         status_code = 500
-        response_body = None
         error_message = None
         
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
         try:
-            response = await call_next(request)
-            status_code = response.status_code
-            
-            # Only log response body for errors (to avoid performance issues)
-            if status_code >= 400:
-                try:
-                    # Store response body for logging (but don't consume it)
-                    # We'll log it after the response is sent
-                    pass  # Response body logging handled in finally block
-                except Exception as e:
-                    logger.warning(f"Error preparing response body logging: {e}")
+            await self.app(scope, receive_wrapper if capture_body else receive, send_wrapper)
         except Exception as e:
             status_code = 500
             error_message = str(e)[:1000]  # Truncate long error messages
@@ -97,35 +75,122 @@ class ApiLoggingMiddleware(BaseHTTPMiddleware):
             raise
         finally:
             # Calculate duration
-            duration_ms = int((time.time() - start_time) * 1000)
-            
-            # Log to database (async, don't block response)
+            elapsed_ms = (time.time() - start_time) * 1000
             try:
-                api_log = ApiLog(
-                    method=method,
-                    path=path,
-                    status_code=status_code,
-                    user_id=user_id,
-                    tenant_id=tenant_id,
-                    ip_address=ip_address,
-                    user_agent=user_agent[:500],  # Truncate long user agents
-                    request_body=request_body[:5000] if request_body else None,  # Limit size
-                    response_body=response_body,
-                    error_message=error_message,
-                    duration_ms=duration_ms
-                )
-                db.add(api_log)
-                db.commit()
+                self._submit(scope, headers, status_code, error_message, elapsed_ms, body_chunks, body_state)
             except Exception as e:
                 logger.error(f"Error logging API request: {e}", exc_info=True)
-                db.rollback()
-            finally:
-                db.close()
+    
+    def _submit(self, scope: Scope, headers: Headers, status_code: int, error_message: Optional[str],
+                elapsed_ms: float, body_chunks: list, body_state: dict):
+        path = scope["path"]
+        route_path = getattr(scope.get("route"), "path", None)
+        duration_ms = int(elapsed_ms)
+        
+        # Get tenant from request state (set by tenant middleware), else from the JWT
+        identity = None
+        state = scope.get("state", {})
+        if "tenant_id" in state:
+            tenant_id = state["tenant_id"]
+        elif state.get("tenant"):
+            tenant_id = state["tenant"].id
+        else:
+            identity = self._identify(headers.get("authorization", ""))
+            tenant_id = identity[1]
+        
+        # Every request feeds the per-minute rollups, sampled out or not
+        api_log_rollups.add(method_label(scope["method"]), route_path, status_code, tenant_id, elapsed_ms)
         
-        return response
+        # Errors and slow requests are always kept; the rest is sampled per route
+        sample_weight = log_sampling_policy.sample_weight(path, status_code, duration_ms, route_path)
+        if sample_weight is None:
+            return
+        
+        if identity is None:
+            identity = self._identify(headers.get("authorization", ""))
+        user_id = identity[0]
+        
+        request_body = None
+        if body_chunks and not body_state["truncated"]:
+            request_body = self._format_request_body(b"".join(body_chunks), headers.get("content-type", "").lower())
+        
+        client = scope.get("client")
+        
+        # The route template identifies the endpoint; the concrete path is only worth
+        # its index space when someone will look at this particular request
+        keep_path = (
+            route_path is None
+            or status_code >= 400
+            or duration_ms >= log_sampling_policy.slow_threshold_ms(path, route_path)
+        )
+        
+        # Queued for the background writer; the request never waits on the database
+        api_log_writer.submit({
+            "method": method_label(scope["method"]),
+            "route": route_path,  # Interned to route_id by the writer
+            "path": path[:500] if keep_path else None,
+            "status_code": status_code,
+            "user_id": user_id,
+            "tenant_id": tenant_id,
+            "ip_address": client[0] if client else None,
+            "user_agent": headers.get("user-agent", "")[:500],  # Truncate long user agents
+            "request_body": request_body[:5000] if request_body else None,  # Limit size
+            "response_body": None,
+            "error_message": error_message,
+            "duration_ms": duration_ms,
+            "sample_weight": sample_weight,
+            "created_at": datetime.now(timezone.utc)
+        })
+    
+    def _identify(self, auth_header: str):
+        """Get (user_id, tenant_id) from the JWT in the Authorization header, if any"""
+        if not auth_header.startswith("Bearer "):
+            return None, None
+        try:
+            from jose import jwt
+            token = auth_header.split(" ")[1]
+            if token:  # Only try to decode if token exists
+                payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+                user_id_str = payload.get("sub")
+                if user_id_str:
+                    return int(user_id_str), payload.get("tenant_id")
+        except Exception:
+            # JWT decode failed (expired, invalid, etc.) - ignore silently
+            # This is expected for unauthenticated requests
+            pass
+        return None, None
     
-    def _sanitize_request_body(self, body: dict) -> dict:
+    def _should_capture_body(self, headers: Headers) -> bool:
+        content_type = headers.get("content-type", "").lower()
+        if not content_type.startswith(LOGGED_BODY_CONTENT_TYPES):
+            return False
+        content_length = headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > settings.API_LOG_MAX_BODY_BYTES:
+            return False
+        return True
+    
+    def _format_request_body(self, body_bytes: bytes, content_type: str) -> Optional[str]:
+        # Form posts (e.g. the OAuth2 login) carry passwords too; sanitize them like JSON
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            form = dict(parse_qsl(body_bytes.decode('latin-1'), keep_blank_values=True))
+            return json.dumps(self._sanitize_request_body(form))
+        # Try to parse as JSON
+        try:
+            body_json = json.loads(body_bytes.decode('utf-8'))
+            # Sanitize sensitive fields
+            return json.dumps(self._sanitize_request_body(body_json))
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            # Not JSON, store as text (truncated)
+            body_str = body_bytes.decode('utf-8', errors='ignore')[:1000]
+            return body_str if body_str else None
+    
+    def _sanitize_request_body(self, body):
         """Remove sensitive fields from request body before logging"""
+        if isinstance(body, list):
+            return [self._sanitize_request_body(item) for item in body]
+        if not isinstance(body, dict):
+            return body
+        
         sensitive_fields = ['password', 'key', 'secret', 'token', 'authorization', 'api_key']
         sanitized = {}
         
@@ -133,15 +198,7 @@ class ApiLoggingMiddleware(BaseHTTPMiddleware):
             key_lower = key.lower()
             if any(sensitive in key_lower for sensitive in sensitive_fields):
                 sanitized[key] = "***REDACTED***"
-            elif isinstance(value, dict):
-                sanitized[key] = self._sanitize_request_body(value)
-            elif isinstance(value, list):
-                sanitized[key] = [
-                    self._sanitize_request_body(item) if isinstance(item, dict) else item
-                    for item in value
-                ]
             else:
-                sanitized[key] = value
+                sanitized[key] = self._sanitize_request_body(value)
         
         return sanitized
-
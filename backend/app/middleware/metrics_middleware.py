@@ -0,0 +1,43 @@
+import time
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.services.api_log_rollup import UNMATCHED_ROUTE, method_label
+from app.services.metrics import http_request_duration_seconds, http_requests_in_flight
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording request latency and in-flight requests.
+    
+    Latency is labelled with the matched route template (set in the scope by
+    the router), never the raw path, and with a fixed set of methods, so the
+    number of series stays bounded.
+    """
+    
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        start = time.perf_counter()
+        status_code = 500
+        
+        async def send_wrapper(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+        
+        in_flight = http_requests_in_flight.labels()
+        in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            status_code = 500
+            raise
+        finally:
+            in_flight.dec()
+            route = getattr(scope.get("route"), "path", None) or UNMATCHED_ROUTE
+            http_request_duration_seconds.labels(method_label(scope["method"]), route, str(status_code)).observe(
+                time.perf_counter() - start
+            )
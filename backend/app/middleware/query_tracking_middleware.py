@@ -0,0 +1,63 @@
+import logging
+import time
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.config import settings
+from app.services.query_tracker import QueryStats, current_query_stats
+
+logger = logging.getLogger(__name__)
+
+class QueryTrackingMiddleware:
+    """Pure ASGI middleware counting SQL statements per request (debug instrumentation).
+    
+    Adds a Server-Timing header (db time and statement count, total time) and
+    logs a warning when a request runs more than SQL_QUERY_WARN_COUNT
+    statements or repeats one statement shape more than SQL_QUERY_WARN_REPEATS
+    times (the usual N+1 signature). Only installed when SQL_QUERY_TRACKING is on.
+    """
+    
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self.warn_count = settings.SQL_QUERY_WARN_COUNT
+        self.warn_repeats = settings.SQL_QUERY_WARN_REPEATS
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        stats = QueryStats()
+        token = current_query_stats.set(stats)
+        start = time.perf_counter()
+        
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                # Statements still running while the body streams are not included
+                total_ms = (time.perf_counter() - start) * 1000
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries", total;dur={total_ms:.1f}'
+                )
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_query_stats.reset(token)
+            self._check(scope, stats)
+    
+    def _check(self, scope: Scope, stats: QueryStats):
+        route = getattr(scope.get("route"), "path", None) or scope.get("path")
+        if stats.count > self.warn_count:
+            logger.warning(
+                f"{scope['method']} {route} ran {stats.count} SQL statements "
+                f"({stats.duration * 1000:.1f} ms in the database)"
+            )
+        repeated = stats.repeated(self.warn_repeats)
+        if repeated:
+            shape, times = repeated[0]
+            logger.warning(
+                f"Possible N+1 in {scope['method']} {route}: statement repeated {times}x "
+                f"({len(repeated)} repeated shape(s)): {shape[:300]}"
+            )
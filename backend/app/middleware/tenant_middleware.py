@@ -1,78 +1,100 @@
-from fastapi import Request, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
-from sqlalchemy.orm import Session
-from app.database import SessionLocal
-from app.models import Tenant
+from datetime import datetime, timezone
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+from typing import Optional
 from app.config import settings
+from app.services.tenant_cache import tenant_cache, is_cached
 import logging
 
 logger = logging.getLogger(__name__)
 
-class TenantMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Skip tenant resolution for OPTIONS requests (CORS preflight)
-        if request.method == "OPTIONS":
-            response = await call_next(request)
-            return response
+# Labels under BASE_DOMAIN that are not tenant subdomains
+RESERVED_SUBDOMAINS = {"www", "admin", "api"}
+
+def extract_subdomain(host: str) -> Optional[str]:
+    """Return the tenant label of host, only for hosts under BASE_DOMAIN or *.localhost.
+    
+    Anything else (load balancer hostnames, bare IPs, docker service names)
+    carries no tenant, so it must not be resolved against the tenants table.
+    """
+    hostname = host.split(":", 1)[0].lower().rstrip(".")
+    for base_domain in (settings.BASE_DOMAIN.lower(), "localhost"):
+        if base_domain and hostname.endswith("." + base_domain):
+            label = hostname[: -len(base_domain) - 1]
+            if label and "." not in label:
+                return label
+    return None
+
+class TenantMiddleware:
+    """Pure ASGI middleware that resolves the tenant for a request into scope["state"].
+    
+    It only reads the Host header, so the body stream and the response pass
+    straight through (no BaseHTTPMiddleware task/stream per request).
+    """
+    
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        # Skip tenant resolution for non-HTTP traffic and OPTIONS requests (CORS preflight)
+        if scope["type"] != "http" or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
         
-        # Extract subdomain from host
-        host = request.headers.get("host", "")
+        # request.state is backed by this dict
+        state = scope.setdefault("state", {})
+        path = scope["path"]
         
         # Skip tenant resolution for admin routes and health checks
-        if request.url.path.startswith("/api/admin") or request.url.path in ["/", "/health"]:
-            request.state.tenant = None
-            request.state.is_admin = True
-            response = await call_next(request)
-            return response
+        if path.startswith("/api/admin") or path in ["/", "/health"]:
+            state["tenant"] = None
+            state["is_admin"] = True
+            await self.app(scope, receive, send)
+            return
         
-        # Extract subdomain
-        subdomain = None
-        if host:
-            parts = host.split(".")
-            if len(parts) >= 3:
-                subdomain = parts[0]
-            elif len(parts) == 2 and parts[0] != "www" and parts[0] != "admin":
-                subdomain = parts[0]
+        # Extract subdomain from host
+        subdomain = extract_subdomain(Headers(scope=scope).get("host", ""))
         
         # For admin subdomain
         if subdomain == "admin":
-            request.state.tenant = None
-            request.state.is_admin = True
-            response = await call_next(request)
-            return response
+            state["tenant"] = None
+            state["is_admin"] = True
+            await self.app(scope, receive, send)
+            return
+        
+        if subdomain in RESERVED_SUBDOMAINS:
+            subdomain = None
         
-        # Resolve tenant from subdomain
+        # Resolve tenant from subdomain (cached; only a miss touches the database)
         if subdomain:
-            db: Session = SessionLocal()
             try:
-                tenant = db.query(Tenant).filter(
-                    Tenant.subdomain == subdomain,
-                    Tenant.is_active == True
-                ).first()
-                
-                if not tenant:
-                    raise HTTPException(status_code=404, detail="Tenant not found")
-                
-                # Check expiration - use timezone-aware datetime
-                from datetime import datetime, timezone
-                if tenant.expires_at and tenant.expires_at < datetime.now(timezone.utc):
-                    raise HTTPException(status_code=403, detail="Tenant subscription expired")
-                
-                request.state.tenant = tenant
-                request.state.tenant_id = tenant.id
-                request.state.is_admin = False
-                
-            except HTTPException:
-                raise
+                tenant = tenant_cache.peek_subdomain(subdomain)
+                if not is_cached(tenant):
+                    tenant = await run_in_threadpool(tenant_cache.load_by_subdomain, subdomain)
             except Exception as e:
                 logger.error(f"Error resolving tenant: {e}")
-                raise HTTPException(status_code=500, detail="Error resolving tenant")
-            finally:
-                db.close()
+                response = JSONResponse(status_code=500, content={"detail": "Error resolving tenant"})
+                await response(scope, receive, send)
+                return
+            
+            if not tenant or not tenant.is_active:
+                response = JSONResponse(status_code=404, content={"detail": "Tenant not found"})
+                await response(scope, receive, send)
+                return
+            
+            # Check expiration - use timezone-aware datetime
+            if tenant.expires_at and tenant.expires_at < datetime.now(timezone.utc):
+                response = JSONResponse(status_code=403, content={"detail": "Tenant subscription expired"})
+                await response(scope, receive, send)
+                return
+            
+            state["tenant"] = tenant
+            state["tenant_id"] = tenant.id
+            state["is_admin"] = False
         else:
-            request.state.tenant = None
-            request.state.is_admin = False
+            state["tenant"] = None
+            state["is_admin"] = False
         
-        response = await call_next(request)
-        return response
-
+        await self.app(scope, receive, send)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, BigInteger, Text
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, BigInteger, Text, Float, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -46,6 +46,10 @@ class User(Base):
 
 class Photo(Base):
     __tablename__ = "photos"
+    # The expiry sweeper range-scans (state, expires_at); see app/services/upload_reservation_service.py
+    __table_args__ = (
+        Index("ix_photos_state_expires_at", "state", "expires_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True)
@@ -55,8 +59,43 @@ class Photo(Base):
     file_size_bytes = Column(BigInteger, nullable=False)
     content_type = Column(String(100))
     uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
+    # pending: upload URL handed out, size reserved until expires_at; confirmed: in B2;
+    # expired: reservation released by the sweeper, row about to be deleted
+    state = Column(String(20), nullable=False, default="confirmed", server_default="confirmed")
+    expires_at = Column(DateTime(timezone=True))  # Only set while pending
     
     tenant = relationship("Tenant", back_populates="photos")
+    multipart_upload = relationship("MultipartUpload", back_populates="photo", uselist=False, cascade="all, delete-orphan")
+
+class MultipartUpload(Base):
+    __tablename__ = "multipart_uploads"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False, index=True)
+    photo_id = Column(Integer, ForeignKey("photos.id"), nullable=False, unique=True)
+    b2_key = Column(String(1000), nullable=False)
+    b2_upload_id = Column(String(500), nullable=False)  # UploadId returned by B2
+    part_size_bytes = Column(BigInteger, nullable=False)
+    total_parts = Column(Integer, nullable=False)
+    status = Column(String(20), default="in_progress")  # 'in_progress', 'completed', 'aborted'
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    
+    photo = relationship("Photo", back_populates="multipart_upload")
+    parts = relationship("MultipartUploadPart", back_populates="upload", cascade="all, delete-orphan", order_by="MultipartUploadPart.part_number")
+
+class MultipartUploadPart(Base):
+    __tablename__ = "multipart_upload_parts"
+    __table_args__ = (UniqueConstraint("multipart_upload_id", "part_number", name="uq_multipart_upload_part"),)
+    
+    id = Column(Integer, primary_key=True, index=True)
+    multipart_upload_id = Column(Integer, ForeignKey("multipart_uploads.id"), nullable=False, index=True)
+    part_number = Column(Integer, nullable=False)
+    etag = Column(String(200), nullable=False)
+    size_bytes = Column(BigInteger, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    upload = relationship("MultipartUpload", back_populates="parts")
 
 class UsageLog(Base):
     __tablename__ = "usage_logs"
@@ -83,21 +122,107 @@ class B2Credential(Base):
 
 class ApiLog(Base):
     __tablename__ = "api_logs"
+    # Range-partitioned by day/month on created_at (see app/services/log_partition_service.py).
+    # MySQL requires the partition column in every unique key and allows no foreign keys on
+    # partitioned tables, hence the (id, created_at) primary key and plain user/tenant ids.
+    # Each admin filter has a (filter, created_at, id) index so a page is a range scan in
+    # (created_at, id) order; see get_api_logs in app/routers/admin.py.
+    __table_args__ = (
+        Index("ix_api_logs_method_created_at", "method", "created_at", "id"),
+        Index("ix_api_logs_status_code_created_at", "status_code", "created_at", "id"),
+        Index("ix_api_logs_user_id_created_at", "user_id", "created_at", "id"),
+        Index("ix_api_logs_tenant_id_created_at", "tenant_id", "created_at", "id"),
+        Index("ix_api_logs_route_id_created_at", "route_id", "created_at", "id"),
+        {"mysql_partition_by": "RANGE (TO_DAYS(created_at)) (PARTITION pmax VALUES LESS THAN MAXVALUE)"}
+    )
     
-    id = Column(Integer, primary_key=True, index=True)
-    method = Column(String(10), nullable=False, index=True)  # GET, POST, PUT, DELETE, etc.
-    path = Column(String(500), nullable=False, index=True)
-    status_code = Column(Integer, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
-    tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=True, index=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    method = Column(String(10), nullable=False)  # GET, POST, PUT, DELETE, etc.
+    route_id = Column(Integer, nullable=True)  # api_routes.id of the matched route template
+    path = Column(String(500), nullable=True)  # Concrete path; only kept for errors, slow and unmatched requests
+    status_code = Column(Integer)
+    user_id = Column(Integer, nullable=True)
+    tenant_id = Column(Integer, nullable=True)
     ip_address = Column(String(45))  # IPv6 compatible
     user_agent = Column(Text)
     request_body = Column(Text)  # JSON string of request body (sanitized)
     response_body = Column(Text)  # JSON string of response body (truncated if large)
     error_message = Column(Text)  # Error details if request failed
     duration_ms = Column(Integer)  # Request duration in milliseconds
-    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    sample_weight = Column(Float, nullable=False, default=1.0, server_default="1")  # Requests this row stands for (1 / sample rate)
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now(), index=True)
+    
+    user = relationship("User", primaryjoin="foreign(ApiLog.user_id) == User.id")
+    tenant = relationship("Tenant", primaryjoin="foreign(ApiLog.tenant_id) == Tenant.id")
+    route = relationship("ApiRoute", primaryjoin="foreign(ApiLog.route_id) == ApiRoute.id")
+
+class ApiRoute(Base):
+    """Interned route templates referenced by api_logs.route_id"""
+    __tablename__ = "api_routes"
     
-    user = relationship("User")
-    tenant = relationship("Tenant")
+    id = Column(Integer, primary_key=True)
+    template = Column(String(500), unique=True, nullable=False)  # e.g. /api/tenant/photos/{photo_id}
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+class ApiLogRollup(Base):
+    """Per-minute request counts and latency sketch per (method, route, status class, tenant).
+    
+    Append-only: a bucket can have one row per writer process; readers merge them.
+    """
+    __tablename__ = "api_log_rollups"
+    __table_args__ = (
+        Index("ix_api_log_rollups_bucket_route", "bucket_start", "route"),
+        Index("ix_api_log_rollups_tenant_bucket", "tenant_id", "bucket_start"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    bucket_start = Column(DateTime(timezone=True), nullable=False)  # Start of the minute (UTC)
+    method = Column(String(10), nullable=False)
+    route = Column(String(500), nullable=False)  # Route template, e.g. /api/tenant/photos/{photo_id}
+    status_class = Column(Integer, nullable=False)  # 2, 3, 4 or 5
+    tenant_id = Column(Integer, nullable=False, default=0)  # 0 when no tenant
+    request_count = Column(Integer, nullable=False, default=0)
+    error_count = Column(Integer, nullable=False, default=0)  # status >= 400
+    duration_sum_ms = Column(BigInteger, nullable=False, default=0)
+    duration_max_ms = Column(Integer, nullable=False, default=0)
+    sketch = Column(Text, nullable=False)  # LatencySketch JSON (app/services/latency_sketch.py)
+
+class BucketStorageSnapshot(Base):
+    """Result of one full listing of a B2 bucket (refreshed in the background).
+    
+    One row per refresh job; the newest completed row is what /api/admin/stats serves.
+    """
+    __tablename__ = "bucket_storage_snapshots"
+    __table_args__ = (
+        Index("ix_bucket_storage_snapshots_bucket_status", "bucket_name", "status", "started_at"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    job_id = Column(String(36), nullable=False, unique=True)  # Returned to whoever triggered the refresh
+    bucket_name = Column(String(200), nullable=False)
+    status = Column(String(20), nullable=False, default="running")  # running, completed, failed
+    total_bytes = Column(BigInteger, nullable=False, default=0)
+    total_objects = Column(BigInteger, nullable=False, default=0)
+    prefixes = Column(Text)  # JSON {"tenant_1/": {"bytes": n, "objects": n}, ...}
+    list_calls = Column(Integer, nullable=False, default=0)  # list_objects_v2 calls (B2 class C transactions)
+    error = Column(Text)
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    completed_at = Column(DateTime(timezone=True))
+
+class StorageReconciliation(Base):
+    """One run of the Photo rows <-> B2 objects reconciliation for a tenant (see app/services/reconciliation_service.py)"""
+    __tablename__ = "storage_reconciliations"
+    __table_args__ = (
+        Index("ix_storage_reconciliations_tenant_started", "tenant_id", "started_at"),
+    )
+    
+    id = Column(Integer, primary_key=True)
+    job_id = Column(String(36), nullable=False, unique=True)
+    tenant_id = Column(Integer, nullable=False)  # No foreign key: the history outlives deleted tenants
+    status = Column(String(20), nullable=False, default="running")  # running, completed, failed
+    apply = Column(Boolean, nullable=False, default=False)  # False: report only
+    grace_seconds = Column(Integer, nullable=False)  # Objects/rows younger than this are left alone
+    report = Column(Text(16 * 1024 * 1024 - 1))  # JSON counts, bytes and capped samples per finding (MEDIUMTEXT on MySQL)
+    error = Column(Text)
+    started_at = Column(DateTime(timezone=True), nullable=False)
+    completed_at = Column(DateTime(timezone=True))
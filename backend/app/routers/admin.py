@@ -1,15 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, and_, or_, case, false, text, true
 from pydantic import BaseModel, EmailStr, Field
 from typing import List, Optional
 from app.database import get_db
-from app.models import User, Tenant, Photo, UsageLog, ApiLog
+from app.models import User, Tenant, Photo, UsageLog, ApiLog, ApiLogRollup
 from app.routers.auth import get_current_user
 from app.services.tenant_service import TenantService
-from app.services.b2_service import B2Service
+from app.services.b2_service import B2Service, invalidate_s3_clients, s3_client_pool, presigned_url_cache
+from app.services.bucket_storage_service import bucket_storage_snapshots
+from app.services.reconciliation_service import storage_reconciler
+from app.services.upload_reservation_service import upload_reservations
+from app.services.tenant_cache import tenant_cache
+from app.services.api_log_writer import api_log_writer
+from app.services.log_partition_service import api_log_partitions
+from app.services.latency_sketch import LatencySketch
+from app.services.loop_monitor import loop_lag_monitor
+from app.services.sampling_profiler import ProfilerBusyError, sampling_profiler
+from app.services.route_registry import route_registry
 from app.config import settings
 from datetime import datetime, timedelta, timezone
+import base64
 import logging
 
 router = APIRouter()
@@ -81,8 +93,11 @@ class SystemStatsResponse(BaseModel):
     total_tenants: int
     active_tenants: int
     total_storage_used_mb: float
-    b2_bucket_storage_mb: Optional[float] = 0  # Actual B2 bucket storage
-    b2_bucket_objects: Optional[int] = 0  # Total objects in B2 bucket
+    b2_bucket_storage_mb: Optional[float] = 0  # Actual B2 bucket storage, from the latest snapshot
+    b2_bucket_objects: Optional[int] = 0  # Total objects in B2 bucket, from the latest snapshot
+    b2_snapshot_at: Optional[str] = None  # When that snapshot completed (None: no snapshot yet)
+    b2_snapshot_age_seconds: Optional[int] = None
+    b2_refresh_job_id: Optional[str] = None  # Set when refresh=true started or joined a listing job
     total_photos: int
     total_users: Optional[int] = 0
     registered_clients: Optional[int] = 0
@@ -100,7 +115,7 @@ def require_admin(current_user: User = Depends(get_current_user)):
     return current_user
 
 @router.post("/tenants", response_model=TenantResponse)
-async def create_tenant(
+def create_tenant(
     tenant_data: TenantCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
@@ -123,6 +138,8 @@ async def create_tenant(
             storage_limit_mb=tenant_data.storage_limit_mb,
             expires_at=expires_at
         )
+        # Forget any cached "unknown subdomain" miss
+        tenant_cache.invalidate(subdomain=tenant.subdomain)
         
         # Create a user account for the tenant
         from app.routers.auth import get_password_hash
@@ -163,7 +180,7 @@ async def create_tenant(
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/tenants", response_model=List[TenantResponse])
-async def list_tenants(
+def list_tenants(
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
@@ -190,7 +207,7 @@ async def list_tenants(
     ]
 
 @router.get("/tenants/{tenant_id}", response_model=TenantStatsResponse)
-async def get_tenant_stats(
+def get_tenant_stats(
     tenant_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
@@ -205,7 +222,7 @@ async def get_tenant_stats(
     return TenantStatsResponse(**stats)
 
 @router.get("/tenants/{tenant_id}/details", response_model=TenantDetailsResponse)
-async def get_tenant_details(
+def get_tenant_details(
     tenant_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
@@ -219,7 +236,7 @@ async def get_tenant_details(
     user_count = db.query(User).filter(User.tenant_id == tenant_id).count()
     
     # Get photo count
-    photo_count = db.query(Photo).filter(Photo.tenant_id == tenant_id).count()
+    photo_count = db.query(Photo).filter(Photo.tenant_id == tenant_id, Photo.state == "confirmed").count()
     
     # Build DNS record URL
     from app.config import settings
@@ -242,7 +259,7 @@ async def get_tenant_details(
     )
 
 @router.put("/tenants/{tenant_id}", response_model=TenantResponse)
-async def update_tenant(
+def update_tenant(
     tenant_id: int,
     update_data: TenantUpdate,
     db: Session = Depends(get_db),
@@ -269,6 +286,7 @@ async def update_tenant(
     
     db.commit()
     db.refresh(tenant)
+    tenant_cache.invalidate(tenant_id=tenant.id)
     
     return TenantResponse(
         id=tenant.id,
@@ -283,7 +301,7 @@ async def update_tenant(
     )
 
 @router.patch("/tenants/{tenant_id}/storage-limit", response_model=TenantResponse)
-async def update_tenant_storage_limit(
+def update_tenant_storage_limit(
     tenant_id: int,
     update_data: TenantStorageUpdate,
     db: Session = Depends(get_db),
@@ -313,6 +331,7 @@ async def update_tenant_storage_limit(
     
     db.commit()
     db.refresh(tenant)
+    tenant_cache.invalidate(tenant_id=tenant.id)
     
     return TenantResponse(
         id=tenant.id,
@@ -327,7 +346,7 @@ async def update_tenant_storage_limit(
     )
 
 @router.delete("/tenants/{tenant_id}")
-async def delete_tenant(
+def delete_tenant(
     tenant_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
@@ -338,75 +357,162 @@ async def delete_tenant(
     
     if not success:
         raise HTTPException(status_code=404, detail="Tenant not found")
+    tenant_cache.invalidate(tenant_id=tenant_id)
     
     return {"message": "Tenant deleted successfully"}
 
+@router.post("/tenants/{tenant_id}/reconcile", status_code=status.HTTP_202_ACCEPTED)
+def reconcile_tenant_storage(
+    tenant_id: int,
+    apply: bool = Query(False, description="Delete orphan objects and missing rows and fix sizes, instead of only reporting"),
+    grace_seconds: int = Query(settings.RECONCILE_GRACE_SECONDS, ge=0, description="Leave objects/rows younger than this alone"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """Compare the tenant's Photo rows with its B2 objects in the background (or join the running comparison)"""
+    if not db.query(Tenant.id).filter(Tenant.id == tenant_id).first():
+        raise HTTPException(status_code=404, detail="Tenant not found")
+    return storage_reconciler.start(db, tenant_id, apply=apply, grace_seconds=grace_seconds)
+
+@router.get("/tenants/{tenant_id}/reconciliations")
+def list_tenant_reconciliations(
+    tenant_id: int,
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """Recent reconciliation runs for the tenant, newest first (without reports)"""
+    jobs = storage_reconciler.list_jobs(db, tenant_id, limit)
+    return [storage_reconciler.to_dict(job, include_report=False) for job in jobs]
+
+@router.get("/reconciliations/{job_id}")
+def get_reconciliation(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """Status and report of a reconciliation run"""
+    job = storage_reconciler.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Reconciliation not found")
+    return storage_reconciler.to_dict(job)
+
+@router.get("/upload-reservations")
+def get_upload_reservations(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """Pending upload reservations (and how many are past expiry) and expired rows awaiting cleanup"""
+    return upload_reservations.summary(db)
+
+@router.post("/upload-reservations/sweep")
+def sweep_upload_reservations(
+    current_user: User = Depends(require_admin)
+):
+    """Expire due pending uploads and delete expired rows now"""
+    return upload_reservations.sweep()
+
 @router.get("/stats", response_model=SystemStatsResponse)
-async def get_system_stats(
+def get_system_stats(
+    refresh: bool = Query(False, description="Also start a background B2 bucket listing; its job id is returned"),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
 ):
     """Get overall system statistics"""
     tenant_service = TenantService(db)
     
-    total_tenants = db.query(Tenant).count()
-    active_tenants = db.query(Tenant).filter(Tenant.is_active == True).count()
-    total_photos = db.query(Photo).count()
-    total_users = db.query(User).count()
-    registered_clients = db.query(User).filter(User.is_admin == False).count()
+    # All totals in one statement: a conditional aggregate per table, cross-joined (one row each)
+    tenant_totals = db.query(
+        func.count(Tenant.id).label("total_tenants"),
+        func.coalesce(func.sum(case((Tenant.is_active == True, 1), else_=0)), 0).label("active_tenants"),
+        func.coalesce(func.sum(Tenant.storage_used_bytes), 0).label("total_storage_bytes")
+    ).subquery()
+    user_totals = db.query(
+        func.count(User.id).label("total_users"),
+        func.coalesce(func.sum(case((User.is_admin == False, 1), else_=0)), 0).label("registered_clients")
+    ).subquery()
+    photo_totals = db.query(func.count(Photo.id).label("total_photos")).filter(Photo.state == "confirmed").subquery()
+    totals = db.query(tenant_totals, user_totals, photo_totals).select_from(tenant_totals).join(
+        user_totals, true()
+    ).join(photo_totals, true()).one()
     
-    total_storage_bytes = db.query(func.sum(Tenant.storage_used_bytes)).scalar() or 0
+    total_tenants = totals.total_tenants
+    active_tenants = int(totals.active_tenants)
+    total_photos = totals.total_photos
+    total_users = totals.total_users
+    registered_clients = int(totals.registered_clients)
+    
+    total_storage_bytes = int(totals.total_storage_bytes)
     total_storage_mb = round(total_storage_bytes / (1024 * 1024), 2)
     
-    # Get actual B2 bucket storage size
-    b2_bucket_storage_mb = 0
-    b2_bucket_objects = 0
-    try:
-        from app.models import B2Credential
-        default_cred = db.query(B2Credential).filter(
-            B2Credential.tenant_id == None,
-            B2Credential.is_active == True
-        ).first()
-        
-        if default_cred:
-            b2_service = B2Service(
-                key_id=default_cred.key_id.strip() if default_cred.key_id else None,
-                key=default_cred.key.strip() if default_cred.key else None,
-                bucket=default_cred.bucket_name.strip() if default_cred.bucket_name else None,
-                endpoint=default_cred.endpoint.strip() if default_cred.endpoint else settings.B2_ENDPOINT
-            )
-            try:
-                bucket_stats = b2_service.get_bucket_storage_size()
-                b2_bucket_storage_mb = bucket_stats.get("total_size_mb", 0)
-                b2_bucket_objects = bucket_stats.get("total_objects", 0)
-                logger.info(f"B2 bucket storage calculated: {b2_bucket_storage_mb} MB, {b2_bucket_objects} objects")
-            except Exception as calc_error:
-                logger.warning(f"Could not calculate bucket storage size: {calc_error}. Using 0.")
-                b2_bucket_storage_mb = 0
-                b2_bucket_objects = 0
-        else:
-            logger.warning("No active default B2 credential found for storage calculation")
-    except Exception as e:
-        logger.error(f"Error calculating B2 bucket storage: {e}", exc_info=True)
+    # B2 bucket storage from the latest background snapshot; listing the bucket here
+    # would cost one B2 transaction per 1000 objects on every call
+    b2_refresh_job_id = None
+    if refresh:
+        try:
+            b2_refresh_job_id = bucket_storage_snapshots.start_refresh(db)["job_id"]
+        except ValueError as e:
+            logger.warning(f"Could not start bucket storage refresh: {e}")
+    snapshot = bucket_storage_snapshots.latest(db)
+    snapshot_data = bucket_storage_snapshots.to_dict(snapshot) if snapshot else None
     
-    # Get stats for all tenants
-    tenants = tenant_service.list_tenants(limit=1000)
-    tenant_stats = [tenant_service.get_tenant_stats(t.id) for t in tenants]
+    # Get stats for all tenants (one grouped query, not one per tenant)
+    tenant_stats = tenant_service.list_tenant_stats(limit=1000)
     
     return SystemStatsResponse(
         total_tenants=total_tenants,
         active_tenants=active_tenants,
         total_storage_used_mb=total_storage_mb,
-        b2_bucket_storage_mb=b2_bucket_storage_mb,  # Actual B2 bucket storage
-        b2_bucket_objects=b2_bucket_objects,  # Total objects in B2 bucket
+        b2_bucket_storage_mb=snapshot_data["total_size_mb"] if snapshot_data else 0,
+        b2_bucket_objects=snapshot_data["total_objects"] if snapshot_data else 0,
+        b2_snapshot_at=snapshot_data["completed_at"] if snapshot_data else None,
+        b2_snapshot_age_seconds=snapshot_data["age_seconds"] if snapshot_data else None,
+        b2_refresh_job_id=b2_refresh_job_id,
         total_photos=total_photos,
         total_users=total_users,
         registered_clients=registered_clients,
         tenants=[TenantStatsResponse(**stats) for stats in tenant_stats]
     )
 
+@router.get("/bucket-storage")
+def get_bucket_storage(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """Latest B2 bucket size snapshot with per-prefix (per-tenant) totals, and any running refresh"""
+    snapshot = bucket_storage_snapshots.latest(db)
+    running = bucket_storage_snapshots.running(db, snapshot.bucket_name) if snapshot else None
+    return {
+        "snapshot": bucket_storage_snapshots.to_dict(snapshot, include_prefixes=True) if snapshot else None,
+        "running_job": bucket_storage_snapshots.to_dict(running) if running else None,
+        "refresh_interval_seconds": bucket_storage_snapshots.interval_seconds
+    }
+
+@router.post("/bucket-storage/refresh", status_code=status.HTTP_202_ACCEPTED)
+def refresh_bucket_storage(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """Start listing the default B2 bucket in the background (or join the running listing)"""
+    try:
+        return bucket_storage_snapshots.start_refresh(db)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/bucket-storage/jobs/{job_id}")
+def get_bucket_storage_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """Status and progress of a bucket listing job"""
+    snapshot = bucket_storage_snapshots.get_job(db, job_id)
+    if not snapshot:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return bucket_storage_snapshots.to_dict(snapshot, include_prefixes=snapshot.status == "completed")
+
 @router.get("/health")
-async def get_system_health(
+def get_system_health(
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
 ):
@@ -491,7 +597,7 @@ async def get_system_health(
     return health_status
 
 @router.get("/b2-credentials")
-async def list_b2_credentials(
+def list_b2_credentials(
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
 ):
@@ -514,7 +620,7 @@ async def list_b2_credentials(
     ]
 
 @router.post("/b2-credentials/test")
-async def test_b2_connection(
+def test_b2_connection(
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
 ):
@@ -596,7 +702,7 @@ async def test_b2_connection(
         }
 
 @router.post("/b2-credentials/{credential_id}/test")
-async def test_b2_credential_connection(
+def test_b2_credential_connection(
     credential_id: int,
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
@@ -632,7 +738,7 @@ async def test_b2_credential_connection(
         }
 
 @router.post("/b2-config/update")
-async def update_b2_config(
+def update_b2_config(
     config_data: B2ConfigUpdate,
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
@@ -662,6 +768,14 @@ async def update_b2_config(
                 detail=f"Invalid key_id format. Expected 10-30 characters, got {len(key_id)}"
             )
         
+        # Remember which credentials were in use so their pooled S3 clients can be dropped
+        previous_key_ids = [
+            c.key_id for c in db.query(B2Credential.key_id).filter(
+                B2Credential.tenant_id == None,
+                B2Credential.is_active == True
+            ).all()
+        ]
+        
         # Deactivate all existing default credentials first
         db.query(B2Credential).filter(
             B2Credential.tenant_id == None
@@ -696,6 +810,9 @@ async def update_b2_config(
         db.commit()
         db.refresh(default_cred)
         
+        for stale_key_id in set(previous_key_ids + [key_id]):
+            invalidate_s3_clients(stale_key_id)
+        
         return {
             "id": default_cred.id,
             "key_id": default_cred.key_id,
@@ -714,7 +831,7 @@ async def update_b2_config(
         )
 
 @router.get("/users")
-async def list_all_users(
+def list_all_users(
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db),
@@ -737,7 +854,7 @@ async def list_all_users(
     ]
 
 @router.get("/b2-config")
-async def get_b2_config(
+def get_b2_config(
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
 ):
@@ -765,18 +882,293 @@ async def get_b2_config(
         "endpoint": settings.B2_ENDPOINT or ""
     }
 
+@router.get("/cache-stats")
+def get_cache_stats(
+    current_user: User = Depends(require_admin)
+):
+    """Hit/miss counters for the in-process caches"""
+    return {
+        "tenant_cache": tenant_cache.stats(),
+        "s3_client_pool": s3_client_pool.stats(),
+        "presigned_url_cache": presigned_url_cache.stats()
+    }
+
+@router.get("/loop-stalls")
+def get_loop_stalls(
+    current_user: User = Depends(require_admin)
+):
+    """Event loop stalls grouped by the call site that was blocking the loop"""
+    return {
+        "enabled": settings.LOOP_MONITOR_ENABLED,
+        "stall_threshold_ms": settings.LOOP_MONITOR_STALL_MS,
+        "call_sites": loop_lag_monitor.report()
+    }
+
+@router.delete("/loop-stalls")
+def reset_loop_stalls(
+    current_user: User = Depends(require_admin)
+):
+    """Clear the collected stall reports"""
+    loop_lag_monitor.reset()
+    return {"message": "Loop stall reports cleared"}
+
+@router.post("/profile", response_class=PlainTextResponse)
+async def profile_worker(
+    seconds: float = Query(10, gt=0),
+    rate_hz: int = Query(settings.PROFILER_DEFAULT_RATE_HZ, gt=0),
+    include_idle: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """Sample every thread of this worker for a while and return collapsed stacks.
+    
+    The output ("frame;frame;frame count" per line) can be fed straight to
+    flamegraph.pl or speedscope. Only one profile runs per worker at a time.
+    """
+    from starlette.concurrency import run_in_threadpool
+    import asyncio
+    
+    if seconds > settings.PROFILER_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be at most {settings.PROFILER_MAX_SECONDS}")
+    if rate_hz > settings.PROFILER_MAX_RATE_HZ:
+        raise HTTPException(status_code=400, detail=f"rate_hz must be at most {settings.PROFILER_MAX_RATE_HZ}")
+    # The admin check is done: hand the pooled connection back, and sample from a thread
+    # outside the request threadpool, so the profile does not take resources from the worker it measures.
+    # Closing the session can block on the connection (rollback), so it does not run on the event loop either
+    await run_in_threadpool(db.close)
+    try:
+        collapsed, stats = await asyncio.to_thread(sampling_profiler.profile, seconds, rate_hz, include_idle)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(collapsed, headers={
+        "X-Profile-Samples": str(stats["samples"]),
+        "X-Profile-Seconds": str(stats["seconds"]),
+        "X-Profile-Overhead": str(stats["overhead"])
+    })
+
+@router.get("/api-logs/writer-stats")
+def get_api_log_writer_stats(
+    current_user: User = Depends(require_admin)
+):
+    """Queue depth and written/dropped counters of the background API log writer"""
+    return api_log_writer.stats()
+
+@router.get("/api-logs/partitions")
+def get_api_log_partitions(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """List api_logs partitions (MySQL)"""
+    if db.bind.dialect.name != "mysql":
+        return {"partitioned": False, "partitions": []}
+    partitions = api_log_partitions.list_partitions(db)
+    return {
+        "partitioned": bool(partitions),
+        "interval": api_log_partitions.interval,
+        "retention_days": api_log_partitions.retention_days,
+        "partitions": [{k: v for k, v in p.items() if k != "upper_bound"} for p in partitions]
+    }
+
+@router.post("/api-logs/partitions/maintain")
+def run_api_log_partition_maintenance(
+    current_user: User = Depends(require_admin)
+):
+    """Create upcoming api_logs partitions and drop expired ones now"""
+    return api_log_partitions.run()
+
+def as_utc_naive(value: datetime) -> datetime:
+    """Query parameter -> naive UTC, as the log tables store it (a naive value is taken to be UTC)"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+@router.get("/api-logs/by-route")
+def get_api_logs_by_route(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    tenant_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """Logged requests per endpoint (default: last 24 hours), grouped on the interned route id"""
+    end = as_utc_naive(end or datetime.now(timezone.utc))
+    start = as_utc_naive(start) if start else end - timedelta(hours=24)
+    query = db.query(
+        ApiLog.route_id,
+        ApiLog.method,
+        func.count(ApiLog.id).label("rows"),
+        func.sum(ApiLog.sample_weight).label("estimated_requests"),
+        func.sum(case((ApiLog.status_code >= 400, ApiLog.sample_weight), else_=0)).label("estimated_errors"),
+        func.avg(ApiLog.duration_ms).label("avg_duration_ms")
+    ).filter(ApiLog.created_at >= start, ApiLog.created_at < end)
+    if tenant_id:
+        query = query.filter(ApiLog.tenant_id == tenant_id)
+    groups = query.group_by(ApiLog.route_id, ApiLog.method).all()
+    
+    routes = route_registry.get_templates(db, (g.route_id for g in groups))
+    return {
+        "start": start.replace(tzinfo=timezone.utc).isoformat(),
+        "end": end.replace(tzinfo=timezone.utc).isoformat(),
+        "routes": sorted(
+            [
+                {
+                    "route": routes.get(g.route_id),  # None: requests that matched no route
+                    "method": g.method,
+                    "rows": g.rows,
+                    "estimated_requests": int(round(g.estimated_requests or 0)),
+                    "estimated_errors": int(round(g.estimated_errors or 0)),
+                    "avg_duration_ms": round(float(g.avg_duration_ms), 1) if g.avg_duration_ms is not None else None
+                }
+                for g in groups
+            ],
+            key=lambda r: r["estimated_requests"],
+            reverse=True
+        )
+    }
+
+ROLLUP_GROUPINGS = {
+    "route": ("method", "route"),
+    "tenant": ("tenant_id",),
+    "status_class": ("status_class",),
+    "none": ()
+}
+
+@router.get("/api-logs/latency")
+def get_api_latency(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    method: Optional[str] = None,
+    route: Optional[str] = None,
+    tenant_id: Optional[int] = None,
+    group_by: str = "route",
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """Request counts, error rate and p50/p95/p99 latency from the per-minute rollups (default: last hour)"""
+    if group_by not in ROLLUP_GROUPINGS:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of {list(ROLLUP_GROUPINGS)}")
+    end = as_utc_naive(end or datetime.now(timezone.utc))
+    start = as_utc_naive(start) if start else end - timedelta(hours=1)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    
+    query = db.query(ApiLogRollup).filter(ApiLogRollup.bucket_start >= start, ApiLogRollup.bucket_start < end)
+    if method:
+        query = query.filter(ApiLogRollup.method == method.upper())
+    if route:
+        query = query.filter(ApiLogRollup.route == route)
+    if tenant_id is not None:
+        query = query.filter(ApiLogRollup.tenant_id == tenant_id)
+    
+    # Merge every minute (and every worker's row) of each group into one sketch. Rows written
+    # under another API_LOG_ROLLUP_SKETCH_ACCURACY are re-binned into the coarser accuracy.
+    group_columns = ROLLUP_GROUPINGS[group_by]
+    groups = {}
+    rows = 0
+    rows_by_accuracy = {}
+    for rollup in query.yield_per(1000):
+        rows += 1
+        key = tuple(getattr(rollup, column) for column in group_columns)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {"requests": 0, "errors": 0, "sketch": None}
+        group["requests"] += rollup.request_count
+        group["errors"] += rollup.error_count
+        sketch = LatencySketch.from_json(rollup.sketch)
+        rows_by_accuracy[sketch.relative_accuracy] = rows_by_accuracy.get(sketch.relative_accuracy, 0) + 1
+        if group["sketch"] is None:
+            group["sketch"] = sketch
+        else:
+            if sketch.relative_accuracy > group["sketch"].relative_accuracy:
+                group["sketch"] = group["sketch"].rebinned(sketch.relative_accuracy)
+            group["sketch"].merge(sketch)
+    
+    def round_ms(value):
+        return round(value, 1) if value is not None else None
+    
+    results = []
+    for key, group in groups.items():
+        sketch = group["sketch"]
+        results.append({
+            **dict(zip(group_columns, key)),
+            "requests": group["requests"],
+            "errors": group["errors"],
+            "error_rate": round(group["errors"] / group["requests"], 4) if group["requests"] else 0,
+            "p50_ms": round_ms(sketch.quantile(0.5)),
+            "p95_ms": round_ms(sketch.quantile(0.95)),
+            "p99_ms": round_ms(sketch.quantile(0.99)),
+            "mean_ms": round_ms(sketch.mean()),
+            "max_ms": round_ms(sketch.max)
+        })
+    results.sort(key=lambda r: r["requests"], reverse=True)
+    relative_accuracy = max(rows_by_accuracy, default=settings.API_LOG_ROLLUP_SKETCH_ACCURACY)
+    
+    return {
+        "start": start.replace(tzinfo=timezone.utc).isoformat(),
+        "end": end.replace(tzinfo=timezone.utc).isoformat(),
+        "group_by": group_by,
+        "rollup_rows": rows,
+        "rebinned_rows": rows - rows_by_accuracy.get(relative_accuracy, 0),  # Rows written under a finer accuracy
+        "relative_accuracy": relative_accuracy,
+        "groups": results
+    }
+
+def encode_api_log_cursor(created_at: datetime, log_id: int) -> str:
+    """Opaque page token for the position just after (created_at, id)"""
+    raw = f"{created_at.isoformat()}|{log_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_api_log_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+        created_at, log_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created_at), int(log_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def approximate_row_count(db: Session, query) -> int:
+    """Row estimate from the optimizer instead of COUNT(*) (MySQL); exact count elsewhere"""
+    bind = db.get_bind()
+    if bind.dialect.name != "mysql":
+        return query.count()
+    if query.whereclause is None:
+        # Unfiltered: InnoDB's table statistics (summed over partitions)
+        rows = db.execute(text(
+            "SELECT TABLE_ROWS FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table"
+        ), {"table": ApiLog.__tablename__}).scalar()
+        return int(rows or 0)
+    compiled = query.with_entities(ApiLog.id).statement.compile(dialect=bind.dialect)
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+    plan = db.connection().exec_driver_sql("EXPLAIN " + compiled.string, params).mappings().first()
+    if not plan:
+        return 0
+    return int((plan.get("rows") or 0) * float(plan.get("filtered") or 100) / 100)
+
 @router.get("/api-logs")
-async def get_api_logs(
+def get_api_logs(
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    include_total: bool = False,
     method: Optional[str] = None,
     status_code: Optional[int] = None,
     user_id: Optional[int] = None,
     tenant_id: Optional[int] = None,
+    route: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(require_admin)
 ):
-    """Get API logs for troubleshooting"""
+    """Get API logs for troubleshooting, newest first.
+    
+    Pass the returned next_cursor to get the following page; each page is a
+    range scan on a (filter, created_at, id) index, so deep pages cost the same
+    as the first. skip still works for old clients but scans skipped rows.
+    The exact total (COUNT over the whole filter) is only run with include_total.
+    """
+    limit = max(1, min(limit, 1000))
     query = db.query(ApiLog)
     
     if method:
@@ -787,16 +1179,59 @@ async def get_api_logs(
         query = query.filter(ApiLog.user_id == user_id)
     if tenant_id:
         query = query.filter(ApiLog.tenant_id == tenant_id)
+    if route:
+        # Route template, e.g. /api/tenant/photos/{photo_id}
+        route_id = route_registry.get_id(db, route)
+        # An unknown template has no rows (and must not turn into route_id IS NULL)
+        query = query.filter(ApiLog.route_id == route_id if route_id is not None else false())
+    
+    filtered = query
+    if cursor:
+        cursor_created_at, cursor_id = decode_api_log_cursor(cursor)
+        # (created_at, id) < cursor, written so created_at <= X bounds the index range scan
+        query = query.filter(
+            ApiLog.created_at <= cursor_created_at,
+            or_(ApiLog.created_at < cursor_created_at, ApiLog.id < cursor_id)
+        )
+    
+    # Find the page's keys on the index alone, then fetch just those rows
+    page_keys = query.with_entities(ApiLog.id, ApiLog.created_at).order_by(
+        ApiLog.created_at.desc(), ApiLog.id.desc()
+    )
+    if skip and not cursor:
+        page_keys = page_keys.offset(skip)
+    page_keys = page_keys.limit(limit + 1).subquery()
+    
+    logs = db.query(ApiLog).join(
+        page_keys,
+        and_(ApiLog.id == page_keys.c.id, ApiLog.created_at == page_keys.c.created_at)
+    ).order_by(ApiLog.created_at.desc(), ApiLog.id.desc()).all()
+    
+    has_more = len(logs) > limit
+    logs = logs[:limit]
+    routes = route_registry.get_templates(db, (log.route_id for log in logs))
+    next_cursor = encode_api_log_cursor(logs[-1].created_at, logs[-1].id) if has_more else None
     
-    total = query.count()
-    logs = query.order_by(ApiLog.created_at.desc()).offset(skip).limit(limit).all()
+    total = None
+    estimated_total = None
+    if include_total:
+        total = filtered.count()
+        # Sampled rows carry the number of requests they represent
+        estimated_total = int(round(
+            filtered.with_entities(func.coalesce(func.sum(ApiLog.sample_weight), 0)).scalar() or 0
+        ))
     
     return {
         "total": total,
+        "estimated_total": estimated_total,
+        "approximate_total": approximate_row_count(db, filtered),
+        "next_cursor": next_cursor,
+        "has_more": has_more,
         "logs": [
             {
                 "id": log.id,
                 "method": log.method,
+                "route": routes.get(log.route_id),
                 "path": log.path,
                 "status_code": log.status_code,
                 "user_id": log.user_id,
@@ -805,6 +1240,7 @@ async def get_api_logs(
                 "user_agent": log.user_agent[:100] if log.user_agent else None,
                 "error_message": log.error_message,
                 "duration_ms": log.duration_ms,
+                "sample_weight": log.sample_weight,
                 "created_at": log.created_at.isoformat() if log.created_at else None
             }
             for log in logs
@@ -9,14 +9,15 @@ from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import JWTError, jwt
 from pydantic import BaseModel, EmailStr
-from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
 from app.database import get_db
 from app.models import User
 from app.config import settings
+from app.services.password_service import password_hasher, PasswordHasherOverloaded
 import logging
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = password_hasher.context
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 logger = logging.getLogger(__name__)
 
@@ -28,6 +29,11 @@ def get_password_hash(password: str) -> str:
     """Hash a password"""
     return pwd_context.hash(password)
 
+def set_password_hash(db: Session, user_id: int, hashed_password: str):
+    """Store a new password hash without needing the User loaded in this session"""
+    db.query(User).filter(User.id == user_id).update({User.hashed_password: hashed_password})
+    db.commit()
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token"""
     to_encode = data.copy()
@@ -39,7 +45,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(
+def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db)
 ) -> User:
@@ -89,6 +95,13 @@ class PasswordChange(BaseModel):
     current_password: str
     new_password: str
 
+def password_hashing_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many concurrent password checks, please retry",
+        headers={"Retry-After": "1"},
+    )
+
 # Routes
 @router.post("/login", response_model=Token)
 async def login(
@@ -98,11 +111,16 @@ async def login(
     """
     Login endpoint - Simple and direct
     Accepts form data: username (email) and password
+    
+    bcrypt runs on the dedicated password hashing pool; DB work runs on the
+    request thread pool, so neither blocks the event loop.
     """
     logger.info(f"Login attempt for: {form_data.username}")
     
     # Find user
-    user = db.query(User).filter(User.email == form_data.username).first()
+    user = await run_in_threadpool(
+        lambda: db.query(User).filter(User.email == form_data.username).first()
+    )
     if not user:
         logger.warning(f"User not found: {form_data.username}")
         raise HTTPException(
@@ -111,8 +129,16 @@ async def login(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Hand the DB connection back to the pool while bcrypt runs (loaded attributes stay readable)
+    await run_in_threadpool(db.close)
+    
     # Verify password
-    if not verify_password(form_data.password, user.hashed_password):
+    try:
+        verified, new_hash = await password_hasher.verify_and_update(form_data.password, user.hashed_password)
+    except PasswordHasherOverloaded:
+        logger.warning(f"Password hashing pool saturated, rejecting login for: {form_data.username}")
+        raise password_hashing_busy()
+    if not verified:
         logger.warning(f"Invalid password for: {form_data.username}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -120,6 +146,11 @@ async def login(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Transparently upgrade hashes made with a different bcrypt cost
+    if new_hash:
+        await run_in_threadpool(set_password_hash, db, user.id, new_hash)
+        logger.info(f"Upgraded password hash for user_id: {user.id}")
+    
     # Create token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
@@ -150,14 +181,21 @@ async def change_password(
     db: Session = Depends(get_db)
 ):
     """Change user password"""
-    if not verify_password(password_data.current_password, current_user.hashed_password):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Current password is incorrect"
-        )
+    # Hand the DB connection back to the pool while bcrypt runs
+    await run_in_threadpool(db.close)
     
-    current_user.hashed_password = get_password_hash(password_data.new_password)
-    db.commit()
+    try:
+        verified, _ = await password_hasher.verify_and_update(password_data.current_password, current_user.hashed_password)
+        if not verified:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Current password is incorrect"
+            )
+        
+        new_hash = await password_hasher.hash(password_data.new_password)
+    except PasswordHasherOverloaded:
+        raise password_hashing_busy()
+    await run_in_threadpool(set_password_hash, db, current_user.id, new_hash)
     
     return {"message": "Password updated successfully"}
 
@@ -1,12 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 from app.database import get_db
-from app.models import Tenant, Photo, UsageLog
+from app.models import Tenant, Photo, UsageLog, MultipartUpload, MultipartUploadPart
 from app.routers.auth import get_current_user
 from app.services.b2_service import B2Service
 from app.services.tenant_service import TenantService
+from app.services.tenant_cache import CachedTenant
+from app.services.upload_reservation_service import upload_reservations
 from datetime import datetime
 
 router = APIRouter()
@@ -21,6 +24,51 @@ class PhotoUploadResponse(BaseModel):
     photo_id: int
     b2_key: str
 
+class PhotoBatchUploadRequest(BaseModel):
+    items: List[PhotoUploadRequest]
+
+class PhotoBatchUploadItemResult(BaseModel):
+    index: int
+    filename: str
+    upload_url: Optional[str] = None
+    photo_id: Optional[int] = None
+    b2_key: Optional[str] = None
+    error: Optional[str] = None
+
+class PhotoBatchUploadResponse(BaseModel):
+    accepted: int
+    rejected: int
+    total_bytes: int
+    results: List[PhotoBatchUploadItemResult]
+
+class MultipartUploadInitRequest(BaseModel):
+    filename: str
+    content_type: str
+    file_size_bytes: int
+    part_size_bytes: Optional[int] = None
+
+class MultipartPartUrlsRequest(BaseModel):
+    part_numbers: List[int]
+
+class MultipartPartReport(BaseModel):
+    part_number: int
+    etag: str
+    size_bytes: int = 0
+
+class MultipartPartsReportRequest(BaseModel):
+    parts: List[MultipartPartReport]
+
+class MultipartUploadResponse(BaseModel):
+    upload_id: int
+    photo_id: int
+    b2_key: str
+    status: str
+    part_size_bytes: int
+    total_parts: int
+    completed_parts: List[int]
+    missing_parts: List[int]
+    part_urls: Dict[int, str] = {}
+
 class PhotoResponse(BaseModel):
     id: int
     filename: str
@@ -44,31 +92,36 @@ class TenantInfoResponse(BaseModel):
     expires_at: Optional[datetime]
     days_remaining: Optional[int]
 
-def get_tenant_from_request(request: Request, db: Session = None, current_user = None) -> Tenant:
-    """Get tenant from request state (set by middleware) or from user's tenant_id"""
+def get_tenant_from_request(request: Request, db: Session = None, current_user = None) -> CachedTenant:
+    """Get tenant from request state (set by middleware) or from user's tenant_id.
+    
+    Returns a cached snapshot; read storage_used_bytes from the DB where it must be live.
+    """
     import logging
     logger = logging.getLogger(__name__)
     
     # First try to get from request state (set by middleware from subdomain)
     if hasattr(request.state, 'tenant') and request.state.tenant:
-        logger.info(f"Tenant resolved from request state: {request.state.tenant.id}")
-        return request.state.tenant
+        tenant = request.state.tenant
+        # The subdomain only picks the tenant; the user must belong to it (admins may act on any)
+        if current_user is None or (not current_user.is_admin and current_user.tenant_id != tenant.id):
+            logger.warning(
+                f"User {getattr(current_user, 'id', None)} of tenant {getattr(current_user, 'tenant_id', None)} "
+                f"refused on subdomain of tenant {tenant.id}"
+            )
+            raise HTTPException(status_code=403, detail="Not a member of this tenant")
+        logger.info(f"Tenant resolved from request state: {tenant.id}")
+        return tenant
     
     # If no tenant in request state, try to get from current_user's tenant_id
     # This allows clients to access via regular domain instead of subdomain
     if current_user:
         logger.info(f"Resolving tenant from user tenant_id: {current_user.tenant_id}, user_id: {current_user.id}")
         if current_user.tenant_id:
-            if db is None:
-                from app.database import SessionLocal
-                db = SessionLocal()
-            
-            tenant = db.query(Tenant).filter(
-                Tenant.id == current_user.tenant_id,
-                Tenant.is_active == True
-            ).first()
+            from app.services.tenant_cache import tenant_cache
+            tenant = tenant_cache.get_by_id(current_user.tenant_id, db)
             
-            if tenant:
+            if tenant and tenant.is_active:
                 # Check expiration - use timezone-aware datetime
                 from datetime import datetime, timezone
                 if tenant.expires_at and tenant.expires_at < datetime.now(timezone.utc):
@@ -85,7 +138,17 @@ def get_tenant_from_request(request: Request, db: Session = None, current_user =
     
     raise HTTPException(status_code=403, detail="Tenant not found or inactive")
 
-def get_b2_service_for_tenant(tenant: Tenant, db: Session) -> B2Service:
+def storage_limit_exceeded(tenant: CachedTenant, db: Session, requested_bytes: Optional[int] = None) -> HTTPException:
+    """403 for an upload over quota, reporting live (not cached) availability"""
+    storage_used_bytes = db.query(Tenant.storage_used_bytes).filter(Tenant.id == tenant.id).scalar() or 0
+    available = (tenant.storage_limit_mb or 500) * 1024 * 1024 - storage_used_bytes
+    if requested_bytes is not None:
+        detail = f"Storage limit exceeded. Requested: {requested_bytes} bytes, available: {available} bytes"
+    else:
+        detail = f"Storage limit exceeded. Available: {available} bytes"
+    return HTTPException(status_code=403, detail=detail)
+
+def get_b2_service_for_tenant(tenant: CachedTenant, db: Session) -> B2Service:
     """Get B2Service for a tenant, using tenant's credentials or default"""
     from app.models import B2Credential
     from app.config import settings
@@ -116,23 +179,22 @@ def get_b2_service_for_tenant(tenant: Tenant, db: Session) -> B2Service:
             return B2Service()
 
 @router.post("/photos/upload", response_model=PhotoUploadResponse)
-async def request_photo_upload(
+def request_photo_upload(
     upload_request: PhotoUploadRequest,
     request: Request,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
-    """Request upload URL for a photo"""
+    """Request upload URL for a photo.
+    
+    The photo stays pending, its size reserved, until it is confirmed; the
+    reservation sweeper expires it UPLOAD_RESERVATION_TTL_SECONDS later otherwise.
+    """
+    from app.config import settings
+    
     tenant = get_tenant_from_request(request, db, current_user)
     tenant_service = TenantService(db)
     
-    # Check storage limit
-    if not tenant_service.check_storage_limit(tenant.id, upload_request.file_size_bytes):
-        raise HTTPException(
-            status_code=403,
-            detail=f"Storage limit exceeded. Available: {tenant.storage_limit_mb * 1024 * 1024 - tenant.storage_used_bytes} bytes"
-        )
-    
     # Generate B2 key
     from datetime import timezone
     timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
@@ -143,25 +205,29 @@ async def request_photo_upload(
     upload_url = b2_service.generate_presigned_upload_url(
         b2_key,
         upload_request.content_type,
-        expires_in=3600
+        expires_in=settings.UPLOAD_URL_EXPIRES_SECONDS
     )
     
-    # Create photo record
+    # Check storage limit and reserve the space. The conditional UPDATE holds the tenant's
+    # row lock until the commit below, so it comes after the presign, right before the inserts
+    if not tenant_service.reserve_storage(tenant.id, upload_request.file_size_bytes):
+        raise storage_limit_exceeded(tenant, db)
+    
+    # Create photo record (pending until confirmed)
     photo = Photo(
         tenant_id=tenant.id,
         filename=b2_key.split('/')[-1],
         original_filename=upload_request.filename,
         b2_key=b2_key,
         file_size_bytes=upload_request.file_size_bytes,
-        content_type=upload_request.content_type
+        content_type=upload_request.content_type,
+        state="pending",
+        expires_at=upload_reservations.expires_at()
     )
     
     db.add(photo)
     db.flush()
     
-    # Update tenant storage
-    tenant_service.update_tenant_storage(tenant.id, upload_request.file_size_bytes)
-    
     # Log usage
     usage_log = UsageLog(
         tenant_id=tenant.id,
@@ -179,14 +245,410 @@ async def request_photo_upload(
         b2_key=b2_key
     )
 
+@router.post("/photos/upload/batch", response_model=PhotoBatchUploadResponse)
+def request_photo_upload_batch(
+    batch_request: PhotoBatchUploadRequest,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Request upload URLs for many photos in one round trip.
+    
+    Invalid items are reported individually; the storage quota is checked and
+    reserved once for the total size of the valid items. Each photo stays
+    pending until confirmed, like a single upload.
+    """
+    from app.config import settings
+    
+    if not batch_request.items:
+        raise HTTPException(status_code=400, detail="No items to upload")
+    if len(batch_request.items) > settings.MAX_UPLOAD_BATCH_SIZE:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many items in batch. Maximum: {settings.MAX_UPLOAD_BATCH_SIZE}"
+        )
+    
+    tenant = get_tenant_from_request(request, db, current_user)
+    tenant_service = TenantService(db)
+    
+    # Generate B2 keys and validate each item
+    from datetime import timezone
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+    results = []
+    accepted = []
+    seen_keys = set()
+    for index, item in enumerate(batch_request.items):
+        result = PhotoBatchUploadItemResult(index=index, filename=item.filename)
+        results.append(result)
+        b2_key = f"tenant_{tenant.id}/{timestamp}_{item.filename}"
+        
+        if not item.filename or "/" in item.filename:
+            result.error = "Invalid filename"
+        elif not item.content_type:
+            result.error = "Content type is required"
+        elif item.file_size_bytes <= 0:
+            result.error = "File size must be greater than 0"
+        elif b2_key in seen_keys:
+            result.error = "Duplicate filename in batch"
+        else:
+            seen_keys.add(b2_key)
+            result.b2_key = b2_key
+            accepted.append((result, item))
+    
+    total_bytes = sum(item.file_size_bytes for _, item in accepted)
+    
+    if accepted:
+        # Generate presigned upload URLs
+        b2_service = get_b2_service_for_tenant(tenant, db)
+        for result, item in accepted:
+            result.upload_url = b2_service.generate_presigned_upload_url(
+                result.b2_key,
+                item.content_type,
+                expires_in=settings.UPLOAD_URL_EXPIRES_SECONDS
+            )
+        
+        # Check storage limit and reserve the space once for the whole batch. The tenant's
+        # row lock is held from here to the commit, so no presigning happens under it
+        if not tenant_service.reserve_storage(tenant.id, total_bytes):
+            raise storage_limit_exceeded(tenant, db, total_bytes)
+        
+        # Create photo records (pending until confirmed) in one flush
+        expires_at = upload_reservations.expires_at()
+        photos = [
+            Photo(
+                tenant_id=tenant.id,
+                filename=result.b2_key.split('/')[-1],
+                original_filename=item.filename,
+                b2_key=result.b2_key,
+                file_size_bytes=item.file_size_bytes,
+                content_type=item.content_type,
+                state="pending",
+                expires_at=expires_at
+            )
+            for result, item in accepted
+        ]
+        db.add_all(photos)
+        db.flush()
+        for (result, _), photo in zip(accepted, photos):
+            result.photo_id = photo.id
+        
+        # Log usage
+        db.execute(insert(UsageLog), [
+            {"tenant_id": tenant.id, "log_type": "upload", "bytes_transferred": item.file_size_bytes}
+            for _, item in accepted
+        ])
+        
+        db.commit()
+    
+    return PhotoBatchUploadResponse(
+        accepted=len(accepted),
+        rejected=len(results) - len(accepted),
+        total_bytes=total_bytes,
+        results=results
+    )
+
+def get_multipart_upload_for_tenant(upload_id: int, tenant: CachedTenant, db: Session) -> MultipartUpload:
+    """Get an in-progress multipart upload owned by the tenant, or 404"""
+    upload = db.query(MultipartUpload).filter(
+        MultipartUpload.id == upload_id,
+        MultipartUpload.tenant_id == tenant.id
+    ).first()
+    
+    if not upload:
+        raise HTTPException(status_code=404, detail="Multipart upload not found")
+    if upload.photo.state == "expired":
+        raise HTTPException(status_code=410, detail="Multipart upload expired")
+    return upload
+
+def extend_multipart_reservation(upload: MultipartUpload, db: Session):
+    """Push back the expiry of an in-progress upload's reservation (the client is still working on it)"""
+    db.query(Photo).filter(
+        Photo.id == upload.photo_id,
+        Photo.state == "pending"
+    ).update({Photo.expires_at: upload_reservations.expires_at(multipart=True)}, synchronize_session=False)
+
+def claim_pending_photo(photo_id: int, db: Session):
+    """pending -> confirmed in one conditional UPDATE (uncommitted), or 410 if the sweeper expired it first"""
+    claimed = db.query(Photo).filter(
+        Photo.id == photo_id,
+        Photo.state == "pending"
+    ).update({Photo.state: "confirmed", Photo.expires_at: None}, synchronize_session=False)
+    if not claimed:
+        raise HTTPException(status_code=410, detail="Upload reservation expired")
+
+def build_multipart_upload_response(upload: MultipartUpload, part_urls: Optional[Dict[int, str]] = None) -> MultipartUploadResponse:
+    completed_parts = [part.part_number for part in upload.parts]
+    completed = set(completed_parts)
+    return MultipartUploadResponse(
+        upload_id=upload.id,
+        photo_id=upload.photo_id,
+        b2_key=upload.b2_key,
+        status=upload.status,
+        part_size_bytes=upload.part_size_bytes,
+        total_parts=upload.total_parts,
+        completed_parts=completed_parts,
+        missing_parts=[n for n in range(1, upload.total_parts + 1) if n not in completed],
+        part_urls=part_urls or {}
+    )
+
+@router.post("/photos/multipart", response_model=MultipartUploadResponse)
+def initiate_multipart_upload(
+    init_request: MultipartUploadInitRequest,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Start a multipart upload for a large file and return the first batch of part URLs"""
+    from app.config import settings
+    import math
+    
+    tenant = get_tenant_from_request(request, db, current_user)
+    tenant_service = TenantService(db)
+    
+    if init_request.file_size_bytes <= 0:
+        raise HTTPException(status_code=400, detail="File size must be greater than 0")
+    
+    # Pick a part size that respects B2's minimum part size and maximum part count
+    min_part_size = settings.MULTIPART_MIN_PART_SIZE_MB * 1024 * 1024
+    part_size = init_request.part_size_bytes or settings.MULTIPART_PART_SIZE_MB * 1024 * 1024
+    part_size = max(part_size, min_part_size, math.ceil(init_request.file_size_bytes / settings.MULTIPART_MAX_PARTS))
+    total_parts = max(1, math.ceil(init_request.file_size_bytes / part_size))
+    
+    # Generate B2 key and start the upload
+    from datetime import timezone
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+    b2_key = f"tenant_{tenant.id}/{timestamp}_{init_request.filename}"
+    
+    b2_service = get_b2_service_for_tenant(tenant, db)
+    b2_upload_id = b2_service.create_multipart_upload(b2_key, init_request.content_type)
+    
+    # Check storage limit and reserve the space. The conditional UPDATE holds the tenant's
+    # row lock until the commit below, so the B2 call above must not come after it
+    if not tenant_service.reserve_storage(tenant.id, init_request.file_size_bytes):
+        try:
+            b2_service.abort_multipart_upload(b2_key, b2_upload_id)
+        except Exception:
+            pass  # Unfinished parts are cleaned up by the bucket lifecycle rules
+        raise storage_limit_exceeded(tenant, db)
+    
+    # Create photo (pending until completed) and upload tracking records
+    photo = Photo(
+        tenant_id=tenant.id,
+        filename=b2_key.split('/')[-1],
+        original_filename=init_request.filename,
+        b2_key=b2_key,
+        file_size_bytes=init_request.file_size_bytes,
+        content_type=init_request.content_type,
+        state="pending",
+        expires_at=upload_reservations.expires_at(multipart=True)
+    )
+    db.add(photo)
+    db.flush()
+    
+    upload = MultipartUpload(
+        tenant_id=tenant.id,
+        photo_id=photo.id,
+        b2_key=b2_key,
+        b2_upload_id=b2_upload_id,
+        part_size_bytes=part_size,
+        total_parts=total_parts,
+        status="in_progress"
+    )
+    db.add(upload)
+    
+    # Log usage
+    db.add(UsageLog(
+        tenant_id=tenant.id,
+        log_type="upload",
+        bytes_transferred=init_request.file_size_bytes
+    ))
+    
+    db.commit()
+    db.refresh(upload)
+    
+    first_batch = list(range(1, min(total_parts, settings.MULTIPART_PRESIGN_BATCH_SIZE) + 1))
+    part_urls = b2_service.generate_presigned_part_urls(b2_key, b2_upload_id, first_batch)
+    
+    return build_multipart_upload_response(upload, part_urls)
+
+@router.get("/photos/multipart/{upload_id}", response_model=MultipartUploadResponse)
+def get_multipart_upload(
+    upload_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Get multipart upload progress, e.g. to resume after an interruption"""
+    tenant = get_tenant_from_request(request, db, current_user)
+    upload = get_multipart_upload_for_tenant(upload_id, tenant, db)
+    return build_multipart_upload_response(upload)
+
+@router.post("/photos/multipart/{upload_id}/part-urls", response_model=MultipartUploadResponse)
+def get_multipart_part_urls(
+    upload_id: int,
+    urls_request: MultipartPartUrlsRequest,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Presign upload URLs for a batch of parts"""
+    from app.config import settings
+    
+    tenant = get_tenant_from_request(request, db, current_user)
+    upload = get_multipart_upload_for_tenant(upload_id, tenant, db)
+    
+    if upload.status != "in_progress":
+        raise HTTPException(status_code=400, detail=f"Multipart upload is {upload.status}")
+    if len(urls_request.part_numbers) > settings.MULTIPART_PRESIGN_BATCH_SIZE * 5:
+        raise HTTPException(status_code=400, detail=f"Too many parts requested. Maximum: {settings.MULTIPART_PRESIGN_BATCH_SIZE * 5}")
+    invalid = [n for n in urls_request.part_numbers if n < 1 or n > upload.total_parts]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid part numbers: {invalid}")
+    
+    b2_service = get_b2_service_for_tenant(tenant, db)
+    part_urls = b2_service.generate_presigned_part_urls(upload.b2_key, upload.b2_upload_id, sorted(set(urls_request.part_numbers)))
+    extend_multipart_reservation(upload, db)
+    db.commit()
+    
+    return build_multipart_upload_response(upload, part_urls)
+
+@router.post("/photos/multipart/{upload_id}/parts", response_model=MultipartUploadResponse)
+def report_multipart_parts(
+    upload_id: int,
+    parts_report: MultipartPartsReportRequest,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Record finished parts so an interrupted upload can resume from them"""
+    tenant = get_tenant_from_request(request, db, current_user)
+    upload = get_multipart_upload_for_tenant(upload_id, tenant, db)
+    
+    if upload.status != "in_progress":
+        raise HTTPException(status_code=400, detail=f"Multipart upload is {upload.status}")
+    
+    existing = {part.part_number: part for part in upload.parts}
+    for report in parts_report.parts:
+        if report.part_number < 1 or report.part_number > upload.total_parts:
+            raise HTTPException(status_code=400, detail=f"Invalid part number: {report.part_number}")
+        part = existing.get(report.part_number)
+        if part:
+            part.etag = report.etag
+            part.size_bytes = report.size_bytes
+        else:
+            part = MultipartUploadPart(
+                part_number=report.part_number,
+                etag=report.etag,
+                size_bytes=report.size_bytes
+            )
+            upload.parts.append(part)
+            existing[report.part_number] = part
+    extend_multipart_reservation(upload, db)
+    
+    db.commit()
+    db.refresh(upload)
+    
+    return build_multipart_upload_response(upload)
+
+@router.post("/photos/multipart/{upload_id}/complete", response_model=MultipartUploadResponse)
+def complete_multipart_upload(
+    upload_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Complete a multipart upload once every part is in B2"""
+    tenant = get_tenant_from_request(request, db, current_user)
+    upload = get_multipart_upload_for_tenant(upload_id, tenant, db)
+    
+    if upload.status != "in_progress":
+        raise HTTPException(status_code=400, detail=f"Multipart upload is {upload.status}")
+    
+    # B2's part listing is authoritative; it also covers parts the client never reported
+    b2_service = get_b2_service_for_tenant(tenant, db)
+    uploaded = {part['PartNumber']: part for part in b2_service.list_uploaded_parts(upload.b2_key, upload.b2_upload_id)}
+    missing = [n for n in range(1, upload.total_parts + 1) if n not in uploaded]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing parts: {missing[:50]}")
+    
+    # Claim the reservation before completing in B2; the row lock keeps the sweeper off it
+    claim_pending_photo(upload.photo_id, db)
+    b2_service.complete_multipart_upload(
+        upload.b2_key,
+        upload.b2_upload_id,
+        [{'PartNumber': n, 'ETag': uploaded[n]['ETag']} for n in range(1, upload.total_parts + 1)]
+    )
+    
+    # Sync tracked parts with what B2 received
+    existing = {part.part_number: part for part in upload.parts}
+    for n, b2_part in uploaded.items():
+        part = existing.get(n)
+        if part is None:
+            upload.parts.append(MultipartUploadPart(part_number=n, etag=b2_part['ETag'], size_bytes=b2_part.get('Size', 0)))
+        else:
+            part.etag = b2_part['ETag']
+            part.size_bytes = b2_part.get('Size', 0)
+    upload.status = "completed"
+    
+    # Update file size if different
+    photo = upload.photo
+    file_size = sum(b2_part.get('Size', 0) for b2_part in uploaded.values())
+    if file_size and file_size != photo.file_size_bytes:
+        tenant_service = TenantService(db)
+        tenant_service.update_tenant_storage(tenant.id, file_size - photo.file_size_bytes, commit=False)
+        photo.file_size_bytes = file_size
+    
+    db.commit()
+    db.refresh(upload)
+    
+    return build_multipart_upload_response(upload)
+
+@router.delete("/photos/multipart/{upload_id}")
+def abort_multipart_upload(
+    upload_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Abort a multipart upload, discarding its parts and releasing the reserved storage"""
+    tenant = get_tenant_from_request(request, db, current_user)
+    upload = get_multipart_upload_for_tenant(upload_id, tenant, db)
+    
+    if upload.status != "in_progress":
+        raise HTTPException(status_code=400, detail=f"Multipart upload is {upload.status}")
+    
+    # Lock the photo so the sweeper cannot release the same reservation meanwhile
+    photo = db.query(Photo).filter(
+        Photo.id == upload.photo_id,
+        Photo.state == "pending"
+    ).with_for_update().populate_existing().first()
+    if not photo:
+        raise HTTPException(status_code=410, detail="Multipart upload expired")
+    
+    b2_service = get_b2_service_for_tenant(tenant, db)
+    b2_service.abort_multipart_upload(upload.b2_key, upload.b2_upload_id)
+    
+    # Release storage and drop the photo (cascades to the upload and its parts)
+    tenant_service = TenantService(db)
+    tenant_service.update_tenant_storage(tenant.id, -photo.file_size_bytes, commit=False)
+    db.add(UsageLog(
+        tenant_id=tenant.id,
+        log_type="delete",
+        bytes_transferred=-photo.file_size_bytes
+    ))
+    db.delete(photo)
+    db.commit()
+    
+    return {"message": "Multipart upload aborted", "upload_id": upload_id}
+
 @router.post("/photos/{photo_id}/confirm")
-async def confirm_photo_upload(
+def confirm_photo_upload(
     photo_id: int,
     request: Request,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
-    """Confirm photo upload completed (verify file exists in B2)"""
+    """Confirm photo upload completed (verify file exists in B2); pending -> confirmed"""
     tenant = get_tenant_from_request(request, db, current_user)
     
     photo = db.query(Photo).filter(
@@ -196,6 +658,11 @@ async def confirm_photo_upload(
     
     if not photo:
         raise HTTPException(status_code=404, detail="Photo not found")
+    if photo.state == "expired":
+        raise HTTPException(status_code=410, detail="Upload reservation expired")
+    if photo.state == "pending":
+        # Claimed before the B2 check; a failed check rolls the claim back
+        claim_pending_photo(photo.id, db)
     
     # Verify file exists in B2
     b2_service = get_b2_service_for_tenant(tenant, db)
@@ -208,32 +675,34 @@ async def confirm_photo_upload(
     if file_size != photo.file_size_bytes:
         diff = file_size - photo.file_size_bytes
         tenant_service = TenantService(db)
-        tenant_service.update_tenant_storage(tenant.id, diff)
+        tenant_service.update_tenant_storage(tenant.id, diff, commit=False)
         photo.file_size_bytes = file_size
-        db.commit()
+    db.commit()
     
     return {"message": "Photo upload confirmed", "photo_id": photo_id}
 
 @router.get("/photos", response_model=List[PhotoResponse])
-async def list_photos(
+def list_photos(
     skip: int = 0,
     limit: int = 100,
     request: Request = None,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
-    """List all photos for the tenant"""
+    """List the tenant's confirmed photos"""
     tenant = get_tenant_from_request(request, db, current_user)
     
     photos = db.query(Photo).filter(
-        Photo.tenant_id == tenant.id
-    ).offset(skip).limit(limit).order_by(Photo.uploaded_at.desc()).all()
+        Photo.tenant_id == tenant.id,
+        Photo.state == "confirmed"
+    ).order_by(Photo.uploaded_at.desc()).offset(skip).limit(limit).all()
     
     b2_service = get_b2_service_for_tenant(tenant, db)
+    download_urls = b2_service.generate_presigned_download_urls([photo.b2_key for photo in photos], expires_in=3600)
     
     result = []
     for photo in photos:
-        download_url = b2_service.generate_presigned_download_url(photo.b2_key, expires_in=3600)
+        download_url = download_urls[photo.b2_key]
         result.append(PhotoResponse(
             id=photo.id,
             filename=photo.filename,
@@ -247,18 +716,19 @@ async def list_photos(
     return result
 
 @router.get("/photos/{photo_id}", response_model=PhotoResponse)
-async def get_photo(
+def get_photo(
     photo_id: int,
     request: Request,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
-    """Get a specific photo"""
+    """Get a specific (confirmed) photo"""
     tenant = get_tenant_from_request(request, db, current_user)
     
     photo = db.query(Photo).filter(
         Photo.id == photo_id,
-        Photo.tenant_id == tenant.id
+        Photo.tenant_id == tenant.id,
+        Photo.state == "confirmed"
     ).first()
     
     if not photo:
@@ -278,7 +748,7 @@ async def get_photo(
     )
 
 @router.delete("/photos/{photo_id}")
-async def delete_photo(
+def delete_photo(
     photo_id: int,
     request: Request,
     db: Session = Depends(get_db),
@@ -287,21 +757,28 @@ async def delete_photo(
     """Delete a photo"""
     tenant = get_tenant_from_request(request, db, current_user)
     
+    # Locked, and expired rows excluded: the sweeper has already released their storage
     photo = db.query(Photo).filter(
         Photo.id == photo_id,
-        Photo.tenant_id == tenant.id
-    ).first()
+        Photo.tenant_id == tenant.id,
+        Photo.state != "expired"
+    ).with_for_update().first()
     
     if not photo:
         raise HTTPException(status_code=404, detail="Photo not found")
     
     # Delete from B2
     b2_service = get_b2_service_for_tenant(tenant, db)
+    if photo.multipart_upload and photo.multipart_upload.status == "in_progress":
+        try:
+            b2_service.abort_multipart_upload(photo.b2_key, photo.multipart_upload.b2_upload_id)
+        except Exception:
+            pass  # Unfinished parts are cleaned up by the bucket lifecycle rules
     b2_service.delete_file(photo.b2_key)
     
     # Update tenant storage
     tenant_service = TenantService(db)
-    tenant_service.update_tenant_storage(tenant.id, -photo.file_size_bytes)
+    tenant_service.update_tenant_storage(tenant.id, -photo.file_size_bytes, commit=False)
     
     # Log usage
     usage_log = UsageLog(
@@ -318,7 +795,7 @@ async def delete_photo(
     return {"message": "Photo deleted successfully"}
 
 @router.get("/storage", response_model=StorageInfoResponse)
-async def get_storage_info(
+def get_storage_info(
     request: Request,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
@@ -326,21 +803,23 @@ async def get_storage_info(
     """Get storage usage information"""
     tenant = get_tenant_from_request(request, db, current_user)
     
-    photo_count = db.query(Photo).filter(Photo.tenant_id == tenant.id).count()
-    storage_used_mb = round(tenant.storage_used_bytes / (1024 * 1024), 2)
+    photo_count = db.query(Photo).filter(Photo.tenant_id == tenant.id, Photo.state == "confirmed").count()
+    # The resolved tenant is a cached snapshot; usage changes on every upload
+    storage_used_bytes = db.query(Tenant.storage_used_bytes).filter(Tenant.id == tenant.id).scalar() or 0
+    storage_used_mb = round(storage_used_bytes / (1024 * 1024), 2)
     storage_limit_bytes = tenant.storage_limit_mb * 1024 * 1024 if tenant.storage_limit_mb else (500 * 1024 * 1024)  # Default 500MB
-    storage_percentage = round((tenant.storage_used_bytes / storage_limit_bytes) * 100, 2) if storage_limit_bytes > 0 else 0
+    storage_percentage = round((storage_used_bytes / storage_limit_bytes) * 100, 2) if storage_limit_bytes > 0 else 0
     
     return StorageInfoResponse(
         storage_limit_mb=tenant.storage_limit_mb or 500,  # Default 500MB
         storage_used_mb=storage_used_mb,
-        storage_used_bytes=tenant.storage_used_bytes,
+        storage_used_bytes=storage_used_bytes,
         storage_percentage=storage_percentage,
         photo_count=photo_count
     )
 
 @router.get("/info", response_model=TenantInfoResponse)
-async def get_tenant_info(
+def get_tenant_info(
     request: Request,
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)
@@ -364,7 +843,7 @@ async def get_tenant_info(
     )
 
 @router.get("/usage-logs")
-async def get_usage_logs(
+def get_usage_logs(
     skip: int = 0,
     limit: int = 50,
     request: Request = None,
@@ -0,0 +1,76 @@
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from app.config import settings
+from app.services.latency_sketch import LatencySketch
+import threading
+import time
+
+# Requests that matched no route (404s from scanners etc.) share one rollup key
+UNMATCHED_ROUTE = "<unmatched>"
+
+# The method comes from the client; anything else is recorded as "other" (metrics, logs and
+# rollups alike), which keeps series bounded and fits the String(10) method columns
+KNOWN_METHODS = frozenset({"GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"})
+
+def method_label(method: str) -> str:
+    return method if method in KNOWN_METHODS else "other"
+
+RollupKey = Tuple[int, str, str, int, int]  # (minute start, method, route, status class, tenant_id)
+
+class ApiLogRollups:
+    """In-process per-minute aggregation of every request, before log sampling.
+    
+    Requests are folded into buckets keyed by (minute, method, route template,
+    status class, tenant_id) holding a count, an error count and a latency
+    sketch. The API log writer thread drains finished minutes into
+    api_log_rollups. Rows are append-only: each worker process writes its own
+    row per bucket and readers merge them (sketches are mergeable).
+    """
+    
+    def __init__(self, relative_accuracy: float, bucket_seconds: int = 60):
+        self.relative_accuracy = relative_accuracy
+        self.bucket_seconds = bucket_seconds
+        self._buckets: Dict[RollupKey, List] = {}
+        self._lock = threading.Lock()
+    
+    def add(self, method: str, route: Optional[str], status_code: int, tenant_id: Optional[int],
+            duration_ms: float, at: Optional[float] = None):
+        at = time.time() if at is None else at
+        bucket_start = int(at // self.bucket_seconds) * self.bucket_seconds
+        key = (bucket_start, method, route or UNMATCHED_ROUTE, status_code // 100, tenant_id or 0)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [0, 0, LatencySketch(self.relative_accuracy)]
+            bucket[0] += 1
+            if status_code >= 400:
+                bucket[1] += 1
+            bucket[2].add(duration_ms)
+    
+    def drain(self, include_current: bool = False) -> List[Dict]:
+        """Remove finished buckets (all of them if include_current) and return them as rows"""
+        current_start = int(time.time() // self.bucket_seconds) * self.bucket_seconds
+        with self._lock:
+            keys = [k for k in self._buckets if include_current or k[0] < current_start]
+            drained = [(key, self._buckets.pop(key)) for key in keys]
+        return [
+            {
+                "bucket_start": datetime.fromtimestamp(bucket_start, timezone.utc),
+                "method": method,
+                "route": route[:500],
+                "status_class": status_class,
+                "tenant_id": tenant_id,
+                "request_count": count,
+                "error_count": errors,
+                "duration_sum_ms": int(sketch.sum),
+                "duration_max_ms": int(sketch.max),
+                "sketch": sketch.to_json()
+            }
+            for (bucket_start, method, route, status_class, tenant_id), (count, errors, sketch) in drained
+        ]
+    
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._buckets)
+
+api_log_rollups = ApiLogRollups(relative_accuracy=settings.API_LOG_ROLLUP_SKETCH_ACCURACY)
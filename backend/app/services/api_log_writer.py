@@ -0,0 +1,244 @@
+from sqlalchemy import insert
+from typing import Dict, List, Optional
+from app.config import settings
+from app.database import SessionLocal
+from app.models import ApiLog, ApiLogRollup
+from app.services.api_log_rollup import ApiLogRollups, api_log_rollups
+from app.services.route_registry import route_registry
+import logging
+import queue
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+OVERFLOW_POLICIES = ("drop", "sample")
+
+class ApiLogWriter:
+    """Writes ApiLog rows from a background thread in multi-row INSERTs.
+    
+    Requests only put a dict of column values on a bounded queue; the flusher
+    thread drains it every batch_size records or flush_interval_ms, whichever
+    comes first, and also writes the finished per-minute request rollups
+    (ApiLogRollups). When the queue backs up, records are shed instead of slowing
+    requests down:
+    
+    - "drop":   records that do not fit in the queue are dropped.
+    - "sample": above high_water (fraction of the queue) only sample_rate of
+                successful requests are admitted (their sample_weight is
+                scaled by 1 / sample_rate); errors are still queued until
+                the queue is completely full.
+    """
+    
+    def __init__(
+        self,
+        max_queue: int,
+        batch_size: int,
+        flush_interval_ms: int,
+        overflow_policy: str = "drop",
+        sample_rate: float = 0.1,
+        high_water: float = 0.8,
+        rollups: Optional[ApiLogRollups] = None
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown API log overflow policy '{overflow_policy}', expected one of {OVERFLOW_POLICIES}")
+        self.max_queue = max_queue
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(1, flush_interval_ms) / 1000.0
+        self.overflow_policy = overflow_policy
+        self.sample_rate = sample_rate
+        self.high_water_mark = int(max_queue * high_water)
+        self.rollups = rollups
+        self._queue: "queue.Queue[Dict]" = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.dropped_full = 0
+        self.dropped_sampled = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.rollup_rows = 0
+        self.failed_rollup_rows = 0
+    
+    def submit(self, record: Dict) -> bool:
+        """Queue one ApiLog row (column -> value, plus "route" template); never blocks. Returns False if it was shed"""
+        if self.overflow_policy == "sample" and self._queue.qsize() >= self.high_water_mark:
+            is_error = (record.get("status_code") or 0) >= 400
+            if not is_error:
+                if random.random() >= self.sample_rate:
+                    with self._lock:
+                        self.dropped_sampled += 1
+                    return False
+                # The admitted row also stands for the ones shed next to it
+                record["sample_weight"] = record.get("sample_weight", 1.0) / self.sample_rate
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped_full += 1
+            return False
+        with self._lock:
+            self.submitted += 1
+        return True
+    
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="api-log-writer", daemon=True)
+        self._thread.start()
+        logger.info(
+            f"API log writer started (queue={self.max_queue}, batch={self.batch_size}, "
+            f"interval={self.flush_interval * 1000:.0f}ms, policy={self.overflow_policy})"
+        )
+    
+    def stop(self, timeout: float = 10.0):
+        """Stop the flusher and write whatever is still queued"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                logger.warning("API log writer did not finish flushing before the shutdown timeout")
+            self._thread = None
+        # Anything submitted after the thread exited (or if it was never started)
+        self.flush()
+        self._write_rollups(include_current=True)
+    
+    def flush(self):
+        """Synchronously write everything currently queued"""
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                return
+            self._write(batch)
+    
+    def _drain(self, limit: int) -> List[Dict]:
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+    
+    def _run(self):
+        while not self._stop.is_set():
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._stop.is_set():
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+                batch.extend(self._drain(self.batch_size - len(batch)))
+            if batch:
+                self._write(batch)
+            self._write_rollups()
+        self.flush()
+        self._write_rollups(include_current=True)
+    
+    def _write(self, batch: List[Dict]):
+        db = SessionLocal()
+        try:
+            # Route templates are stored as interned ids
+            route_ids = route_registry.get_ids(db, (record.get("route") for record in batch))
+            rows = []
+            for record in batch:
+                row = dict(record)
+                row["route_id"] = route_ids.get(row.pop("route", None))
+                rows.append(row)
+            written = self._insert(db, ApiLog, rows)
+            with self._lock:
+                self.written += written
+                self.failed += len(batch) - written
+                self.batches += 1
+        except Exception as e:
+            db.rollback()
+            with self._lock:
+                self.failed += len(batch)
+            logger.error(f"Error writing {len(batch)} API log rows: {e}")
+        finally:
+            db.close()
+    
+    @staticmethod
+    def _insert(db, model, rows: List[Dict]) -> int:
+        """One multi-row INSERT; if it fails, retry row by row so one bad row costs only itself.
+        
+        Returns the number of rows written.
+        """
+        try:
+            db.execute(insert(model), rows)
+            db.commit()
+            return len(rows)
+        except Exception as e:
+            db.rollback()
+            if len(rows) == 1:
+                logger.error(f"Error writing a {model.__tablename__} row: {e}")
+                return 0
+            logger.warning(f"Error writing {len(rows)} {model.__tablename__} rows, retrying one by one: {e}")
+        written = 0
+        for row in rows:
+            try:
+                db.execute(insert(model), [row])
+                db.commit()
+                written += 1
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Error writing a {model.__tablename__} row: {e}")
+        return written
+    
+    def _write_rollups(self, include_current: bool = False):
+        if self.rollups is None:
+            return
+        rows = self.rollups.drain(include_current)
+        if not rows:
+            return
+        db = SessionLocal()
+        try:
+            written = self._insert(db, ApiLogRollup, rows)
+            with self._lock:
+                self.rollup_rows += written
+                self.failed_rollup_rows += len(rows) - written
+        except Exception as e:
+            db.rollback()
+            with self._lock:
+                self.failed_rollup_rows += len(rows)
+            logger.error(f"Error writing {len(rows)} API log rollup rows: {e}")
+        finally:
+            db.close()
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "running": self._thread is not None and self._thread.is_alive(),
+                "queued": self._queue.qsize(),
+                "max_queue": self.max_queue,
+                "batch_size": self.batch_size,
+                "flush_interval_ms": int(self.flush_interval * 1000),
+                "overflow_policy": self.overflow_policy,
+                "submitted": self.submitted,
+                "written": self.written,
+                "batches": self.batches,
+                "failed": self.failed,
+                "dropped_full": self.dropped_full,
+                "dropped_sampled": self.dropped_sampled,
+                "rollup_rows": self.rollup_rows,
+                "failed_rollup_rows": self.failed_rollup_rows,
+                "pending_rollup_buckets": self.rollups.pending() if self.rollups is not None else 0
+            }
+
+api_log_writer = ApiLogWriter(
+    max_queue=settings.API_LOG_QUEUE_SIZE,
+    batch_size=settings.API_LOG_BATCH_SIZE,
+    flush_interval_ms=settings.API_LOG_FLUSH_INTERVAL_MS,
+    overflow_policy=settings.API_LOG_OVERFLOW_POLICY,
+    sample_rate=settings.API_LOG_OVERFLOW_SAMPLE_RATE,
+    high_water=settings.API_LOG_OVERFLOW_HIGH_WATER,
+    rollups=api_log_rollups
+)
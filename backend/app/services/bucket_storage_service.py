@@ -0,0 +1,224 @@
+"""
+Background B2 bucket size snapshots.
+
+Listing a bucket costs one class C transaction per 1000 objects and can take
+minutes, so it never happens inside a request. A refresh job lists the
+default bucket from its own thread (top-level prefixes in parallel, see
+B2Service.iter_prefix_totals), totals bytes/objects overall and per
+top-level prefix (tenant_<id>/), and stores the result as a
+BucketStorageSnapshot row. Requests read the newest completed snapshot.
+"""
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from typing import Dict, Optional
+from app.config import settings
+from app.database import SessionLocal
+from app.models import B2Credential, BucketStorageSnapshot
+from app.services.b2_service import B2Service
+import asyncio
+import json
+import logging
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Running jobs write their progress every this many finished prefixes
+PROGRESS_EVERY_PREFIXES = 100
+# Serializes starting a refresh across workers/containers sharing the database
+START_LOCK = "bucket_storage_snapshot_start"
+START_LOCK_TIMEOUT_SECONDS = 10
+
+def default_b2_service(db: Session) -> Optional[B2Service]:
+    """B2Service for the active default (admin) credential, or None"""
+    default_cred = db.query(B2Credential).filter(
+        B2Credential.tenant_id == None,
+        B2Credential.is_active == True
+    ).first()
+    if not default_cred:
+        return None
+    return B2Service(
+        key_id=default_cred.key_id.strip() if default_cred.key_id else None,
+        key=default_cred.key.strip() if default_cred.key else None,
+        bucket=default_cred.bucket_name.strip() if default_cred.bucket_name else None,
+        endpoint=default_cred.endpoint.strip() if default_cred.endpoint else settings.B2_ENDPOINT
+    )
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # MySQL DATETIME comes back naive; the values are UTC
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+class BucketStorageSnapshots:
+    def __init__(self, interval_seconds: int, job_timeout_seconds: int):
+        self.interval_seconds = interval_seconds
+        self.job_timeout_seconds = job_timeout_seconds
+        self._lock = threading.Lock()
+    
+    def latest(self, db: Session, bucket_name: Optional[str] = None) -> Optional[BucketStorageSnapshot]:
+        """Newest completed snapshot (of bucket_name if given)"""
+        query = db.query(BucketStorageSnapshot).filter(BucketStorageSnapshot.status == "completed")
+        if bucket_name:
+            query = query.filter(BucketStorageSnapshot.bucket_name == bucket_name)
+        return query.order_by(BucketStorageSnapshot.completed_at.desc()).first()
+    
+    def running(self, db: Session, bucket_name: str) -> Optional[BucketStorageSnapshot]:
+        """A job for bucket_name that is still running (jobs older than the timeout are presumed dead)"""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.job_timeout_seconds)
+        return db.query(BucketStorageSnapshot).filter(
+            BucketStorageSnapshot.bucket_name == bucket_name,
+            BucketStorageSnapshot.status == "running",
+            BucketStorageSnapshot.started_at >= cutoff
+        ).order_by(BucketStorageSnapshot.started_at.desc()).first()
+    
+    def get_job(self, db: Session, job_id: str) -> Optional[BucketStorageSnapshot]:
+        return db.query(BucketStorageSnapshot).filter(BucketStorageSnapshot.job_id == job_id).first()
+    
+    @contextmanager
+    def _start_lock(self, db: Session):
+        """Hold the in-process lock and, on MySQL, the START_LOCK named lock"""
+        with self._lock:
+            bind = db.get_bind()
+            if bind.dialect.name != "mysql":
+                yield
+                return
+            # Named locks belong to a connection; the session's connection goes back to the pool on commit
+            with bind.connect() as conn:
+                if not conn.execute(
+                    text("SELECT GET_LOCK(:name, :timeout)"),
+                    {"name": START_LOCK, "timeout": START_LOCK_TIMEOUT_SECONDS}
+                ).scalar():
+                    raise ValueError("Another worker is starting a bucket storage refresh, try again")
+                try:
+                    yield
+                finally:
+                    conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": START_LOCK})
+    
+    def start_refresh(self, db: Session) -> Dict:
+        """Start listing the default bucket in the background; returns the job (an existing one if already running).
+        
+        Raises ValueError when no default B2 credential is configured.
+        """
+        b2_service = default_b2_service(db)
+        if b2_service is None:
+            raise ValueError("No active default B2 credential configured")
+        
+        with self._start_lock(db):
+            # End the session's read transaction so running() sees jobs other workers just committed
+            db.commit()
+            existing = self.running(db, b2_service.bucket)
+            if existing:
+                return {"job_id": existing.job_id, "status": existing.status, "already_running": True}
+            
+            snapshot = BucketStorageSnapshot(
+                job_id=str(uuid.uuid4()),
+                bucket_name=b2_service.bucket,
+                status="running",
+                started_at=datetime.now(timezone.utc)
+            )
+            db.add(snapshot)
+            db.commit()
+        
+        threading.Thread(
+            target=self._run,
+            args=(snapshot.id, b2_service),
+            name=f"bucket-snapshot-{snapshot.id}",
+            daemon=True
+        ).start()
+        logger.info(f"Started bucket storage snapshot {snapshot.job_id} for {b2_service.bucket}")
+        return {"job_id": snapshot.job_id, "status": "running", "already_running": False}
+    
+    def _run(self, snapshot_id: int, b2_service: B2Service):
+        db = SessionLocal()
+        try:
+            snapshot = db.query(BucketStorageSnapshot).filter(BucketStorageSnapshot.id == snapshot_id).one()
+            prefixes: Dict[str, Dict[str, int]] = {}
+            total_bytes = 0
+            total_objects = 0
+            list_calls = 0
+            try:
+                # Top-level prefixes (tenants) are listed in parallel and arrive as each one finishes
+                for prefix, totals in b2_service.iter_prefix_totals():
+                    list_calls += totals["list_calls"]
+                    if not totals["objects"]:
+                        continue
+                    prefixes[prefix] = {"bytes": totals["bytes"], "objects": totals["objects"]}
+                    total_bytes += totals["bytes"]
+                    total_objects += totals["objects"]
+                    if len(prefixes) % PROGRESS_EVERY_PREFIXES == 0:
+                        snapshot.total_bytes, snapshot.total_objects, snapshot.list_calls = total_bytes, total_objects, list_calls
+                        db.commit()
+            except Exception as e:
+                logger.error(f"Bucket storage snapshot {snapshot.job_id} failed: {e}")
+                snapshot.status = "failed"
+                snapshot.error = str(e)[:1000]
+            else:
+                snapshot.status = "completed"
+                snapshot.prefixes = json.dumps(prefixes, separators=(",", ":"))
+                logger.info(
+                    f"Bucket storage snapshot {snapshot.job_id}: {total_objects} objects, "
+                    f"{total_bytes} bytes, {len(prefixes)} prefixes, {list_calls} list calls"
+                )
+            snapshot.total_bytes, snapshot.total_objects, snapshot.list_calls = total_bytes, total_objects, list_calls
+            snapshot.completed_at = datetime.now(timezone.utc)
+            db.commit()
+        except Exception as e:
+            logger.error(f"Could not record bucket storage snapshot {snapshot_id}: {e}")
+            db.rollback()
+        finally:
+            db.close()
+    
+    def refresh_if_stale(self) -> Optional[str]:
+        """Start a refresh when the newest snapshot is older than the interval; returns the new job id"""
+        db = SessionLocal()
+        try:
+            b2_service = default_b2_service(db)
+            if b2_service is None:
+                return None
+            latest = self.latest(db, b2_service.bucket)
+            if latest and latest.completed_at:
+                if datetime.now(timezone.utc) - _as_utc(latest.completed_at) < timedelta(seconds=self.interval_seconds):
+                    return None
+            job = self.start_refresh(db)
+            return None if job["already_running"] else job["job_id"]
+        finally:
+            db.close()
+    
+    async def run_forever(self, check_every_seconds: int = 300):
+        """Background task: keep the default bucket's snapshot younger than interval_seconds"""
+        from starlette.concurrency import run_in_threadpool
+        while True:
+            try:
+                await run_in_threadpool(self.refresh_if_stale)
+            except Exception as e:
+                logger.error(f"Bucket storage snapshot scheduling failed: {e}")
+            await asyncio.sleep(min(check_every_seconds, self.interval_seconds))
+    
+    @staticmethod
+    def to_dict(snapshot: BucketStorageSnapshot, include_prefixes: bool = False) -> Dict:
+        started_at = _as_utc(snapshot.started_at)
+        completed_at = _as_utc(snapshot.completed_at)
+        data = {
+            "job_id": snapshot.job_id,
+            "bucket": snapshot.bucket_name,
+            "status": snapshot.status,
+            "total_bytes": snapshot.total_bytes,
+            "total_size_mb": round((snapshot.total_bytes or 0) / (1024 * 1024), 2),
+            "total_objects": snapshot.total_objects,
+            "list_calls": snapshot.list_calls,
+            "started_at": started_at.isoformat() if started_at else None,
+            "completed_at": completed_at.isoformat() if completed_at else None,
+            "age_seconds": int((datetime.now(timezone.utc) - completed_at).total_seconds()) if completed_at else None,
+            "error": snapshot.error
+        }
+        if include_prefixes:
+            data["prefixes"] = json.loads(snapshot.prefixes) if snapshot.prefixes else {}
+        return data
+
+bucket_storage_snapshots = BucketStorageSnapshots(
+    interval_seconds=settings.BUCKET_SNAPSHOT_INTERVAL_SECONDS,
+    job_timeout_seconds=settings.BUCKET_SNAPSHOT_JOB_TIMEOUT_SECONDS
+)
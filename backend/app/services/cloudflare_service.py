@@ -1,7 +1,9 @@
 import requests
 from typing import Optional, Dict
 from app.config import settings
+from app.services.metrics import cloudflare_request_duration_seconds, cloudflare_request_errors_total
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +20,20 @@ class CloudflareService:
             "Content-Type": "application/json"
         }
     
+    def _request(self, operation: str, method: str, url: str, **kwargs) -> requests.Response:
+        """Call the Cloudflare API, recording latency (and failures) per operation"""
+        start = time.perf_counter()
+        try:
+            response = requests.request(method, url, headers=self._get_headers(), **kwargs)
+        except requests.exceptions.RequestException:
+            cloudflare_request_errors_total.labels(operation).inc()
+            raise
+        finally:
+            cloudflare_request_duration_seconds.labels(operation).observe(time.perf_counter() - start)
+        if response.status_code >= 400:
+            cloudflare_request_errors_total.labels(operation).inc()
+        return response
+    
     def create_subdomain(self, subdomain: str, target: str = None) -> Dict:
         """Create a DNS A record for subdomain"""
         if not target:
@@ -34,7 +50,7 @@ class CloudflareService:
         }
         
         try:
-            response = requests.post(url, json=data, headers=self._get_headers())
+            response = self._request("create_dns_record", "POST", url, json=data)
             response.raise_for_status()
             result = response.json()
             
@@ -59,7 +75,7 @@ class CloudflareService:
         }
         
         try:
-            response = requests.get(url, params=params, headers=self._get_headers())
+            response = self._request("list_dns_records", "GET", url, params=params)
             response.raise_for_status()
             result = response.json()
             
@@ -68,7 +84,7 @@ class CloudflareService:
                 
                 # Delete the record
                 delete_url = f"{self.base_url}/zones/{self.zone_id}/dns_records/{record_id}"
-                delete_response = requests.delete(delete_url, headers=self._get_headers())
+                delete_response = self._request("delete_dns_record", "DELETE", delete_url)
                 delete_response.raise_for_status()
                 
                 logger.info(f"Deleted subdomain {subdomain}.{self.base_domain}")
@@ -90,7 +106,7 @@ class CloudflareService:
             data = {"purge_everything": True}
         
         try:
-            response = requests.post(url_endpoint, json=data, headers=self._get_headers())
+            response = self._request("purge_cache", "POST", url_endpoint, json=data)
             response.raise_for_status()
             result = response.json()
             return result.get("success", False)
@@ -0,0 +1,103 @@
+"""
+Mergeable latency sketch with bounded relative error (DDSketch-style).
+
+Values are counted in logarithmic bins, bin k covering (gamma^(k-1), gamma^k]
+with gamma = (1 + a) / (1 - a), so any quantile is returned within a
+relative error a of the true value. Two sketches merge by adding bin counts,
+which is what lets per-minute rollups be combined into any time window.
+"""
+from typing import Dict, Optional
+import json
+import math
+
+class LatencySketch:
+    def __init__(self, relative_accuracy: float = 0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0  # Values <= 0 (e.g. sub-millisecond requests rounded down)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+    
+    def add(self, value: float, count: int = 1):
+        if value > 0:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[key] = self.bins.get(key, 0) + count
+        else:
+            self.zero_count += count
+        self.count += count
+        self.sum += value * count
+        if value > self.max:
+            self.max = value
+    
+    def merge(self, other: "LatencySketch"):
+        """Add other's counts; bins of a different accuracy are re-binned by their midpoint.
+        
+        Re-binned values carry both sketches' error, so merge into the coarser sketch
+        (see rebinned) to keep the larger of the two accuracies as the bound.
+        """
+        if other.relative_accuracy == self.relative_accuracy:
+            for key, count in other.bins.items():
+                self.bins[key] = self.bins.get(key, 0) + count
+        else:
+            for key, count in other.bins.items():
+                value = other._bin_value(key)
+                own_key = math.ceil(math.log(value) / self._log_gamma)
+                self.bins[own_key] = self.bins.get(own_key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+    
+    def rebinned(self, relative_accuracy: float) -> "LatencySketch":
+        """Copy of this sketch with its bins mapped to relative_accuracy"""
+        sketch = LatencySketch(relative_accuracy)
+        sketch.merge(self)
+        return sketch
+    
+    def _bin_value(self, key: int) -> float:
+        # Midpoint (in relative terms) of bin key
+        return 2 * self._gamma ** key / (self._gamma + 1)
+    
+    def quantile(self, q: float) -> Optional[float]:
+        """Value at quantile q (0..1), or None for an empty sketch"""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                # Midpoint (in relative terms) of the bin, capped by the largest value seen
+                return min(self._bin_value(key), self.max)
+        return self.max
+    
+    def mean(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+    
+    def to_json(self) -> str:
+        return json.dumps({
+            "a": self.relative_accuracy,
+            "z": self.zero_count,
+            "n": self.count,
+            "s": round(self.sum, 3),
+            "m": round(self.max, 3),
+            "b": {str(k): v for k, v in self.bins.items()}
+        }, separators=(",", ":"))
+    
+    @classmethod
+    def from_json(cls, data: str) -> "LatencySketch":
+        raw = json.loads(data)
+        sketch = cls(raw["a"])
+        sketch.zero_count = raw["z"]
+        sketch.count = raw["n"]
+        sketch.sum = raw["s"]
+        sketch.max = raw["m"]
+        sketch.bins = {int(k): v for k, v in raw["b"].items()}
+        return sketch
@@ -0,0 +1,165 @@
+"""
+Range-partition maintenance for the api_logs table (MySQL).
+
+api_logs is partitioned by RANGE (TO_DAYS(created_at)) with one partition per
+day or month plus a catch-all `pmax`. This service keeps partitions for the
+next few periods ready by splitting pmax (cheap while pmax is empty) and
+enforces retention by dropping whole partitions instead of running DELETEs.
+"""
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from typing import Dict, List, Optional
+from app.config import settings
+from app.database import engine
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+INTERVALS = ("day", "month")
+MAXVALUE_PARTITION = "pmax"
+# Serializes maintenance across workers/containers sharing the database
+MAINTENANCE_LOCK = "api_logs_partition_maintenance"
+
+def to_days(day: date) -> int:
+    """MySQL TO_DAYS() for a date"""
+    return day.toordinal() + 365
+
+def from_days(days: int) -> date:
+    return date.fromordinal(days - 365)
+
+class ApiLogPartitionManager:
+    def __init__(self, engine: Engine, table: str, interval: str, periods_ahead: int, retention_days: int):
+        if interval not in INTERVALS:
+            raise ValueError(f"Unknown partition interval '{interval}', expected one of {INTERVALS}")
+        self.engine = engine
+        self.table = table
+        self.interval = interval
+        self.periods_ahead = max(1, periods_ahead)
+        self.retention_days = retention_days
+    
+    def period_start(self, day: date) -> date:
+        return day if self.interval == "day" else day.replace(day=1)
+    
+    def next_period(self, start: date) -> date:
+        if self.interval == "day":
+            return start + timedelta(days=1)
+        return date(start.year + start.month // 12, start.month % 12 + 1, 1)
+    
+    def partition_name(self, start: date) -> str:
+        return "p" + start.strftime("%Y%m%d" if self.interval == "day" else "%Y%m")
+    
+    def list_partitions(self, conn) -> List[Dict]:
+        """Partitions in order; upper_bound is the TO_DAYS() value or None for MAXVALUE"""
+        rows = conn.execute(text(
+            "SELECT PARTITION_NAME, PARTITION_DESCRIPTION, TABLE_ROWS "
+            "FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION"
+        ), {"table": self.table}).fetchall()
+        partitions = []
+        for name, description, table_rows in rows:
+            upper_bound = None if description in (None, "MAXVALUE") else int(description)
+            partitions.append({
+                "name": name,
+                "upper_bound": upper_bound,
+                "less_than": from_days(upper_bound).isoformat() if upper_bound is not None else "MAXVALUE",
+                "approx_rows": table_rows
+            })
+        return partitions
+    
+    def plan_new_partitions(self, partitions: List[Dict], today: date) -> List[Dict]:
+        """Partitions to split out of pmax so that periods_ahead future periods exist"""
+        bounds = [p["upper_bound"] for p in partitions if p["upper_bound"] is not None]
+        start = self.period_start(today)
+        if bounds:
+            # Ranges can only be appended after the highest existing bound
+            start = max(start, self.period_start(from_days(max(bounds))))
+            while to_days(self.next_period(start)) <= max(bounds):
+                start = self.next_period(start)
+        
+        target = self.period_start(today)
+        for _ in range(self.periods_ahead):
+            target = self.next_period(target)
+        
+        planned = []
+        existing = {p["name"] for p in partitions}
+        while start <= target:
+            end = self.next_period(start)
+            name = self.partition_name(start)
+            if name in existing:
+                name = f"{name}_{to_days(end)}"
+            planned.append({"name": name, "upper_bound": to_days(end), "less_than": end.isoformat()})
+            start = end
+        return planned
+    
+    def plan_expired_partitions(self, partitions: List[Dict], today: date) -> List[str]:
+        """Partitions whose rows are all older than the retention window"""
+        if self.retention_days <= 0:
+            return []
+        cutoff = to_days(today - timedelta(days=self.retention_days))
+        return [
+            p["name"] for p in partitions
+            if p["upper_bound"] is not None and p["upper_bound"] <= cutoff
+        ]
+    
+    def run(self, now: Optional[datetime] = None) -> Dict:
+        """Create upcoming partitions and drop expired ones; safe to call from several processes"""
+        if self.engine.dialect.name != "mysql":
+            return {"status": "skipped", "reason": f"partitioning is MySQL-only (dialect: {self.engine.dialect.name})"}
+        
+        today = (now or datetime.now(timezone.utc)).date()
+        with self.engine.connect() as conn:
+            if not conn.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": MAINTENANCE_LOCK}).scalar():
+                return {"status": "skipped", "reason": "maintenance already running elsewhere"}
+            try:
+                partitions = self.list_partitions(conn)
+                if not any(p["upper_bound"] is None and p["name"] == MAXVALUE_PARTITION for p in partitions):
+                    logger.warning(f"{self.table} is not range-partitioned with a '{MAXVALUE_PARTITION}' partition; run the Alembic migrations")
+                    return {"status": "skipped", "reason": f"{self.table} is not partitioned"}
+                
+                created = self.plan_new_partitions(partitions, today)
+                if created:
+                    definitions = ", ".join(
+                        f"PARTITION {p['name']} VALUES LESS THAN ({p['upper_bound']})" for p in created
+                    )
+                    conn.execute(text(
+                        f"ALTER TABLE {self.table} REORGANIZE PARTITION {MAXVALUE_PARTITION} INTO "
+                        f"({definitions}, PARTITION {MAXVALUE_PARTITION} VALUES LESS THAN MAXVALUE)"
+                    ))
+                
+                dropped = self.plan_expired_partitions(partitions, today)
+                if dropped:
+                    conn.execute(text(f"ALTER TABLE {self.table} DROP PARTITION {', '.join(dropped)}"))
+                
+                conn.commit()
+                if created or dropped:
+                    logger.info(
+                        f"{self.table} partitions: created {[p['name'] for p in created]}, dropped {dropped}"
+                    )
+                return {
+                    "status": "ok",
+                    "created": [p["name"] for p in created],
+                    "dropped": dropped
+                }
+            finally:
+                conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": MAINTENANCE_LOCK})
+    
+    async def run_forever(self, interval_seconds: int):
+        """Background task: run maintenance now and then every interval_seconds"""
+        from starlette.concurrency import run_in_threadpool
+        while True:
+            try:
+                await run_in_threadpool(self.run)
+            except Exception as e:
+                logger.error(f"{self.table} partition maintenance failed: {e}")
+            await asyncio.sleep(interval_seconds)
+
+api_log_partitions = ApiLogPartitionManager(
+    engine=engine,
+    table="api_logs",
+    interval=settings.API_LOG_PARTITION_INTERVAL,
+    periods_ahead=settings.API_LOG_PARTITIONS_AHEAD,
+    retention_days=settings.API_LOG_RETENTION_DAYS
+)
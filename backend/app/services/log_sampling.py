@@ -0,0 +1,83 @@
+from typing import Dict, Optional
+from app.config import settings
+import random
+import threading
+
+class LogSamplingPolicy:
+    """Decides which requests are stored in api_logs and with what weight.
+    
+    Errors (status >= 400) and slow requests are always kept with weight 1.
+    Other requests are head-sampled at the rate configured for their route
+    (falling back to default_rate) and stored with weight 1 / rate, so summing
+    sample_weight over a filter estimates the real number of requests.
+    
+    Rates and slow thresholds are keyed by route template
+    ("/api/tenant/photos/{photo_id}") or by path prefix ("/api/tenant/");
+    the exact template wins, then the longest matching prefix.
+    """
+    
+    def __init__(
+        self,
+        default_rate: float = 1.0,
+        path_rates: Optional[Dict[str, float]] = None,
+        slow_ms: int = 1000,
+        path_slow_ms: Optional[Dict[str, int]] = None
+    ):
+        self.default_rate = self._clamp(default_rate)
+        self.path_rates = {path: self._clamp(rate) for path, rate in (path_rates or {}).items()}
+        self.slow_ms = slow_ms
+        self.path_slow_ms = dict(path_slow_ms or {})
+        # Route templates are a small fixed set, so their resolved (rate, slow_ms) is memoized
+        self._resolved: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _clamp(rate: float) -> float:
+        return min(1.0, max(0.0, float(rate)))
+    
+    @staticmethod
+    def _match(rules: Dict, path: str):
+        if path in rules:
+            return rules[path]
+        best = None
+        for prefix in rules:
+            if path.startswith(prefix) and (best is None or len(prefix) > len(best)):
+                best = prefix
+        return rules[best] if best is not None else None
+    
+    def _resolve(self, path: str, cache: bool) -> tuple:
+        resolved = self._resolved.get(path)
+        if resolved is None:
+            rate = self._match(self.path_rates, path)
+            slow_ms = self._match(self.path_slow_ms, path)
+            resolved = (
+                self.default_rate if rate is None else rate,
+                self.slow_ms if slow_ms is None else slow_ms
+            )
+            if cache:
+                with self._lock:
+                    self._resolved[path] = resolved
+        return resolved
+    
+    def slow_threshold_ms(self, path: str, route: Optional[str] = None) -> int:
+        return self._resolve(route or path, cache=route is not None)[1]
+    
+    def sample_weight(self, path: str, status_code: int, duration_ms: int, route: Optional[str] = None) -> Optional[float]:
+        """Weight to store the request with, or None if it should not be logged"""
+        if status_code >= 400:
+            return 1.0
+        rate, slow_ms = self._resolve(route or path, cache=route is not None)
+        if duration_ms >= slow_ms:
+            return 1.0
+        if rate >= 1.0:
+            return 1.0
+        if rate <= 0.0 or random.random() >= rate:
+            return None
+        return 1.0 / rate
+
+log_sampling_policy = LogSamplingPolicy(
+    default_rate=settings.API_LOG_SAMPLE_RATE,
+    path_rates=settings.API_LOG_PATH_SAMPLE_RATES,
+    slow_ms=settings.API_LOG_SLOW_MS,
+    path_slow_ms=settings.API_LOG_PATH_SLOW_MS
+)
@@ -0,0 +1,200 @@
+"""
+Event-loop lag monitor and blocking-call detector.
+
+A heartbeat task sleeps for a fixed interval and records how late it wakes
+up (event_loop_lag_seconds). A watchdog thread notices when the heartbeat is
+overdue by more than the stall threshold, grabs the event loop thread's
+current stack with sys._current_frames() and attributes the stall to the
+innermost frame in our own code (the call site) and to the route being
+served. Stalls are aggregated per call site for GET /api/admin/loop-stalls.
+"""
+from typing import Dict, List, Optional
+from app.config import settings
+from app.services.metrics import metrics_registry
+import asyncio
+import logging
+import os
+import sys
+import sysconfig
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Frames from these are never reported as the call site
+LIBRARY_DIRS = tuple({sysconfig.get_paths()[name] for name in ("stdlib", "platstdlib", "purelib", "platlib")})
+UNKNOWN_SITE = "<not captured>"
+
+event_loop_lag_seconds = metrics_registry.histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop heartbeat woke up",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+event_loop_stalls_total = metrics_registry.counter(
+    "event_loop_stalls_total",
+    "Heartbeats delayed by more than LOOP_MONITOR_STALL_MS"
+)
+
+def _call_site(stack: traceback.StackSummary) -> str:
+    """Innermost frame in our own code, i.e. outside the stdlib and installed packages"""
+    for frame in reversed(stack):
+        if not frame.filename.startswith(LIBRARY_DIRS) and not frame.filename.startswith("<"):
+            break
+    else:
+        frame = stack[-1]
+    filename = frame.filename
+    if filename.startswith(APP_DIR):
+        filename = os.path.relpath(filename, os.path.dirname(APP_DIR))
+    return f"{filename}:{frame.lineno} in {frame.name}"
+
+def _active_route(frame) -> Optional[str]:
+    """Route template (or path) of the ASGI scope found in the stack, if any"""
+    while frame is not None:
+        scope = frame.f_locals.get("scope")
+        if isinstance(scope, dict) and scope.get("type") == "http":
+            route = getattr(scope.get("route"), "path", None)
+            return f"{scope.get('method')} {route or scope.get('path')}"
+        frame = frame.f_back
+    return None
+
+class LoopLagMonitor:
+    def __init__(self, interval_ms: int, stall_ms: int, max_sites: int = 200, log_every_seconds: int = 60):
+        self.interval = interval_ms / 1000
+        self.stall = stall_ms / 1000
+        self.max_sites = max_sites
+        self.log_every_seconds = log_every_seconds
+        self._sites: Dict[str, Dict] = {}
+        self._pending: Optional[Dict] = None  # Capture for the stall in progress
+        self._logged_at: Dict[str, float] = {}
+        self._last_beat = time.monotonic()
+        self._beat = 0
+        self._captured_beat = -1
+        self._loop_thread_id: Optional[int] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def start(self):
+        """Start the heartbeat task (on the running loop) and the watchdog thread"""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+    
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+    
+    async def _heartbeat(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            event_loop_lag_seconds.observe(lag)
+            self._last_beat = time.monotonic()
+            self._beat += 1
+            if lag >= self.stall:
+                self._record_stall(lag)
+    
+    def _watch(self):
+        check_every = min(self.interval, self.stall) / 2
+        while not self._stop.wait(check_every):
+            overdue = time.monotonic() - self._last_beat - self.interval
+            beat = self._beat
+            if overdue >= self.stall and self._captured_beat != beat:
+                self._captured_beat = beat
+                try:
+                    self._capture(overdue)
+                except Exception as e:
+                    logger.debug(f"Could not capture event loop stack: {e}")
+    
+    def _capture(self, overdue: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        stack = traceback.extract_stack(frame)
+        site = _call_site(stack)
+        route = _active_route(frame)
+        lines = stack.format()[-15:]
+        now = time.time()
+        with self._lock:
+            self._pending = {"site": site, "route": route, "stack": lines}
+            # Log each call site at most once per log_every_seconds
+            should_log = now - self._logged_at.get(site, 0) >= self.log_every_seconds
+            if should_log:
+                # Re-inserted so the dict stays in logging order; when full, forget the site logged longest ago
+                self._logged_at.pop(site, None)
+                if len(self._logged_at) >= self.max_sites:
+                    del self._logged_at[next(iter(self._logged_at))]
+                self._logged_at[site] = now
+        if should_log:
+            logger.warning(
+                f"Event loop blocked for {overdue * 1000:.0f}+ ms at {site} (route: {route or 'none'})\n"
+                + "".join(lines)
+            )
+    
+    def _record_stall(self, lag: float):
+        """Called by the heartbeat once the loop is free again: attribute the full stall"""
+        event_loop_stalls_total.inc()
+        with self._lock:
+            pending, self._pending = self._pending, None
+            site = pending["site"] if pending else UNKNOWN_SITE
+            entry = self._sites.get(site)
+            if entry is None:
+                if len(self._sites) >= self.max_sites:
+                    site, entry = UNKNOWN_SITE, self._sites.get(UNKNOWN_SITE)
+                if entry is None:
+                    entry = self._sites[site] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "routes": {}}
+            entry["count"] += 1
+            entry["total_ms"] += lag * 1000
+            entry["max_ms"] = max(entry["max_ms"], lag * 1000)
+            entry["last_seen"] = time.time()
+            if pending:
+                route = pending["route"] or "none"
+                entry["routes"][route] = entry["routes"].get(route, 0) + 1
+                entry["stack"] = pending["stack"]
+    
+    def report(self) -> List[Dict]:
+        """Stalls per call site, worst total first"""
+        with self._lock:
+            sites = [(site, dict(entry, routes=dict(entry["routes"]))) for site, entry in self._sites.items()]
+        return sorted(
+            [
+                {
+                    "call_site": site,
+                    "count": entry["count"],
+                    "total_ms": round(entry["total_ms"], 1),
+                    "max_ms": round(entry["max_ms"], 1),
+                    "routes": entry["routes"],
+                    "last_seen": entry.get("last_seen"),
+                    "stack": entry.get("stack", [])
+                }
+                for site, entry in sites
+            ],
+            key=lambda s: s["total_ms"],
+            reverse=True
+        )
+    
+    def reset(self):
+        with self._lock:
+            self._sites.clear()
+            self._logged_at.clear()
+            self._pending = None
+
+loop_lag_monitor = LoopLagMonitor(
+    interval_ms=settings.LOOP_MONITOR_INTERVAL_MS,
+    stall_ms=settings.LOOP_MONITOR_STALL_MS
+)
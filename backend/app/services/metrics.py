@@ -0,0 +1,270 @@
+"""
+In-process metrics registry with Prometheus text exposition.
+
+Counters, gauges and histograms are kept per label set. Recording an
+observation is a dict lookup for the label set, a bisect for the bucket and
+one short uncontended lock, so it stays in the low microseconds. Gauges can
+also be backed by a callback that is read at scrape time (pool sizes etc.).
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import math
+import threading
+import time
+
+# Request/dependency latencies in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Waiting for a pooled DB connection is normally (close to) zero
+POOL_WAIT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class _Metric:
+    kind = ""
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+    
+    def _new_child(self):
+        raise NotImplementedError
+    
+    def labels(self, *values: str):
+        """Child for one label set; created on first use"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+    
+    def _samples(self) -> Iterable[str]:
+        raise NotImplementedError
+    
+    def expose(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+class _Value:
+    __slots__ = ("value", "_lock")
+    
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+    
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+    
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self.value -= amount
+    
+    def set(self, value: float):
+        self.value = value
+
+class Counter(_Metric):
+    kind = "counter"
+    
+    def _new_child(self):
+        return _Value()
+    
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+    
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+class Gauge(_Metric):
+    kind = "gauge"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 callback: Optional[Callable[[], Optional[float]]] = None):
+        super().__init__(name, documentation, labelnames)
+        # Read at scrape time instead of being set; return None to omit the sample
+        self.callback = callback
+    
+    def _new_child(self):
+        return _Value()
+    
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+    
+    def dec(self, amount: float = 1.0):
+        self.labels().dec(amount)
+    
+    def set(self, value: float):
+        self.labels().set(value)
+    
+    def _samples(self):
+        if self.callback is not None:
+            try:
+                value = self.callback()
+            except Exception:
+                value = None
+            if value is not None:
+                yield f"{self.name} {_format_value(value)}"
+            return
+        for values, child in list(self._children.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+class _HistogramChild:
+    __slots__ = ("_bounds", "_counts", "_sum", "_lock")
+    
+    def __init__(self, bounds: Tuple[float, ...]):
+        self._bounds = bounds
+        self._counts = [0] * (len(bounds) + 1)  # Last slot is +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float):
+        index = bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+    
+    @contextmanager
+    def time(self):
+        """Observe the duration of the with-block in seconds (also when it raises)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+    
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self._counts), self._sum
+
+class Histogram(_Metric):
+    kind = "histogram"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets if b != math.inf))
+    
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+    
+    def observe(self, value: float):
+        self.labels().observe(value)
+    
+    def time(self):
+        return self.labels().time()
+    
+    def _samples(self):
+        bounds = self.buckets + (math.inf,)
+        for values, child in list(self._children.items()):
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+    
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+    
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+    
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+              callback: Optional[Callable[[], Optional[float]]] = None) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames, callback))
+    
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+    
+    def get(self, name: str) -> Optional[_Metric]:
+        return self._metrics.get(name)
+    
+    def expose(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.expose() for metric in metrics) + "\n"
+
+metrics_registry = MetricsRegistry()
+
+http_request_duration_seconds = metrics_registry.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template, method and status code",
+    ("method", "route", "status")
+)
+http_requests_in_flight = metrics_registry.gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being served"
+)
+db_pool_wait_seconds = metrics_registry.histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a database connection from the pool",
+    buckets=POOL_WAIT_BUCKETS
+)
+b2_request_duration_seconds = metrics_registry.histogram(
+    "b2_request_duration_seconds",
+    "Backblaze B2 S3 API call latency by operation (presign is local signing)",
+    ("operation",)
+)
+b2_request_errors_total = metrics_registry.counter(
+    "b2_request_errors_total",
+    "Backblaze B2 S3 API calls that failed, by operation",
+    ("operation",)
+)
+cloudflare_request_duration_seconds = metrics_registry.histogram(
+    "cloudflare_request_duration_seconds",
+    "Cloudflare API call latency by operation",
+    ("operation",)
+)
+cloudflare_request_errors_total = metrics_registry.counter(
+    "cloudflare_request_errors_total",
+    "Cloudflare API calls that failed, by operation",
+    ("operation",)
+)
+
+def register_pool_gauges(engine):
+    """Scrape-time gauges for an engine's connection pool (QueuePool exposes these counters)"""
+    pool = lambda: engine.pool
+    for name, documentation, read in (
+        ("db_pool_size", "Configured persistent connections in the pool", lambda: pool().size()),
+        ("db_pool_checked_out", "Connections currently checked out of the pool", lambda: pool().checkedout()),
+        ("db_pool_checked_in", "Idle connections in the pool", lambda: pool().checkedin()),
+        ("db_pool_overflow", "Connections open beyond pool_size (negative while the pool is filling)", lambda: pool().overflow())
+    ):
+        metrics_registry.gauge(name, documentation, callback=read)
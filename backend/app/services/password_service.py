@@ -0,0 +1,67 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from passlib.context import CryptContext
+from typing import Optional, Tuple, Dict
+from app.config import settings
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+class PasswordHasherOverloaded(Exception):
+    """Raised when too many hash/verify jobs are already queued"""
+    pass
+
+class PasswordHasher:
+    """Runs bcrypt on a small dedicated thread pool with a bounded queue.
+
+    bcrypt costs a few hundred ms of CPU per call; running it on the event loop
+    (or on the shared request threads) lets a burst of logins starve every
+    other request. Jobs beyond max_pending are rejected instead of queued.
+    """
+
+    def __init__(self, rounds: int, max_workers: int, max_pending: int):
+        # min == max == default so hashes with any other cost are flagged for rehash
+        self.context = CryptContext(
+            schemes=["bcrypt"],
+            deprecated="auto",
+            bcrypt__default_rounds=rounds,
+            bcrypt__min_rounds=rounds,
+            bcrypt__max_rounds=rounds
+        )
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self.rejected = 0
+
+    def _submit(self, fn, *args) -> Future:
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise PasswordHasherOverloaded("Password hashing queue is full")
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password; also returns a new hash if the stored one uses an outdated cost"""
+        return await asyncio.wrap_future(self._submit(self.context.verify_and_update, password, hashed_password))
+
+    async def hash(self, password: str) -> str:
+        """Hash a password"""
+        return await asyncio.wrap_future(self._submit(self.context.hash, password))
+
+    def stats(self) -> Dict:
+        return {
+            "max_pending": self.max_pending,
+            "rejected": self.rejected
+        }
+
+password_hasher = PasswordHasher(
+    rounds=settings.BCRYPT_ROUNDS,
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING
+)
@@ -0,0 +1,75 @@
+"""
+Per-request SQL statement counting for debugging (SQL_QUERY_TRACKING).
+
+Engine cursor events add each statement's duration to the QueryStats of the
+current request, which QueryTrackingMiddleware keeps in a context variable.
+Sync endpoints run on worker threads with a copy of the request's context,
+so their queries land in the same QueryStats. Nothing is registered while
+tracking is disabled, so it costs nothing then.
+"""
+from collections import Counter
+from contextvars import ContextVar
+from functools import lru_cache
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from typing import List, Optional, Tuple
+import re
+import time
+
+# Expanded IN lists / multi-row VALUES of any length share one shape
+_PLACEHOLDER_LIST = re.compile(r"(\?|%s|%\(\w+\)s|:\w+)(\s*,\s*(\?|%s|%\(\w+\)s|:\w+))+")
+_WHITESPACE = re.compile(r"\s+")
+
+@lru_cache(maxsize=2048)
+def statement_shape(statement: str) -> str:
+    return _PLACEHOLDER_LIST.sub(r"\1, ...", _WHITESPACE.sub(" ", statement).strip())
+
+class QueryStats:
+    __slots__ = ("count", "duration", "shapes")
+    
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0  # Seconds spent in cursor.execute()
+        self.shapes: Counter = Counter()
+    
+    def record(self, statement: str, duration: float):
+        self.count += 1
+        self.duration += duration
+        self.shapes[statement_shape(statement)] += 1
+    
+    def repeated(self, min_repeats: int) -> List[Tuple[str, int]]:
+        """Statement shapes executed more than min_repeats times, most frequent first"""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n > min_repeats]
+
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_times", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get("query_start_times")
+    if not start_times:
+        return
+    duration = time.perf_counter() - start_times.pop()
+    stats = current_query_stats.get()
+    if stats is not None:
+        stats.record(statement, duration)
+
+def _handle_error(exception_context):
+    # after_cursor_execute does not run for a failed statement
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_start_times"):
+        conn.info["query_start_times"].pop()
+
+def install(engine: Engine):
+    """Start timing statements on engine (idempotent)"""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+
+def uninstall(engine: Engine):
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.remove(engine, "before_cursor_execute", _before_cursor_execute)
+        event.remove(engine, "after_cursor_execute", _after_cursor_execute)
+        event.remove(engine, "handle_error", _handle_error)
@@ -0,0 +1,434 @@
+"""
+Reconciliation between a tenant's Photo rows and its objects in B2.
+
+Both sides are streamed in key order and merge-joined, so memory stays flat
+however many objects a tenant has: the B2 listing of tenant_<id>/ one page at
+a time, and the Photo rows with yield_per over ORDER BY CAST(b2_key AS BINARY)
+(S3 lists keys in UTF-8 byte order, which a text collation would not match).
+
+Findings:
+- orphan: object in B2 without a Photo row (stored, but not charged to the tenant)
+- missing: Photo row without an object (upload never finished; its size is still charged)
+- size mismatch: both exist with different sizes
+- duplicate row: a second Photo row for the same key (reported only)
+
+Anything younger than the grace period may be an upload in flight and is
+skipped, as are pending rows (the reservation sweeper owns those, see
+app/services/upload_reservation_service.py); expired rows are not read. With apply, orphans are deleted from B2, missing rows are deleted
+and their storage released, and sizes are corrected, RECONCILE_BATCH_SIZE
+at a time, each batch in its own transaction.
+"""
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import LargeBinary, cast, func
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from app.config import settings
+from app.database import SessionLocal
+from app.models import MultipartUpload, MultipartUploadPart, Photo, StorageReconciliation, Tenant
+from app.services.b2_service import B2Service
+from app.services.tenant_service import TenantService
+import json
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# DeleteObjects takes at most 1000 keys
+MAX_DELETE_KEYS = 1000
+
+class ReconciliationOrderError(RuntimeError):
+    """An input of the merge-join was not sorted by key"""
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # MySQL DATETIME comes back naive; the values are UTC
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+def _sorted_keys(items: Iterable, key_of, name: str, unique: bool) -> Iterator:
+    previous = None
+    for item in items:
+        key = key_of(item)
+        if previous is not None and (key < previous or (unique and key == previous)):
+            raise ReconciliationOrderError(f"{name} out of order: {key!r} after {previous!r}")
+        previous = key
+        yield item
+
+def merge_join(objects: Iterable[Dict], rows: Iterable) -> Iterator[Tuple[str, Optional[Dict], Optional[object]]]:
+    """Pair B2 objects (dicts with 'Key') with rows (with .b2_key), both sorted by key.
+    
+    Yields (key, object or None, row or None). A row repeating the key of the
+    previous row comes out as (key, None, row).
+    """
+    objects = _sorted_keys(objects, lambda obj: obj['Key'], "B2 listing", unique=True)
+    rows = _sorted_keys(rows, lambda row: row.b2_key, "Photo rows", unique=False)
+    obj = next(objects, None)
+    row = next(rows, None)
+    while obj is not None or row is not None:
+        if row is None or (obj is not None and obj['Key'] < row.b2_key):
+            yield obj['Key'], obj, None
+            obj = next(objects, None)
+        elif obj is None or row.b2_key < obj['Key']:
+            yield row.b2_key, None, row
+            row = next(rows, None)
+        else:
+            yield obj['Key'], obj, row
+            obj = next(objects, None)
+            row = next(rows, None)
+
+class _Finding:
+    """Count, bytes and the first few examples of one kind of finding"""
+    __slots__ = ("count", "bytes", "skipped_recent", "samples", "max_samples")
+    
+    def __init__(self, max_samples: int):
+        self.count = 0
+        self.bytes = 0
+        self.skipped_recent = 0
+        self.samples: List[Dict] = []
+        self.max_samples = max_samples
+    
+    def add(self, size: int, sample: Dict):
+        self.count += 1
+        self.bytes += size
+        if len(self.samples) < self.max_samples:
+            self.samples.append(sample)
+    
+    def to_dict(self) -> Dict:
+        return {"count": self.count, "bytes": self.bytes, "skipped_recent": self.skipped_recent, "samples": self.samples}
+
+class _Corrections:
+    """Applies findings in batches, one transaction per batch"""
+    
+    def __init__(self, db: Session, b2_service: B2Service, tenant_id: int, batch_size: int):
+        self.db = db
+        self.b2_service = b2_service
+        self.tenant_id = tenant_id
+        self.batch_size = batch_size
+        self.orphan_keys: List[str] = []
+        self.missing: List[Tuple[int, str, Optional[str]]] = []  # (photo id, key, in-progress multipart UploadId)
+        self.sizes: List[Tuple[int, int, int]] = []  # (photo id, size in the row, size in B2)
+        self.applied = {
+            "objects_deleted": 0,
+            "object_delete_errors": 0,
+            "rows_deleted": 0,
+            "multipart_aborted": 0,
+            "sizes_fixed": 0,
+            "storage_delta_bytes": 0
+        }
+    
+    def delete_object(self, key: str):
+        self.orphan_keys.append(key)
+        if len(self.orphan_keys) >= min(self.batch_size, MAX_DELETE_KEYS):
+            self._flush_orphans()
+    
+    def delete_row(self, photo_id: int, key: str, multipart_upload_id: Optional[str]):
+        self.missing.append((photo_id, key, multipart_upload_id))
+        if len(self.missing) >= self.batch_size:
+            self._flush_missing()
+    
+    def fix_size(self, photo_id: int, row_size: int, object_size: int):
+        self.sizes.append((photo_id, row_size, object_size))
+        if len(self.sizes) >= self.batch_size:
+            self._flush_sizes()
+    
+    def flush(self):
+        self._flush_orphans()
+        self._flush_missing()
+        self._flush_sizes()
+    
+    def _flush_orphans(self):
+        if not self.orphan_keys:
+            return
+        failed = self.b2_service.delete_files(self.orphan_keys)
+        self.applied["objects_deleted"] += len(self.orphan_keys) - len(failed)
+        self.applied["object_delete_errors"] += len(failed)
+        self.orphan_keys = []
+    
+    def _flush_missing(self):
+        if not self.missing:
+            return
+        for _, key, multipart_upload_id in self.missing:
+            if multipart_upload_id:
+                try:
+                    self.b2_service.abort_multipart_upload(key, multipart_upload_id)
+                    self.applied["multipart_aborted"] += 1
+                except Exception:
+                    pass  # Unfinished parts are cleaned up by the bucket lifecycle rules
+        ids = [photo_id for photo_id, _, _ in self.missing]
+        released = self.db.query(func.coalesce(func.sum(Photo.file_size_bytes), 0)).filter(
+            Photo.id.in_(ids),
+            Photo.tenant_id == self.tenant_id
+        ).with_for_update().scalar()
+        upload_ids = self.db.query(MultipartUpload.id).filter(MultipartUpload.photo_id.in_(ids))
+        self.db.query(MultipartUploadPart).filter(
+            MultipartUploadPart.multipart_upload_id.in_(upload_ids.scalar_subquery())
+        ).delete(synchronize_session=False)
+        self.db.query(MultipartUpload).filter(MultipartUpload.photo_id.in_(ids)).delete(synchronize_session=False)
+        deleted = self.db.query(Photo).filter(
+            Photo.id.in_(ids),
+            Photo.tenant_id == self.tenant_id
+        ).delete(synchronize_session=False)
+        TenantService(self.db).update_tenant_storage(self.tenant_id, -int(released), commit=False)
+        self.db.commit()
+        self.applied["rows_deleted"] += deleted
+        self.applied["storage_delta_bytes"] -= int(released)
+        self.missing = []
+    
+    def _flush_sizes(self):
+        if not self.sizes:
+            return
+        delta = 0
+        for photo_id, row_size, object_size in self.sizes:
+            # Only if the row still has the size we compared (confirm may have fixed it meanwhile)
+            updated = self.db.query(Photo).filter(
+                Photo.id == photo_id,
+                Photo.file_size_bytes == row_size
+            ).update({Photo.file_size_bytes: object_size}, synchronize_session=False)
+            if updated:
+                delta += object_size - row_size
+                self.applied["sizes_fixed"] += 1
+        TenantService(self.db).update_tenant_storage(self.tenant_id, delta, commit=False)
+        self.db.commit()
+        self.applied["storage_delta_bytes"] += delta
+        self.sizes = []
+
+def tenant_b2_service(db: Session, tenant: Tenant) -> B2Service:
+    """The tenant's own B2 credentials, else the default ones (same rules as the tenant API)"""
+    from app.routers.tenant import get_b2_service_for_tenant
+    return get_b2_service_for_tenant(tenant, db)
+
+class StorageReconciler:
+    def __init__(self, grace_seconds: int, batch_size: int, sample_size: int, job_timeout_seconds: int):
+        self.grace_seconds = grace_seconds
+        self.batch_size = batch_size
+        self.sample_size = sample_size
+        self.job_timeout_seconds = job_timeout_seconds
+        self._lock = threading.Lock()
+    
+    def reconcile(self, tenant_id: int, apply: bool = False, grace_seconds: Optional[int] = None,
+                  b2_service: Optional[B2Service] = None) -> Dict:
+        """Compare one tenant's Photo rows with its B2 objects (and fix the differences if apply); returns the report.
+        
+        Raises ValueError for an unknown tenant and ReconciliationOrderError if
+        the database does not return the rows in B2's key order.
+        """
+        grace_seconds = self.grace_seconds if grace_seconds is None else grace_seconds
+        read_db = SessionLocal()
+        write_db = SessionLocal()
+        try:
+            tenant = write_db.query(Tenant).filter(Tenant.id == tenant_id).first()
+            if tenant is None:
+                raise ValueError(f"Tenant {tenant_id} not found")
+            storage_used_bytes = tenant.storage_used_bytes or 0
+            if b2_service is None:
+                b2_service = tenant_b2_service(write_db, tenant)
+            write_db.commit()
+            
+            started = time.perf_counter()
+            prefix = f"tenant_{tenant_id}/"
+            cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace_seconds)
+            corrections = _Corrections(write_db, b2_service, tenant_id, self.batch_size) if apply else None
+            orphans = _Finding(self.sample_size)
+            missing = _Finding(self.sample_size)
+            mismatches = _Finding(self.sample_size)
+            duplicates = _Finding(self.sample_size)
+            totals = {"objects": 0, "object_bytes": 0, "rows": 0, "row_bytes": 0, "matched": 0, "list_calls": 0}
+            
+            def objects():
+                for page in b2_service.iter_object_pages(prefix):
+                    totals["list_calls"] += 1
+                    yield from page
+            
+            rows = read_db.query(
+                Photo.id,
+                Photo.b2_key,
+                Photo.file_size_bytes,
+                Photo.uploaded_at,
+                Photo.state,
+                MultipartUpload.status.label("multipart_status"),
+                MultipartUpload.b2_upload_id
+            ).outerjoin(
+                MultipartUpload, MultipartUpload.photo_id == Photo.id
+            ).filter(
+                Photo.tenant_id == tenant_id,
+                Photo.state != "expired"  # Already released; the sweeper deletes them
+            ).order_by(cast(Photo.b2_key, LargeBinary), Photo.id).yield_per(1000)
+            
+            last_matched_key = None
+            for key, obj, row in merge_join(objects(), rows):
+                if obj is not None:
+                    totals["objects"] += 1
+                    totals["object_bytes"] += obj.get('Size', 0)
+                if row is not None:
+                    totals["rows"] += 1
+                    totals["row_bytes"] += row.file_size_bytes or 0
+                
+                if obj is not None and row is not None:
+                    totals["matched"] += 1
+                    last_matched_key = key
+                    if obj.get('Size', 0) == row.file_size_bytes:
+                        continue
+                    if row.state == "pending" or (_as_utc(row.uploaded_at) and _as_utc(row.uploaded_at) > cutoff):
+                        mismatches.skipped_recent += 1
+                        continue
+                    # bytes of this finding: B2 size minus row size, i.e. what the quota is missing
+                    mismatches.add(obj.get('Size', 0) - (row.file_size_bytes or 0), {
+                        "photo_id": row.id, "key": key, "db_size": row.file_size_bytes, "b2_size": obj.get('Size', 0)
+                    })
+                    if corrections is not None:
+                        corrections.fix_size(row.id, row.file_size_bytes, obj.get('Size', 0))
+                elif obj is not None:
+                    last_modified = _as_utc(obj.get('LastModified'))
+                    if last_modified and last_modified > cutoff:
+                        orphans.skipped_recent += 1
+                        continue
+                    orphans.add(obj.get('Size', 0), {
+                        "key": key, "size": obj.get('Size', 0),
+                        "last_modified": last_modified.isoformat() if last_modified else None
+                    })
+                    if corrections is not None:
+                        corrections.delete_object(key)
+                elif key == last_matched_key:
+                    duplicates.add(row.file_size_bytes or 0, {"photo_id": row.id, "key": key, "size": row.file_size_bytes})
+                else:
+                    uploaded_at = _as_utc(row.uploaded_at)
+                    if row.state == "pending" or (uploaded_at and uploaded_at > cutoff):
+                        missing.skipped_recent += 1
+                        continue
+                    missing.add(row.file_size_bytes or 0, {
+                        "photo_id": row.id, "key": key, "size": row.file_size_bytes,
+                        "uploaded_at": uploaded_at.isoformat() if uploaded_at else None,
+                        "multipart_status": row.multipart_status
+                    })
+                    # Rows outside the tenant's prefix were never listed; never delete those
+                    if corrections is not None and key.startswith(prefix):
+                        in_progress = row.b2_upload_id if row.multipart_status == "in_progress" else None
+                        corrections.delete_row(row.id, key, in_progress)
+            if corrections is not None:
+                corrections.flush()
+            
+            report = {
+                "tenant_id": tenant_id,
+                "prefix": prefix,
+                "bucket": b2_service.bucket,
+                "apply": apply,
+                "grace_seconds": grace_seconds,
+                **totals,
+                "storage_used_bytes": storage_used_bytes,
+                # Counter vs. the rows it should add up to (uploads in flight make this move)
+                "counter_drift_bytes": storage_used_bytes - totals["row_bytes"],
+                "orphans": orphans.to_dict(),
+                "missing": missing.to_dict(),
+                "size_mismatches": mismatches.to_dict(),
+                "duplicate_rows": duplicates.to_dict(),
+                "seconds": round(time.perf_counter() - started, 3)
+            }
+            if corrections is not None:
+                report["applied"] = corrections.applied
+            return report
+        except Exception:
+            write_db.rollback()
+            raise
+        finally:
+            read_db.close()
+            write_db.close()
+    
+    def running(self, db: Session, tenant_id: int) -> Optional[StorageReconciliation]:
+        """A job for the tenant that is still running (jobs older than the timeout are presumed dead)"""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.job_timeout_seconds)
+        return db.query(StorageReconciliation).filter(
+            StorageReconciliation.tenant_id == tenant_id,
+            StorageReconciliation.status == "running",
+            StorageReconciliation.started_at >= cutoff
+        ).order_by(StorageReconciliation.started_at.desc()).first()
+    
+    def get_job(self, db: Session, job_id: str) -> Optional[StorageReconciliation]:
+        return db.query(StorageReconciliation).filter(StorageReconciliation.job_id == job_id).first()
+    
+    def list_jobs(self, db: Session, tenant_id: int, limit: int = 20) -> List[StorageReconciliation]:
+        return db.query(StorageReconciliation).filter(
+            StorageReconciliation.tenant_id == tenant_id
+        ).order_by(StorageReconciliation.started_at.desc()).limit(limit).all()
+    
+    def start(self, db: Session, tenant_id: int, apply: bool = False, grace_seconds: Optional[int] = None) -> Dict:
+        """Reconcile the tenant in the background; returns the job (the running one if there already is one)"""
+        grace_seconds = self.grace_seconds if grace_seconds is None else grace_seconds
+        with self._lock:
+            existing = self.running(db, tenant_id)
+            if existing:
+                return {"job_id": existing.job_id, "status": existing.status, "already_running": True}
+            
+            job = StorageReconciliation(
+                job_id=str(uuid.uuid4()),
+                tenant_id=tenant_id,
+                status="running",
+                apply=apply,
+                grace_seconds=grace_seconds,
+                started_at=datetime.now(timezone.utc)
+            )
+            db.add(job)
+            db.commit()
+        
+        threading.Thread(
+            target=self._run,
+            args=(job.id, tenant_id, apply, grace_seconds),
+            name=f"reconcile-tenant-{tenant_id}",
+            daemon=True
+        ).start()
+        logger.info(f"Started storage reconciliation {job.job_id} for tenant {tenant_id} (apply={apply})")
+        return {"job_id": job.job_id, "status": "running", "already_running": False}
+    
+    def _run(self, job_row_id: int, tenant_id: int, apply: bool, grace_seconds: int):
+        report = None
+        error = None
+        try:
+            report = self.reconcile(tenant_id, apply=apply, grace_seconds=grace_seconds)
+            logger.info(
+                f"Storage reconciliation for tenant {tenant_id}: {report['orphans']['count']} orphans, "
+                f"{report['missing']['count']} missing, {report['size_mismatches']['count']} size mismatches "
+                f"({report['objects']} objects, {report['rows']} rows, {report['seconds']}s)"
+            )
+        except Exception as e:
+            logger.error(f"Storage reconciliation for tenant {tenant_id} failed: {e}", exc_info=True)
+            error = str(e)[:1000]
+        
+        db = SessionLocal()
+        try:
+            job = db.query(StorageReconciliation).filter(StorageReconciliation.id == job_row_id).one()
+            job.status = "completed" if error is None else "failed"
+            job.report = json.dumps(report, separators=(",", ":")) if report else None
+            job.error = error
+            job.completed_at = datetime.now(timezone.utc)
+            db.commit()
+        except Exception as e:
+            logger.error(f"Could not record storage reconciliation {job_row_id}: {e}")
+            db.rollback()
+        finally:
+            db.close()
+    
+    @staticmethod
+    def to_dict(job: StorageReconciliation, include_report: bool = True) -> Dict:
+        started_at = _as_utc(job.started_at)
+        completed_at = _as_utc(job.completed_at)
+        data = {
+            "job_id": job.job_id,
+            "tenant_id": job.tenant_id,
+            "status": job.status,
+            "apply": job.apply,
+            "grace_seconds": job.grace_seconds,
+            "started_at": started_at.isoformat() if started_at else None,
+            "completed_at": completed_at.isoformat() if completed_at else None,
+            "error": job.error
+        }
+        if include_report:
+            data["report"] = json.loads(job.report) if job.report else None
+        return data
+
+storage_reconciler = StorageReconciler(
+    grace_seconds=settings.RECONCILE_GRACE_SECONDS,
+    batch_size=settings.RECONCILE_BATCH_SIZE,
+    sample_size=settings.RECONCILE_SAMPLE_SIZE,
+    job_timeout_seconds=settings.RECONCILE_JOB_TIMEOUT_SECONDS
+)
@@ -0,0 +1,65 @@
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, Optional
+from app.models import ApiRoute
+import threading
+
+class RouteRegistry:
+    """Interns route templates ("/api/tenant/photos/{photo_id}") as small ids in api_routes.
+    
+    The set of templates is fixed by the app's routes, so after warm-up every
+    lookup is served from memory. New templates are inserted on first use; a
+    concurrent insert from another process is resolved by re-reading.
+    """
+    
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._templates: Dict[int, str] = {}
+        self._lock = threading.Lock()
+    
+    def _remember(self, route_id: int, template: str):
+        with self._lock:
+            self._ids[template] = route_id
+            self._templates[route_id] = template
+    
+    def get_ids(self, db: Session, templates: Iterable[str]) -> Dict[str, int]:
+        """Ids for templates, creating (and committing) rows for ones never seen before"""
+        wanted = {t for t in templates if t}
+        missing = [t for t in wanted if t not in self._ids]
+        if missing:
+            for route in db.query(ApiRoute).filter(ApiRoute.template.in_(missing)).all():
+                self._remember(route.id, route.template)
+            for template in [t for t in missing if t not in self._ids]:
+                try:
+                    with db.begin_nested():
+                        route = ApiRoute(template=template)
+                        db.add(route)
+                    self._remember(route.id, template)
+                except IntegrityError:
+                    # Another worker interned it first
+                    route = db.query(ApiRoute).filter(ApiRoute.template == template).one()
+                    self._remember(route.id, route.template)
+            # Committed on its own so the cached ids survive a failed insert by the caller
+            db.commit()
+        return {t: self._ids[t] for t in wanted}
+    
+    def get_id(self, db: Session, template: str) -> Optional[int]:
+        """Id of an existing template, without creating it"""
+        route_id = self._ids.get(template)
+        if route_id is None:
+            route = db.query(ApiRoute).filter(ApiRoute.template == template).first()
+            if route is None:
+                return None
+            self._remember(route.id, route.template)
+            route_id = route.id
+        return route_id
+    
+    def get_templates(self, db: Session, route_ids: Iterable[int]) -> Dict[int, str]:
+        wanted = {i for i in route_ids if i is not None}
+        missing = [i for i in wanted if i not in self._templates]
+        if missing:
+            for route in db.query(ApiRoute).filter(ApiRoute.id.in_(missing)).all():
+                self._remember(route.id, route.template)
+        return {i: self._templates[i] for i in wanted if i in self._templates}
+
+route_registry = RouteRegistry()
@@ -0,0 +1,120 @@
+"""
+In-process sampling profiler producing collapsed stacks (flamegraph.pl / speedscope input).
+
+A profile runs on the calling thread: at the requested rate it reads the
+current frame of every other thread with sys._current_frames() and counts
+each stack. Nothing is hooked into the interpreter, so threads run at full
+speed between samples and the cost is the sampling itself.
+"""
+from collections import Counter
+from typing import Dict, Tuple
+import os
+import sys
+import threading
+import time
+
+# Innermost frames of threads that are parked, not working (skipped unless include_idle)
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+}
+
+class ProfilerBusyError(RuntimeError):
+    """Another profile is already running in this process"""
+
+class SamplingProfiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _label(code, lineno: int) -> str:
+        filename = code.co_filename
+        parts = filename.split(os.sep)
+        if "site-packages" in parts:
+            filename = "/".join(parts[parts.index("site-packages") + 1:])
+        elif "app" in parts:
+            filename = "/".join(parts[len(parts) - 1 - parts[::-1].index("app"):])
+        else:
+            filename = os.path.basename(filename)
+        # ";" separates frames in the collapsed format
+        return f"{code.co_name} ({filename}:{lineno})".replace(";", ":")
+    
+    @staticmethod
+    def _collect(stacks: Counter, own_ident: int, include_idle: bool):
+        # Raw (code, line) tuples only; turning them into text waits until the profile ends
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+            if not include_idle:
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                    continue
+            stack = []
+            while frame is not None:
+                stack.append((frame.f_code, frame.f_lineno))
+                frame = frame.f_back
+            stacks[(ident, tuple(stack))] += 1
+    
+    def _collapse(self, stacks: Counter) -> str:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        labels: Dict[Tuple[object, int], str] = {}
+        collapsed: Counter = Counter()
+        for (ident, stack), count in stacks.items():
+            frames = [names.get(ident, f"thread-{ident}").replace(";", ":")]
+            for key in reversed(stack):
+                label = labels.get(key)
+                if label is None:
+                    label = labels[key] = self._label(*key)
+                frames.append(label)
+            collapsed[";".join(frames)] += count
+        return "".join(f"{stack} {count}\n" for stack, count in collapsed.most_common())
+    
+    def profile(self, seconds: float, rate_hz: int, include_idle: bool = False) -> Tuple[str, Dict]:
+        """Sample all other threads for `seconds`; returns (collapsed stacks, stats).
+        
+        Raises ProfilerBusyError if a profile is already running.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("A profile is already running on this worker")
+        try:
+            stacks: Counter = Counter()
+            own_ident = threading.get_ident()
+            interval = 1.0 / rate_hz
+            samples = 0
+            sampling_cpu = 0.0
+            started = time.perf_counter()
+            deadline = started + seconds
+            next_sample = started
+            while True:
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+                if now < next_sample:
+                    time.sleep(next_sample - now)
+                cpu_start = time.thread_time()
+                self._collect(stacks, own_ident, include_idle)
+                sampling_cpu += time.thread_time() - cpu_start
+                samples += 1
+                # Fixed schedule; if sampling falls behind, skip ahead instead of bursting
+                next_sample = max(next_sample + interval, time.perf_counter())
+            elapsed = time.perf_counter() - started
+            collapsed = self._collapse(stacks)
+            return collapsed, {
+                "samples": samples,
+                "stacks": len(stacks),
+                "seconds": round(elapsed, 3),
+                "rate_hz": rate_hz,
+                # CPU time the sampler used, as a share of one core over the profile
+                "overhead": round(sampling_cpu / elapsed, 4) if elapsed else 0.0
+            }
+        finally:
+            self._lock.release()
+    
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+sampling_profiler = SamplingProfiler()
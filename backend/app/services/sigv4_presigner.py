@@ -0,0 +1,170 @@
+"""
+Offline SigV4 query-string presigner for S3-compatible GET URLs.
+
+botocore builds a full request object, runs its event chain and re-derives
+the signing key for every presigned URL. For a gallery page that means
+hundreds of trips through that machinery. This presigner derives the signing
+key once per (secret, date, region) and only does the per-key work (URI
+quoting, one SHA-256 and one HMAC) in a tight loop. URLs are byte-identical to
+botocore's path-style output for a custom endpoint_url.
+"""
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import quote, urlsplit
+import hashlib
+import hmac
+import threading
+import time
+
+ALGORITHM = "AWS4-HMAC-SHA256"
+UNSIGNED_PAYLOAD = "UNSIGNED-PAYLOAD"
+
+@lru_cache(maxsize=128)
+def derive_signing_key(secret: str, date_stamp: str, region: str, service: str = "s3") -> bytes:
+    """Derive (and cache) the SigV4 signing key for one day/region/service"""
+    k_date = hmac.new(("AWS4" + secret).encode("utf-8"), date_stamp.encode("utf-8"), hashlib.sha256).digest()
+    k_region = hmac.new(k_date, region.encode("utf-8"), hashlib.sha256).digest()
+    k_service = hmac.new(k_region, service.encode("utf-8"), hashlib.sha256).digest()
+    return hmac.new(k_service, b"aws4_request", hashlib.sha256).digest()
+
+class SigV4Presigner:
+    """Presign path-style GET object URLs against a fixed endpoint and bucket"""
+
+    def __init__(self, key_id: str, secret: str, endpoint: str, bucket: str, region: str):
+        parts = urlsplit(endpoint)
+        if not parts.scheme or not parts.hostname:
+            raise ValueError(f"Endpoint must be an absolute URL, got '{endpoint}'")
+
+        self.key_id = key_id
+        self.secret = secret
+        self.region = region
+        self.bucket = bucket
+
+        # botocore keeps the endpoint as given in the URL but drops default ports from the signed Host header
+        host = parts.hostname
+        if parts.port and not (
+            (parts.scheme == "https" and parts.port == 443) or (parts.scheme == "http" and parts.port == 80)
+        ):
+            host = f"{host}:{parts.port}"
+        self.host = host
+        self.base_path = f"{parts.path.rstrip('/')}/{quote(bucket, safe='/~')}/"
+        self.base_url = f"{parts.scheme}://{parts.netloc}"
+
+    def presign_get(self, key: str, expires_in: int = 3600, signing_time: Optional[datetime] = None) -> str:
+        """Presign a single GET URL"""
+        return self.presign_get_many([key], expires_in, signing_time)[key]
+
+    def presign_get_many(
+        self,
+        keys: Iterable[str],
+        expires_in: int = 3600,
+        signing_time: Optional[datetime] = None
+    ) -> Dict[str, str]:
+        """Presign GET URLs for many keys, sharing one timestamp and signing key"""
+        if signing_time is None:
+            signing_time = datetime.now(timezone.utc)
+        amz_date = signing_time.strftime("%Y%m%dT%H%M%SZ")
+        date_stamp = amz_date[:8]
+        scope = f"{date_stamp}/{self.region}/s3/aws4_request"
+        signing_key = derive_signing_key(self.secret, date_stamp, self.region)
+
+        # Everything except the object path is identical for every key in this call
+        query = (
+            f"X-Amz-Algorithm={ALGORITHM}"
+            f"&X-Amz-Credential={quote(f'{self.key_id}/{scope}', safe='-_.~')}"
+            f"&X-Amz-Date={amz_date}"
+            f"&X-Amz-Expires={int(expires_in)}"
+            f"&X-Amz-SignedHeaders=host"
+        )
+        request_tail = f"\n{query}\nhost:{self.host}\n\nhost\n{UNSIGNED_PAYLOAD}".encode("utf-8")
+        sts_head = f"{ALGORITHM}\n{amz_date}\n{scope}\n".encode("utf-8")
+        url_head = f"{self.base_url}{self.base_path}"
+        path_head = f"GET\n{self.base_path}"
+
+        sha256 = hashlib.sha256
+        hmac_new = hmac.new
+        urls = {}
+        for key in keys:
+            quoted_key = quote(key, safe="/~")
+            canonical_hash = sha256(f"{path_head}{quoted_key}".encode("utf-8") + request_tail).hexdigest()
+            signature = hmac_new(signing_key, sts_head + canonical_hash.encode("ascii"), sha256).hexdigest()
+            urls[key] = f"{url_head}{quoted_key}?{query}&X-Amz-Signature={signature}"
+        return urls
+
+class PresignedUrlCache:
+    """LRU cache of presigned URLs aligned to fixed time buckets.
+
+    URLs are signed at the start of the current bucket with the bucket length
+    added to their expiry, so every request inside one bucket gets the same
+    URL for the same object (and browsers/CDNs can cache the response) while
+    each URL stays valid for at least the requested expiry. Entries are keyed
+    by (bucket key, object key); when the clock crosses into a new bucket the
+    previous bucket's URLs are dropped wholesale.
+    """
+
+    def __init__(self, bucket_seconds: int, max_entries: int):
+        self.bucket_seconds = max(1, int(bucket_seconds))
+        self.max_entries = max_entries
+        self._urls: "OrderedDict[tuple[tuple, str], str]" = OrderedDict()
+        self._bucket_start = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def current_bucket_start(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        return int(now // self.bucket_seconds) * self.bucket_seconds
+
+    def presign_get_many(self, presigner: SigV4Presigner, keys: List[str], expires_in: int = 3600) -> Dict[str, str]:
+        """Return bucket-aligned URLs for keys, signing only the ones not cached yet"""
+        bucket_start = self.current_bucket_start()
+        bucket_key = (presigner.key_id, presigner.base_url, presigner.bucket, bucket_start, int(expires_in))
+
+        urls = {}
+        missing = []
+        with self._lock:
+            if bucket_start != self._bucket_start:
+                # New time bucket: nothing from the previous one will be served again
+                self._urls.clear()
+                self._bucket_start = bucket_start
+            for key in keys:
+                url = self._urls.get((bucket_key, key))
+                if url is None:
+                    missing.append(key)
+                else:
+                    self._urls.move_to_end((bucket_key, key))
+                    urls[key] = url
+            self.hits += len(urls)
+            self.misses += len(missing)
+
+        if missing:
+            signed = presigner.presign_get_many(
+                missing,
+                expires_in + self.bucket_seconds,
+                datetime.fromtimestamp(bucket_start, timezone.utc)
+            )
+            urls.update(signed)
+            with self._lock:
+                if self._bucket_start == bucket_start:
+                    for key, url in signed.items():
+                        self._urls[(bucket_key, key)] = url
+                    while len(self._urls) > self.max_entries:
+                        self._urls.popitem(last=False)
+        return urls
+
+    def clear(self):
+        with self._lock:
+            self._urls.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "size": len(self._urls),
+                "max_entries": self.max_entries,
+                "bucket_seconds": self.bucket_seconds,
+                "bucket_start": self._bucket_start,
+                "hits": self.hits,
+                "misses": self.misses
+            }
@@ -0,0 +1,179 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from sqlalchemy.orm import Session
+from typing import Dict, Optional
+from app.config import settings
+from app.models import Tenant
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+@dataclass(frozen=True)
+class CachedTenant:
+    """Read-only snapshot of a Tenant row that is safe to share across requests and threads.
+    
+    storage_used_bytes changes on every upload, so it is only as fresh as the
+    snapshot; read it from the database where the live value matters.
+    """
+    id: int
+    subdomain: str
+    name: str
+    email: str
+    b2_key_id: Optional[str]
+    b2_key: Optional[str]
+    b2_bucket: Optional[str]
+    storage_limit_mb: Optional[int]
+    storage_used_bytes: int
+    created_at: Optional[datetime]
+    expires_at: Optional[datetime]
+    is_active: bool
+    
+    @classmethod
+    def from_model(cls, tenant: Tenant) -> "CachedTenant":
+        return cls(
+            id=tenant.id,
+            subdomain=tenant.subdomain,
+            name=tenant.name,
+            email=tenant.email,
+            b2_key_id=tenant.b2_key_id,
+            b2_key=tenant.b2_key,
+            b2_bucket=tenant.b2_bucket,
+            storage_limit_mb=tenant.storage_limit_mb,
+            storage_used_bytes=tenant.storage_used_bytes or 0,
+            created_at=tenant.created_at,
+            expires_at=tenant.expires_at,
+            is_active=bool(tenant.is_active)
+        )
+
+class TenantCache:
+    """Process-local TTL cache of tenants keyed by subdomain and by id.
+    
+    Unknown subdomains are cached as misses for a shorter TTL so random hosts
+    cannot force a query per request. Admin routes that change a tenant call
+    invalidate(); other workers pick the change up when the TTL expires.
+    """
+    
+    def __init__(self, ttl_seconds: float, negative_ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.max_entries = max_entries
+        self._by_subdomain: "OrderedDict[str, tuple[float, Optional[CachedTenant]]]" = OrderedDict()
+        self._by_id: "OrderedDict[int, tuple[float, CachedTenant]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.invalidations = 0
+    
+    def _get(self, entries: OrderedDict, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del entries[key]
+                self.misses += 1
+                return _MISSING
+            entries.move_to_end(key)
+            if entry[1] is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return entry[1]
+    
+    def _put(self, tenant: Optional[CachedTenant], subdomain: Optional[str] = None):
+        now = time.monotonic()
+        with self._lock:
+            if tenant is None:
+                self._by_subdomain[subdomain] = (now + self.negative_ttl_seconds, None)
+                self._by_subdomain.move_to_end(subdomain)
+            else:
+                expires = now + self.ttl_seconds
+                self._by_subdomain[tenant.subdomain] = (expires, tenant)
+                self._by_subdomain.move_to_end(tenant.subdomain)
+                self._by_id[tenant.id] = (expires, tenant)
+                self._by_id.move_to_end(tenant.id)
+            for entries in (self._by_subdomain, self._by_id):
+                while len(entries) > self.max_entries:
+                    entries.popitem(last=False)
+    
+    def peek_subdomain(self, subdomain: str):
+        """Cached tenant (or None for a cached miss) without touching the DB; _MISSING if not cached"""
+        return self._get(self._by_subdomain, subdomain)
+    
+    def load_by_subdomain(self, subdomain: str, db: Optional[Session] = None) -> Optional[CachedTenant]:
+        """Query the tenant for subdomain and cache the result (including a miss)"""
+        return self._load(db, Tenant.subdomain == subdomain, subdomain=subdomain)
+    
+    def get_by_subdomain(self, subdomain: str, db: Optional[Session] = None) -> Optional[CachedTenant]:
+        cached = self.peek_subdomain(subdomain)
+        if cached is not _MISSING:
+            return cached
+        return self.load_by_subdomain(subdomain, db)
+    
+    def get_by_id(self, tenant_id: int, db: Optional[Session] = None) -> Optional[CachedTenant]:
+        cached = self._get(self._by_id, tenant_id)
+        if cached is not _MISSING:
+            return cached
+        return self._load(db, Tenant.id == tenant_id)
+    
+    def _load(self, db: Optional[Session], criterion, subdomain: Optional[str] = None) -> Optional[CachedTenant]:
+        own_session = db is None
+        if own_session:
+            from app.database import SessionLocal
+            db = SessionLocal()
+        try:
+            tenant = db.query(Tenant).filter(criterion).first()
+            snapshot = CachedTenant.from_model(tenant) if tenant else None
+        finally:
+            if own_session:
+                db.close()
+        if snapshot is not None or subdomain is not None:
+            self._put(snapshot, subdomain)
+        return snapshot
+    
+    def invalidate(self, tenant_id: Optional[int] = None, subdomain: Optional[str] = None):
+        """Drop a tenant by id and/or subdomain (including cached misses)"""
+        with self._lock:
+            if tenant_id is not None:
+                self._by_id.pop(tenant_id, None)
+                stale = [k for k, (_, t) in self._by_subdomain.items() if t is not None and t.id == tenant_id]
+                for key in stale:
+                    del self._by_subdomain[key]
+            if subdomain is not None:
+                entry = self._by_subdomain.pop(subdomain, None)
+                if entry is not None and entry[1] is not None:
+                    self._by_id.pop(entry[1].id, None)
+            self.invalidations += 1
+    
+    def clear(self):
+        with self._lock:
+            self._by_subdomain.clear()
+            self._by_id.clear()
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "by_subdomain": len(self._by_subdomain),
+                "by_id": len(self._by_id),
+                "ttl_seconds": self.ttl_seconds,
+                "negative_ttl_seconds": self.negative_ttl_seconds,
+                "hits": self.hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations
+            }
+
+tenant_cache = TenantCache(
+    ttl_seconds=settings.TENANT_CACHE_TTL_SECONDS,
+    negative_ttl_seconds=settings.TENANT_CACHE_NEGATIVE_TTL_SECONDS,
+    max_entries=settings.TENANT_CACHE_MAX_ENTRIES
+)
+
+def is_cached(value) -> bool:
+    return value is not _MISSING
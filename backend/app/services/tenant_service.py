@@ -1,10 +1,11 @@
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from app.models import Tenant, User, Photo, UsageLog
 from app.services.b2_service import B2Service
 from app.services.cloudflare_service import CloudflareService
 from app.config import settings
 from datetime import datetime, timedelta, timezone
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 import secrets
 import logging
 
@@ -77,13 +78,32 @@ class TenantService:
     def list_tenants(self, skip: int = 0, limit: int = 100) -> list[Tenant]:
         return self.db.query(Tenant).offset(skip).limit(limit).all()
     
-    def update_tenant_storage(self, tenant_id: int, bytes_added: int):
-        """Update tenant storage usage"""
-        tenant = self.get_tenant(tenant_id)
-        if tenant:
-            tenant.storage_used_bytes += bytes_added
+    def update_tenant_storage(self, tenant_id: int, bytes_added: int, commit: bool = True):
+        """Update tenant storage usage with a single SQL-side increment (no read-modify-write)"""
+        self.db.query(Tenant).filter(Tenant.id == tenant_id).update(
+            {Tenant.storage_used_bytes: func.coalesce(Tenant.storage_used_bytes, 0) + bytes_added},
+            synchronize_session=False
+        )
+        if commit:
             self.db.commit()
     
+    def reserve_storage(self, tenant_id: int, bytes_needed: int) -> bool:
+        """Check the storage limit and reserve the space in one conditional UPDATE.
+        
+        Returns False (and changes nothing) if the tenant would go over its limit.
+        The caller commits, so the reservation rolls back with the rest of the request.
+        """
+        limit_bytes = func.coalesce(Tenant.storage_limit_mb, settings.DEFAULT_STORAGE_LIMIT_MB) * 1024 * 1024
+        used_bytes = func.coalesce(Tenant.storage_used_bytes, 0)
+        updated = self.db.query(Tenant).filter(
+            Tenant.id == tenant_id,
+            used_bytes + bytes_needed <= limit_bytes
+        ).update(
+            {Tenant.storage_used_bytes: used_bytes + bytes_needed},
+            synchronize_session=False
+        )
+        return updated == 1
+    
     def check_storage_limit(self, tenant_id: int, file_size_bytes: int) -> bool:
         """Check if tenant can upload file (within storage limit)"""
         tenant = self.get_tenant(tenant_id)
@@ -123,8 +143,25 @@ class TenantService:
         if not tenant:
             return {}
         
-        photo_count = self.db.query(Photo).filter(Photo.tenant_id == tenant_id).count()
-        
+        photo_count = self.db.query(Photo).filter(Photo.tenant_id == tenant_id, Photo.state == "confirmed").count()
+        return self._tenant_stats(tenant, photo_count)
+    
+    def list_tenant_stats(self, skip: int = 0, limit: int = 100) -> List[Dict]:
+        """Usage statistics for a page of tenants in one query (photo counts via a grouped LEFT JOIN)"""
+        photo_counts = self.db.query(
+            Photo.tenant_id.label("tenant_id"),
+            func.count(Photo.id).label("photo_count")
+        ).filter(Photo.state == "confirmed").group_by(Photo.tenant_id).subquery()
+        rows = self.db.query(
+            Tenant,
+            func.coalesce(photo_counts.c.photo_count, 0)
+        ).outerjoin(
+            photo_counts, photo_counts.c.tenant_id == Tenant.id
+        ).order_by(Tenant.id).offset(skip).limit(limit).all()
+        return [self._tenant_stats(tenant, photo_count) for tenant, photo_count in rows]
+    
+    @staticmethod
+    def _tenant_stats(tenant: Tenant, photo_count: int) -> Dict:
         return {
             "tenant_id": tenant.id,
             "subdomain": tenant.subdomain,
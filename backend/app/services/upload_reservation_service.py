@@ -0,0 +1,198 @@
+"""
+Pending upload reservations and their expiry.
+
+Requesting an upload URL reserves the file's size against the tenant's quota
+and creates the Photo row as pending with an expires_at; confirming the upload
+(or completing the multipart upload) makes it confirmed. Reservations that are
+never confirmed are swept in two steps, UPLOAD_SWEEP_BATCH_SIZE rows per
+transaction:
+
+1. expire: due pending rows, found by a range scan of (state, expires_at), are
+   locked with SKIP LOCKED (concurrent sweepers and confirms never wait on each
+   other), marked expired, and their sizes released with a single UPDATE of
+   the tenants in the batch.
+2. clean up: expired rows have their unfinished multipart upload aborted in
+   B2 (best effort), then the rows, their multipart uploads and parts are
+   deleted. An object uploaded but never confirmed is left to the
+   reconciliation (app/services/reconciliation_service.py) as an orphan.
+
+A crash between the steps leaves expired rows with their storage already
+released; the next sweep cleans them up.
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import case, func, insert
+from sqlalchemy.orm import Session
+from typing import Dict, List
+from app.config import settings
+from app.database import SessionLocal
+from app.models import MultipartUpload, MultipartUploadPart, Photo, Tenant, UsageLog
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class UploadReservations:
+    def __init__(self, ttl_seconds: int, multipart_ttl_seconds: int, batch_size: int):
+        self.ttl_seconds = ttl_seconds
+        self.multipart_ttl_seconds = multipart_ttl_seconds
+        self.batch_size = batch_size
+    
+    def expires_at(self, multipart: bool = False) -> datetime:
+        """expires_at for a reservation made (or extended) now"""
+        ttl = self.multipart_ttl_seconds if multipart else self.ttl_seconds
+        return datetime.now(timezone.utc) + timedelta(seconds=ttl)
+    
+    def expire_batch(self, db: Session, now: datetime) -> Dict[str, int]:
+        """Mark up to batch_size due pending rows expired and release their storage (one transaction)"""
+        rows = db.query(Photo.id, Photo.tenant_id, Photo.file_size_bytes).filter(
+            Photo.state == "pending",
+            Photo.expires_at < now
+        ).order_by(Photo.expires_at).limit(self.batch_size).with_for_update(skip_locked=True).all()
+        if not rows:
+            db.rollback()
+            return {"expired": 0, "released_bytes": 0}
+        
+        released: Dict[int, int] = defaultdict(int)
+        for _, tenant_id, size in rows:
+            released[tenant_id] += size or 0
+        
+        db.query(Photo).filter(Photo.id.in_([row.id for row in rows])).update(
+            {Photo.state: "expired"}, synchronize_session=False
+        )
+        db.query(Tenant).filter(Tenant.id.in_(list(released))).update(
+            {Tenant.storage_used_bytes: func.coalesce(Tenant.storage_used_bytes, 0) - case(released, value=Tenant.id, else_=0)},
+            synchronize_session=False
+        )
+        db.execute(insert(UsageLog), [
+            {"tenant_id": tenant_id, "log_type": "delete", "bytes_transferred": -(size or 0)}
+            for _, tenant_id, size in rows
+        ])
+        db.commit()
+        return {"expired": len(rows), "released_bytes": sum(released.values())}
+    
+    def cleanup_batch(self, db: Session) -> Dict[str, int]:
+        """Delete up to batch_size expired rows, after aborting their unfinished multipart uploads"""
+        rows = db.query(
+            Photo.id,
+            Photo.tenant_id,
+            Photo.b2_key,
+            MultipartUpload.id.label("multipart_id"),
+            MultipartUpload.status.label("multipart_status"),
+            MultipartUpload.b2_upload_id
+        ).outerjoin(
+            MultipartUpload, MultipartUpload.photo_id == Photo.id
+        ).filter(Photo.state == "expired").limit(self.batch_size).all()
+        stats = {"deleted": 0, "multipart_aborted": 0}
+        if not rows:
+            return stats
+        
+        # One B2 service per bucket, not per tenant: tenants without their own credentials share the default one
+        multipart_tenant_ids = {row.tenant_id for row in rows if row.multipart_status == "in_progress"}
+        tenants = {tenant.id: tenant for tenant in db.query(Tenant).filter(Tenant.id.in_(multipart_tenant_ids))} if multipart_tenant_ids else {}
+        by_bucket: Dict[tuple, List] = defaultdict(list)
+        for row in rows:
+            tenant = tenants.get(row.tenant_id)
+            if tenant is None or row.multipart_status != "in_progress":
+                continue
+            own = tenant.b2_key_id and tenant.b2_key and tenant.b2_bucket
+            by_bucket[(tenant.b2_key_id, tenant.b2_bucket) if own else None].append(row)
+        for bucket_rows in by_bucket.values():
+            self._abort_multipart_uploads(db, tenants[bucket_rows[0].tenant_id], bucket_rows, stats)
+        
+        ids = [row.id for row in rows]
+        multipart_ids = [row.multipart_id for row in rows if row.multipart_id is not None]
+        if multipart_ids:
+            db.query(MultipartUploadPart).filter(
+                MultipartUploadPart.multipart_upload_id.in_(multipart_ids)
+            ).delete(synchronize_session=False)
+            db.query(MultipartUpload).filter(MultipartUpload.id.in_(multipart_ids)).delete(synchronize_session=False)
+        stats["deleted"] = db.query(Photo).filter(
+            Photo.id.in_(ids),
+            Photo.state == "expired"
+        ).delete(synchronize_session=False)
+        db.commit()
+        return stats
+    
+    def _abort_multipart_uploads(self, db: Session, tenant: Tenant, rows: List, stats: Dict[str, int]):
+        # Best effort, and only unfinished multipart uploads (their parts are stored but never listed).
+        # A single upload that landed without being confirmed is an orphan for the reconciliation;
+        # deleting it here would need a check that no live row uses the same key.
+        from app.services.reconciliation_service import tenant_b2_service
+        try:
+            b2_service = tenant_b2_service(db, tenant)
+        except Exception as e:
+            logger.warning(f"Could not abort expired multipart uploads in B2 bucket {tenant.b2_bucket or '(default)'}: {e}")
+            return
+        for row in rows:
+            try:
+                b2_service.abort_multipart_upload(row.b2_key, row.b2_upload_id)
+                stats["multipart_aborted"] += 1
+            except Exception:
+                pass  # Unfinished parts are cleaned up by the bucket lifecycle rules
+    
+    def sweep(self) -> Dict[str, int]:
+        """Expire all due reservations, then delete the expired rows; returns totals"""
+        totals = {"expired": 0, "released_bytes": 0, "deleted": 0, "multipart_aborted": 0}
+        now = datetime.now(timezone.utc)
+        db = SessionLocal()
+        try:
+            while True:
+                batch = self.expire_batch(db, now)
+                for key, value in batch.items():
+                    totals[key] += value
+                if batch["expired"] < self.batch_size:
+                    break
+            while True:
+                batch = self.cleanup_batch(db)
+                for key, value in batch.items():
+                    totals[key] += value
+                if batch["deleted"] < self.batch_size:
+                    break
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+        if totals["expired"] or totals["deleted"]:
+            logger.info(
+                f"Upload reservations: {totals['expired']} expired ({totals['released_bytes']} bytes released), "
+                f"{totals['deleted']} rows deleted, {totals['multipart_aborted']} multipart uploads aborted"
+            )
+        return totals
+    
+    def summary(self, db: Session) -> Dict:
+        """Pending/expired row counts and bytes (a range scan of the state index, confirmed rows are not read)"""
+        now = datetime.now(timezone.utc)
+        rows = db.query(
+            Photo.state,
+            func.count(Photo.id),
+            func.coalesce(func.sum(Photo.file_size_bytes), 0),
+            func.coalesce(func.sum(case((Photo.expires_at < now, 1), else_=0)), 0)
+        ).filter(Photo.state.in_(["pending", "expired"])).group_by(Photo.state).all()
+        data = {state: {"count": 0, "bytes": 0} for state in ("pending", "expired")}
+        overdue = 0
+        for state, count, size, due in rows:
+            data[state] = {"count": count, "bytes": int(size)}
+            if state == "pending":
+                overdue = int(due)
+        data["pending"]["overdue"] = overdue
+        data["ttl_seconds"] = self.ttl_seconds
+        data["multipart_ttl_seconds"] = self.multipart_ttl_seconds
+        return data
+    
+    async def run_forever(self, interval_seconds: int):
+        """Background task: sweep now and then every interval_seconds"""
+        from starlette.concurrency import run_in_threadpool
+        while True:
+            try:
+                await run_in_threadpool(self.sweep)
+            except Exception as e:
+                logger.error(f"Upload reservation sweep failed: {e}")
+            await asyncio.sleep(interval_seconds)
+
+upload_reservations = UploadReservations(
+    ttl_seconds=settings.UPLOAD_RESERVATION_TTL_SECONDS,
+    multipart_ttl_seconds=settings.MULTIPART_RESERVATION_TTL_SECONDS,
+    batch_size=settings.UPLOAD_SWEEP_BATCH_SIZE
+)
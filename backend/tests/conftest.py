@@ -0,0 +1,84 @@
+"""
+Shared fixtures: the app against a throwaway SQLite database.
+
+DATABASE_URL is set before app is imported, so the engine, SessionLocal and
+every service singleton use the test database. api_logs is not created (its
+composite autoincrement key and partitioning are MySQL-only); the request
+log writer is never started, so nothing writes to it.
+"""
+import os
+import sys
+import tempfile
+
+_db_dir = tempfile.mkdtemp(prefix="media-store-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_dir}/test.db"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+from app.database import Base, SessionLocal, engine
+from app.main import app
+from app.models import B2Credential, Tenant, User
+from app.routers.auth import create_access_token
+from app.services.tenant_cache import tenant_cache
+
+TABLES = [table for table in Base.metadata.sorted_tables if table.name != "api_logs"]
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(engine, tables=TABLES)
+    tenant_cache.clear()
+    session = SessionLocal()
+    # Default (admin) B2 credential; the key only has to look valid, presigning is offline
+    session.add(B2Credential(
+        tenant_id=None,
+        key_id="0051234567890ab",
+        key="K" * 31,
+        bucket_name="test-bucket",
+        endpoint="https://s3.eu-central-003.backblazeb2.com",
+        is_active=True
+    ))
+    session.commit()
+    yield session
+    session.close()
+    Base.metadata.drop_all(engine, tables=TABLES)
+
+@pytest.fixture
+def client(db):
+    # Not used as a context manager: startup (database init, background tasks) is skipped
+    return TestClient(app)
+
+@pytest.fixture
+def make_tenant(db):
+    def make(subdomain: str, storage_limit_mb: int = 500) -> Tenant:
+        tenant = Tenant(
+            subdomain=subdomain,
+            name=subdomain.title(),
+            email=f"{subdomain}@example.com",
+            storage_limit_mb=storage_limit_mb,
+            storage_used_bytes=0,
+            is_active=True
+        )
+        db.add(tenant)
+        db.commit()
+        return tenant
+    return make
+
+@pytest.fixture
+def make_user(db):
+    def make(email: str, tenant: Tenant = None, is_admin: bool = False) -> User:
+        user = User(email=email, hashed_password="unused", tenant_id=tenant.id if tenant else None, is_admin=is_admin)
+        db.add(user)
+        db.commit()
+        return user
+    return make
+
+@pytest.fixture
+def auth_headers():
+    def headers_for(user: User, host: str = None) -> dict:
+        token = create_access_token({"sub": str(user.id), "tenant_id": user.tenant_id, "is_admin": user.is_admin})
+        headers = {"Authorization": f"Bearer {token}"}
+        if host:
+            headers["Host"] = host
+        return headers
+    return headers_for
@@ -0,0 +1,43 @@
+from app.database import engine
+from app.models import Photo, User
+from app.routers.admin import get_system_stats
+from app.services import query_tracker
+
+def add_tenants(db, make_tenant, count, start=0):
+    for i in range(start, start + count):
+        tenant = make_tenant(f"tenant{i}")
+        db.add(User(email=f"user{i}@example.com", hashed_password="unused", tenant_id=tenant.id))
+        for n in range(3):
+            db.add(Photo(
+                tenant_id=tenant.id,
+                filename=f"{n}.jpg",
+                original_filename=f"{n}.jpg",
+                b2_key=f"tenant_{tenant.id}/{n}.jpg",
+                file_size_bytes=100
+            ))
+    db.commit()
+
+def count_statements(db, admin) -> int:
+    db.expire_all()
+    stats = query_tracker.QueryStats()
+    token = query_tracker.current_query_stats.set(stats)
+    try:
+        response = get_system_stats(refresh=False, db=db, current_user=admin)
+    finally:
+        query_tracker.current_query_stats.reset(token)
+    assert len(response.tenants) == len(db.query(User).filter(User.tenant_id != None).all())
+    return stats.count
+
+def test_stats_statement_count_does_not_grow_with_tenants(db, make_tenant, make_user):
+    admin = make_user("admin@example.com", is_admin=True)
+    query_tracker.install(engine)
+    try:
+        add_tenants(db, make_tenant, 1)
+        one_tenant = count_statements(db, admin)
+        
+        add_tenants(db, make_tenant, 24, start=1)
+        many_tenants = count_statements(db, admin)
+    finally:
+        query_tracker.uninstall(engine)
+    
+    assert one_tenant == many_tenants
@@ -0,0 +1,25 @@
+from app.models import ApiLogRollup
+from app.services.api_log_rollup import api_log_rollups
+from app.services.api_log_writer import ApiLogWriter
+
+def test_unknown_methods_are_rolled_up_as_other(client):
+    api_log_rollups.drain(include_current=True)
+    
+    client.request("PROPFINDXYZ123", "/no-such-route")
+    client.get("/no-such-route")
+    
+    methods = {row["method"] for row in api_log_rollups.drain(include_current=True)}
+    assert methods == {"other", "GET"}
+
+def test_failed_batch_is_retried_row_by_row(db):
+    api_log_rollups.drain(include_current=True)
+    api_log_rollups.add("GET", "/api/a", 200, 1, 12.0)
+    api_log_rollups.add("POST", "/api/b", 201, 1, 30.0)
+    api_log_rollups.add("GET", "/api/c", 500, 2, 80.0)
+    rows = api_log_rollups.drain(include_current=True)
+    rows[1]["sketch"] = None  # NOT NULL: fails the multi-row INSERT
+    
+    written = ApiLogWriter._insert(db, ApiLogRollup, rows)
+    
+    assert written == 2
+    assert sorted(route for route, in db.query(ApiLogRollup.route)) == sorted(r["route"] for r in rows if r["sketch"])
@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from app.database import SessionLocal
+from app.models import BucketStorageSnapshot
+from app.services.bucket_storage_service import START_LOCK, BucketStorageSnapshots
+
+def test_parallel_starts_create_one_job(db, monkeypatch):
+    snapshots = BucketStorageSnapshots(interval_seconds=3600, job_timeout_seconds=3600)
+    monkeypatch.setattr(snapshots, "_run", lambda snapshot_id, b2_service: None)
+    
+    def start(_):
+        session = SessionLocal()
+        try:
+            return snapshots.start_refresh(session)
+        finally:
+            session.close()
+    
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        jobs = list(pool.map(start, range(16)))
+    
+    assert len({job["job_id"] for job in jobs}) == 1
+    assert sum(not job["already_running"] for job in jobs) == 1
+    assert db.query(BucketStorageSnapshot).count() == 1
+
+def test_start_takes_the_named_lock_on_mysql(db, monkeypatch):
+    snapshots = BucketStorageSnapshots(interval_seconds=3600, job_timeout_seconds=3600)
+    monkeypatch.setattr(snapshots, "_run", lambda snapshot_id, b2_service: None)
+    calls = []
+    
+    class Connection:
+        def __enter__(self):
+            return self
+        
+        def __exit__(self, *exc):
+            return False
+        
+        def execute(self, statement, params):
+            calls.append((str(statement), params["name"], db.query(BucketStorageSnapshot).count()))
+            return SimpleNamespace(scalar=lambda: 1)
+    
+    # Only start_refresh's bare get_bind() sees MySQL; the session's own queries still go to SQLite
+    bind = SimpleNamespace(dialect=SimpleNamespace(name="mysql"), connect=Connection)
+    get_bind = db.get_bind
+    monkeypatch.setattr(db, "get_bind", lambda *args, **kwargs: get_bind(*args, **kwargs) if args or kwargs else bind)
+    
+    job = snapshots.start_refresh(db)
+    
+    assert not job["already_running"]
+    # The job row is committed while the lock is held
+    assert calls == [
+        ("SELECT GET_LOCK(:name, :timeout)", START_LOCK, 0),
+        ("SELECT RELEASE_LOCK(:name)", START_LOCK, 1)
+    ]
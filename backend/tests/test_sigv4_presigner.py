@@ -0,0 +1,57 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from app.services.b2_service import S3ClientPool, region_from_endpoint
+from app.services.sigv4_presigner import SigV4Presigner
+import botocore.auth
+import datetime as datetime_module
+import pytest
+
+KEY_ID = "0051234567890ab"
+SECRET = "K005abcdefghijklmnopqrstuvwxyz0"
+BUCKET = "test-bucket"
+SIGNING_TIME = datetime(2026, 10, 17, 12, 34, 56, tzinfo=timezone.utc)
+
+KEYS = [
+    "tenant-1/photos/2026/IMG_0001.jpg",
+    "tenant-1/photos/with space.jpg",
+    "tenant-1/ünïcödé/照片 фото.png",
+    "tenant-1/emoji-📷.heic",
+    "tenant-1/reserved/a+b=c&d?e#f%g.jpg",
+    "tenant-1/reserved/semi;colon,comma:at@dollar$.jpg",
+    "tenant-1/reserved/~tilde(paren)!star*quote'.jpg",
+    "tenant-1/reserved/[brackets]{braces}<angle>|pipe^caret`tick\"dq\\bs.jpg",
+    "tenant-1/double//slash/./dot.jpg",
+]
+
+ENDPOINTS = [
+    "https://s3.eu-central-003.backblazeb2.com",
+    "https://s3.us-west-004.backblazeb2.com:443",
+    "http://minio.local:9000",
+]
+
+class FrozenDatetime(datetime_module.datetime):
+    @classmethod
+    def utcnow(cls):
+        return cls(2026, 10, 17, 12, 34, 56)
+
+@pytest.fixture
+def frozen_botocore(monkeypatch):
+    # botocore.auth reads the clock through datetime.datetime.utcnow()
+    monkeypatch.setattr(botocore.auth, "datetime", SimpleNamespace(datetime=FrozenDatetime))
+
+@pytest.mark.parametrize("endpoint", ENDPOINTS)
+@pytest.mark.parametrize("expires_in", [60, 3600, 604800])
+def test_urls_match_botocore(frozen_botocore, endpoint, expires_in):
+    region = region_from_endpoint(endpoint)
+    client = S3ClientPool(1).get_client(KEY_ID, SECRET, endpoint, region)
+    presigner = SigV4Presigner(KEY_ID, SECRET, endpoint, BUCKET, region)
+    
+    urls = presigner.presign_get_many(KEYS, expires_in, SIGNING_TIME)
+    
+    for key in KEYS:
+        expected = client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": BUCKET, "Key": key},
+            ExpiresIn=expires_in
+        )
+        assert urls[key] == expected, key
@@ -0,0 +1,32 @@
+def test_subdomain_of_another_tenant_is_refused(client, make_tenant, make_user, auth_headers):
+    alpha = make_tenant("alpha")
+    beta = make_tenant("beta")
+    user = make_user("user@alpha.example.com", alpha)
+    headers = auth_headers(user, host="beta.localhost")
+    
+    assert client.get("/api/tenant/info", headers=headers).status_code == 403
+    assert client.get("/api/tenant/storage", headers=headers).status_code == 403
+    response = client.post("/api/tenant/photos/upload", headers=headers, json={
+        "filename": "x.jpg", "content_type": "image/jpeg", "file_size_bytes": 100
+    })
+    assert response.status_code == 403
+    assert client.delete("/api/tenant/photos/1", headers=headers).status_code == 403
+
+def test_own_subdomain_and_plain_host_resolve_the_users_tenant(client, make_tenant, make_user, auth_headers):
+    alpha = make_tenant("alpha")
+    make_tenant("beta")
+    user = make_user("user@alpha.example.com", alpha)
+    
+    for host in ("alpha.localhost", "testserver"):
+        response = client.get("/api/tenant/info", headers=auth_headers(user, host=host))
+        assert response.status_code == 200
+        assert response.json()["id"] == alpha.id
+
+def test_admin_may_use_any_tenant_subdomain(client, make_tenant, make_user, auth_headers):
+    make_tenant("alpha")
+    beta = make_tenant("beta")
+    admin = make_user("admin@example.com", is_admin=True)
+    
+    response = client.get("/api/tenant/info", headers=auth_headers(admin, host="beta.localhost"))
+    assert response.status_code == 200
+    assert response.json()["id"] == beta.id
@@ -0,0 +1,70 @@
+from concurrent.futures import ThreadPoolExecutor
+from app.models import Photo, Tenant
+from app.services.b2_service import B2Service
+from app.services.tenant_service import TenantService
+
+MB = 1024 * 1024
+
+def test_parallel_reservations_never_exceed_quota(client, db, make_tenant, make_user, auth_headers):
+    tenant = make_tenant("alpha", storage_limit_mb=1)
+    headers = auth_headers(make_user("user@alpha.example.com", tenant))
+    size = 100_000  # 10 fit into 1 MB, the 11th does not
+    
+    def upload(i):
+        if i % 3 == 0:
+            return client.post("/api/tenant/photos/upload/batch", headers=headers, json={"items": [
+                {"filename": f"batch{i}_{n}.jpg", "content_type": "image/jpeg", "file_size_bytes": size} for n in range(2)
+            ]})
+        return client.post("/api/tenant/photos/upload", headers=headers, json={
+            "filename": f"single{i}.jpg", "content_type": "image/jpeg", "file_size_bytes": size
+        })
+    
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        responses = list(pool.map(upload, range(30)))
+    
+    assert {response.status_code for response in responses} <= {200, 403}
+    accepted_bytes = 0
+    for response in responses:
+        if response.status_code == 200:
+            body = response.json()
+            accepted_bytes += body["total_bytes"] if "total_bytes" in body else size
+    
+    db.expire_all()
+    used = db.query(Tenant.storage_used_bytes).filter(Tenant.id == tenant.id).scalar()
+    photo_bytes = sum(size for size, in db.query(Photo.file_size_bytes).filter(Photo.tenant_id == tenant.id))
+    assert used == accepted_bytes == photo_bytes
+    assert used <= 1 * MB
+    assert used > 1 * MB - 2 * size  # The quota was actually filled, not refused early
+
+def test_multipart_reserves_after_b2_and_aborts_when_over_quota(client, db, make_tenant, make_user, auth_headers, monkeypatch):
+    tenant = make_tenant("alpha", storage_limit_mb=10)
+    headers = auth_headers(make_user("user@alpha.example.com", tenant))
+    calls = []
+    
+    def create_multipart_upload(self, key, content_type):
+        calls.append("create")
+        return "upload-1"
+    
+    def abort_multipart_upload(self, key, upload_id):
+        calls.append(("abort", upload_id))
+    
+    reserve_storage = TenantService.reserve_storage
+    
+    def reserve(self, tenant_id, bytes_needed):
+        calls.append("reserve")
+        return reserve_storage(self, tenant_id, bytes_needed)
+    
+    monkeypatch.setattr(B2Service, "create_multipart_upload", create_multipart_upload)
+    monkeypatch.setattr(B2Service, "abort_multipart_upload", abort_multipart_upload)
+    monkeypatch.setattr(TenantService, "reserve_storage", reserve)
+    
+    response = client.post("/api/tenant/photos/multipart", headers=headers, json={
+        "filename": "big.bin", "content_type": "application/octet-stream", "file_size_bytes": 11 * MB
+    })
+    
+    assert response.status_code == 403
+    # The B2 call happens before the tenant row is locked; the refused upload is aborted
+    assert calls == ["create", "reserve", ("abort", "upload-1")]
+    db.expire_all()
+    assert db.query(Tenant.storage_used_bytes).filter(Tenant.id == tenant.id).scalar() == 0
+    assert db.query(Photo).count() == 0